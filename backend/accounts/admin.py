@@ -1,3 +1,15 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from legacy_prime_backend.large_admin import LargeTableAdminMixin
+from .models import User
 
-# Register your models here.
+
+@admin.register(User)
+class UserAdmin(LargeTableAdminMixin, BaseUserAdmin):
+    list_display = ('username', 'email', 'is_verified', 'is_staff', 'date_joined')
+    list_filter = ('is_staff', 'is_superuser', 'is_active', 'is_verified')
+    # Also what the user autocomplete widgets of the other admins search
+    search_fields = ('^username', '^email')
+    fieldsets = BaseUserAdmin.fieldsets + (
+        ('Verification', {'fields': ('is_verified', 'phone_number')}),
+    )
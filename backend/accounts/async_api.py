@@ -0,0 +1,60 @@
+"""
+Helpers for plain Django async views.
+
+DRF's APIView is synchronous, so the async read endpoints are ordinary
+``async def`` views. ``async_api_view`` gives them the parts of the DRF
+request cycle they need: JWT authentication through
+``CachedJWTAuthentication.aauthenticate()``, DRF-shaped error bodies and
+the same JSON renderer, so responses are byte-for-byte those of the sync
+views. Views return plain data; the decorator renders it.
+"""
+from functools import wraps
+
+from django.http import HttpResponse
+from rest_framework import exceptions
+from legacy_prime_backend.renderers import FastJSONRenderer
+
+from .authentication import CachedJWTAuthentication
+
+_renderer = FastJSONRenderer()
+_authentication = CachedJWTAuthentication()
+
+
+def json_response(data, status=200, headers=None):
+    return HttpResponse(
+        _renderer.render(data), status=status, content_type='application/json', headers=headers
+    )
+
+
+def error_response(exc):
+    """Render an APIException the way DRF's exception handler does."""
+    detail = exc.detail
+    data = detail if isinstance(detail, (list, dict)) else {'detail': detail}
+    headers = None
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        headers = {'WWW-Authenticate': _authentication.authenticate_header(None)}
+    return json_response(data, exc.status_code, headers)
+
+
+def async_api_view(authenticated=True):
+    """
+    Decorate a read-only ``async def view(request, ...)`` returning data.
+    With ``authenticated``, a valid Bearer access token is required and
+    ``request.user`` / ``request.auth`` are set from it.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in ('GET', 'HEAD'):
+                    raise exceptions.MethodNotAllowed(request.method)
+                if authenticated:
+                    result = await _authentication.aauthenticate(request)
+                    if result is None:
+                        raise exceptions.NotAuthenticated()
+                    request.user, request.auth = result
+                return json_response(await view(request, *args, **kwargs))
+            except exceptions.APIException as exc:
+                return error_response(exc)
+        return wrapper
+    return decorator
@@ -0,0 +1,132 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import router
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+# Fields kept in the cached snapshot. Everything else on the user is loaded
+# lazily (Django deferred fields) the first time a view touches it, and
+# saving such an instance only writes the loaded fields back.
+SNAPSHOT_FIELDS = ("id", "username", "is_staff", "is_superuser", "is_verified", "is_active")
+
+# Bump when SNAPSHOT_FIELDS changes so old cache entries are ignored.
+SNAPSHOT_VERSION = 1
+
+
+# Caches that live inside one process. The signals in accounts/signals.py
+# only reach the worker that saved the user, so the other workers would
+# keep a deactivated or demoted user's snapshot for the whole timeout.
+LOCAL_CACHE_BACKENDS = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+def snapshot_timeout():
+    """
+    Seconds a snapshot stays cached: ``AUTH_USER_CACHE_TIMEOUT`` with a
+    shared cache, at most ``AUTH_USER_CACHE_LOCAL_TIMEOUT`` with a local one.
+    """
+    timeout = getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 300)
+    if settings.CACHES[DEFAULT_CACHE_ALIAS]["BACKEND"] in LOCAL_CACHE_BACKENDS:
+        return min(timeout, getattr(settings, "AUTH_USER_CACHE_LOCAL_TIMEOUT", 5))
+    return timeout
+
+
+def user_cache_key(user_id):
+    return f"accounts:user-snapshot:v{SNAPSHOT_VERSION}:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that serves the request user from a small cached
+    snapshot instead of loading the ``accounts.User`` row on every request.
+
+    The snapshot is dropped whenever the user is saved or deleted
+    (see ``accounts/signals.py``), so status changes such as deactivation
+    or verification take effect on the worker's next request. Other
+    workers see them once their snapshot expires: use a shared cache, or
+    the snapshot is only kept a few seconds (``snapshot_timeout()``).
+    """
+
+    @cached_property
+    def snapshot_fields(self):
+        return [
+            f.attname for f in self.user_model._meta.concrete_fields
+            if f.attname in SNAPSHOT_FIELDS
+        ]
+
+    def get_user(self, validated_token):
+        # Revocation by password hash needs the full row, so don't cache.
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+
+        user_id = self._user_id(validated_token)
+        key = user_cache_key(user_id)
+        values = cache.get(key)
+        if values is None:
+            try:
+                values = self._snapshot_query(user_id).get()
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            cache.set(key, values, snapshot_timeout())
+        return self._build_user(values)
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for plain Django async views (see accounts/async_api.py).
+        Token parsing and validation are pure CPU; only the user lookup awaits.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return await sync_to_async(super().get_user)(validated_token)
+
+        user_id = self._user_id(validated_token)
+        key = user_cache_key(user_id)
+        values = await cache.aget(key)
+        if values is None:
+            try:
+                values = await self._snapshot_query(user_id).aget()
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            await cache.aset(key, values, snapshot_timeout())
+        return self._build_user(values)
+
+    def _user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def _snapshot_query(self, user_id):
+        return (
+            self.user_model.objects
+            .filter(**{api_settings.USER_ID_FIELD: user_id})
+            .values_list(*self.snapshot_fields)
+        )
+
+    def _build_user(self, values):
+        # from_db() expects values in model field order.
+        user = self.user_model.from_db(
+            router.db_for_read(self.user_model), self.snapshot_fields, values
+        )
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
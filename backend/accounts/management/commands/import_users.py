@@ -0,0 +1,209 @@
+import csv
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from wallets.models import Wallet
+
+User = get_user_model()
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+
+# NDJSON values can be any JSON type; these columns must be strings (or absent).
+TEXT_FIELDS = ('username', 'email', 'password', 'password_hash', 'first_name', 'last_name', 'phone_number')
+
+# The rejects file is handed around to get the rows fixed: it never carries credentials.
+CREDENTIAL_FIELDS = ('password', 'password_hash')
+REDACTED = '[redacted]'
+RAW_CREDENTIAL = re.compile(r'("(?:%s)"\s*:\s*)"(?:[^"\\]|\\.)*"' % '|'.join(CREDENTIAL_FIELDS))
+
+
+def _init_worker():
+    # Needed when the pool spawns instead of forking (macOS, Windows).
+    django.setup()
+
+
+def _hash(password):
+    return make_password(password or None)
+
+
+def redacted(row):
+    """``row`` as written to the rejects file, with its credentials replaced."""
+    if isinstance(row, dict):
+        return {key: REDACTED if key in CREDENTIAL_FIELDS and value else value for key, value in row.items()}
+    if isinstance(row, str):
+        # An unparsable NDJSON line, as read.
+        return RAW_CREDENTIAL.sub(r'\1"%s"' % REDACTED, row)
+    return row
+
+
+def read_rows(path, fmt):
+    """Yield (line_number, row_dict) pairs without loading the whole file."""
+    with open(path, newline='', encoding='utf-8') as fh:
+        if fmt == 'csv':
+            reader = csv.DictReader(fh)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_num, line in enumerate(fh, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_num, {'__error__': f'Invalid JSON: {e}', '__raw__': line}
+                    continue
+                if not isinstance(row, dict):
+                    row = {'__error__': 'Expected a JSON object', '__raw__': line}
+                yield line_num, row
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import users (and their wallets) from a CSV or NDJSON file. '
+        'Columns: username, email, password or password_hash, and optionally '
+        'first_name, last_name, phone_number, is_verified.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON (.ndjson/.jsonl) file')
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes used to hash passwords')
+        parser.add_argument('--rejects', help='Where to write rejected rows (default: <path>.rejects.csv)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        chunk_size = options['chunk_size']
+        rejects_path = options['rejects'] or f'{path}.rejects.csv'
+
+        imported = rejected = 0
+        started = time.perf_counter()
+        rows = read_rows(path, fmt)
+
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool, \
+                open(rejects_path, 'w', newline='', encoding='utf-8') as rejects_fh:
+            rejects = csv.writer(rejects_fh)
+            rejects.writerow(['line', 'reason', 'row'])
+
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+
+                valid, bad = self.validate_chunk(chunk)
+                for line_num, row, reason in bad:
+                    rejects.writerow([line_num, reason, json.dumps(redacted(row), default=str)])
+                rejected += len(bad)
+
+                if valid:
+                    self.import_chunk(valid, pool, options['workers'], chunk_size)
+                    imported += len(valid)
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{imported} imported, {rejected} rejected '
+                    f'({(imported + rejected) / elapsed:.0f} rows/sec)'
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} user(s) in {elapsed:.1f}s '
+            f'({imported / elapsed if elapsed else 0:.0f} rows/sec).'
+        ))
+        if rejected:
+            self.stdout.write(self.style.WARNING(f'{rejected} row(s) rejected, see {rejects_path}'))
+
+    def validate_chunk(self, chunk):
+        """Split a chunk into rows to import and (line, row, reason) rejects."""
+        valid, bad, seen = [], [], []
+        for line_num, row in chunk:
+            if '__error__' in row:
+                bad.append((line_num, row.get('__raw__'), row['__error__']))
+                continue
+            not_text = next((f for f in TEXT_FIELDS if row.get(f) is not None and not isinstance(row[f], str)), None)
+            if not_text:
+                bad.append((line_num, row, f'{not_text} must be a string'))
+                continue
+
+            username = User.normalize_username((row.get('username') or '').strip())
+            email = User.objects.normalize_email((row.get('email') or '').strip())
+            if not username or len(username) > 150:
+                bad.append((line_num, row, 'Missing or too long username'))
+                continue
+            try:
+                validate_email(email)
+            except ValidationError:
+                bad.append((line_num, row, 'Invalid email'))
+                continue
+            if len(row.get('phone_number') or '') > 15:
+                bad.append((line_num, row, 'Phone number too long'))
+                continue
+            seen.append((line_num, row, username, email))
+
+        usernames = {s[2] for s in seen}
+        emails = {s[3] for s in seen}
+        taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        taken_emails = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+
+        for line_num, row, username, email in seen:
+            if username in taken_usernames:
+                bad.append((line_num, row, 'Username already exists'))
+            elif email in taken_emails:
+                bad.append((line_num, row, 'Email already exists'))
+            else:
+                # Also catches duplicates within the file.
+                taken_usernames.add(username)
+                taken_emails.add(email)
+                row['username'], row['email'] = username, email
+                valid.append(row)
+        return valid, bad
+
+    def import_chunk(self, rows, pool, workers, chunk_size):
+        plain = [(i, r.get('password')) for i, r in enumerate(rows) if not r.get('password_hash')]
+        hashed = pool.map(_hash, [p for _, p in plain], chunksize=max(len(plain) // workers, 1))
+        for (i, _), password in zip(plain, hashed):
+            rows[i]['password_hash'] = password
+
+        users = [
+            User(
+                username=r['username'],
+                email=r['email'],
+                password=r['password_hash'],
+                first_name=r.get('first_name') or '',
+                last_name=r.get('last_name') or '',
+                phone_number=r.get('phone_number') or '',
+                is_verified=str(r.get('is_verified', '')).strip().lower() in TRUE_VALUES,
+            )
+            for r in rows
+        ]
+
+        # bulk_create skips post_save, so wallets are created here rather than
+        # by wallets.signals.create_wallet.
+        with transaction.atomic():
+            users = User.objects.bulk_create(users, batch_size=chunk_size)
+            if any(u.pk is None for u in users):
+                # Backend can't return ids from bulk inserts; look them up.
+                ids = dict(User.objects.filter(username__in=[u.username for u in users])
+                           .values_list('username', 'id'))
+                for u in users:
+                    u.pk = ids[u.username]
+            Wallet.objects.bulk_create([Wallet(user=u) for u in users], batch_size=chunk_size)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding (and blacklisted) JWT refresh tokens in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Tokens deleted per transaction (default 5000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many tokens would be deleted')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        expired = OutstandingToken.objects.filter(expires_at__lte=now)
+
+        if options['dry_run']:
+            self.stdout.write(f'{expired.count()} expired token(s) would be deleted.')
+            return
+
+        total = 0
+        while True:
+            ids = list(expired.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                # Cascades to BlacklistedToken with a single fast delete.
+                OutstandingToken.objects.filter(id__in=ids).delete()
+            total += len(ids)
+            self.stdout.write(f'Deleted {total} expired token(s)...')
+
+        self.stdout.write(self.style.SUCCESS(f'Pruned {total} expired token(s).'))
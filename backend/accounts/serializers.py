@@ -7,7 +7,9 @@ from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.core.mail import send_mail
 from django.conf import settings
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from .models import OTPVerification
+from .tokens import RefreshToken
 
 
 
@@ -115,4 +117,9 @@ class SetNewPasswordSerializer(serializers.Serializer):
 
         validate_password(attrs["new_password"])
         attrs["user"] = user
-        return attrs
\ No newline at end of file
+        return attrs
+
+
+# Token refresh that checks the blacklist through the in-process revocation filter
+class CachedRevocationTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RefreshToken
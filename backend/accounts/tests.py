@@ -1,3 +1,299 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from wallets.models import Wallet
+from .authentication import CachedJWTAuthentication, snapshot_timeout, user_cache_key
+from .throttling import SlidingWindowThrottle
+from .tokens import BloomFilter, RefreshToken, RevocationChecker, revocation_checker
+
+User = get_user_model()
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'accounts-tests'}}
+SHARED = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/accounts-tests'}}
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    """The request user comes from a cached snapshot that user writes drop."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cached', 'cached@example.com', 'pass-12345')
+
+    def setUp(self):
+        cache.clear()
+        self.auth = CachedJWTAuthentication()
+        self.token = AccessToken.for_user(self.user)
+
+    def test_second_request_hits_the_cache(self):
+        with self.assertNumQueries(1):
+            self.auth.get_user(self.token)
+        with self.assertNumQueries(0):
+            user = self.auth.get_user(self.token)
+        self.assertEqual((user.pk, user.is_staff), (self.user.pk, False))
+
+    def test_saving_the_user_drops_the_snapshot(self):
+        self.auth.get_user(self.token)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertTrue(self.auth.get_user(self.token).is_staff)
+
+    def test_deactivated_users_are_refused(self):
+        self.auth.get_user(self.token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+    def test_process_local_caches_keep_snapshots_briefly(self):
+        with override_settings(CACHES=LOCMEM, AUTH_USER_CACHE_TIMEOUT=300, AUTH_USER_CACHE_LOCAL_TIMEOUT=5):
+            self.assertEqual(snapshot_timeout(), 5)
+            with mock.patch('accounts.authentication.cache.set') as cache_set:
+                self.auth.get_user(self.token)
+            self.assertEqual(cache_set.call_args.args[2], 5)
+        with override_settings(CACHES=SHARED, AUTH_USER_CACHE_TIMEOUT=300):
+            self.assertEqual(snapshot_timeout(), 300)
+
+
+class BloomFilterTests(TestCase):
+
+    def test_no_false_negatives_and_few_false_positives(self):
+        bloom = BloomFilter(capacity=2000, error_rate=0.01)
+        added = [f'jti-{i}' for i in range(2000)]
+        for value in added:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in added))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives / 10000, 0.03)
+
+
+class RevocationCheckerTests(TestCase):
+    """Blacklisted refresh tokens are always refused; unknown ones skip the database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('revoker', 'revoker@example.com', 'pass-12345')
+
+    def setUp(self):
+        revocation_checker.reset()
+        # Another worker's view of the blacklist, synced on every check.
+        self.other = RevocationChecker(refresh_seconds=0)
+
+    def blacklist(self):
+        token = RefreshToken.for_user(self.user)
+        token.blacklist()
+        return token
+
+    def test_blacklisted_tokens_are_refused(self):
+        revocation_checker.sync()
+        token = self.blacklist()
+        with self.assertRaises(TokenError):
+            RefreshToken(str(token))
+        self.assertTrue(self.other.is_revoked(token['jti']))
+
+    def test_unknown_tokens_skip_the_database(self):
+        self.blacklist()
+        self.other.refresh_seconds = 60
+        self.other.sync()
+        with self.assertNumQueries(0):
+            self.assertFalse(self.other.is_revoked('never-issued'))
+
+    def test_top_up_reads_only_new_rows(self):
+        first = self.blacklist()
+        self.other.sync()
+        built = self.other._filter
+        second = self.blacklist()
+        with self.assertNumQueries(1):
+            self.other._top_up()
+        self.assertIs(self.other._filter, built)
+        self.assertEqual(self.other._last_id, BlacklistedToken.objects.get(token__jti=second['jti']).pk)
+        self.assertIn(first['jti'], self.other._filter)
+        self.assertIn(second['jti'], self.other._filter)
+
+    def test_full_filter_is_rebuilt(self):
+        self.other.sync()
+        self.other._filter.count = self.other._filter.capacity
+        self.blacklist()
+        self.other._top_up()
+        self.assertEqual(self.other._filter.count, 1)
+
+    def test_rebuild_forgets_pruned_tokens(self):
+        token = self.blacklist()
+        self.other.sync()
+        self.assertIn(token['jti'], self.other._filter)
+        OutstandingToken.objects.filter(jti=token['jti']).delete()
+        self.other.rebuild_seconds = 0
+        self.other.sync()
+        self.assertNotIn(token['jti'], self.other._filter)
+        self.assertFalse(self.other.is_revoked(token['jti']))
+
+
+class PruneTokensTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('pruned', 'pruned@example.com', 'pass-12345')
+        tokens = [RefreshToken.for_user(user) for _ in range(5)]
+        tokens[0].blacklist()
+        OutstandingToken.objects.filter(jti__in=[t['jti'] for t in tokens[:3]]).update(
+            expires_at=timezone.now() - timedelta(minutes=1),
+        )
+
+    def prune(self, *args):
+        out = io.StringIO()
+        call_command('prune_tokens', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        self.assertIn('3 expired token(s) would be deleted.', self.prune('--dry-run'))
+        self.assertEqual(OutstandingToken.objects.count(), 5)
+
+    def test_expired_tokens_are_deleted_in_batches(self):
+        output = self.prune('--batch-size', '2')
+        self.assertIn('Deleted 2 expired token(s)...', output)
+        self.assertIn('Deleted 3 expired token(s)...', output)
+        self.assertIn('Pruned 3 expired token(s).', output)
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class SlidingWindowThrottleTests(TestCase):
+    """The previous window counts in proportion to how much of it the sliding window still covers."""
+
+    class Throttle(SlidingWindowThrottle):
+        scope = 'sliding_test'
+        rate = '10/min'
+
+        def get_ident_value(self, request):
+            return 'client'
+
+    def setUp(self):
+        cache.clear()
+        self.now = 6000.0  # the start of a window
+
+    def check(self):
+        throttle = self.Throttle()
+        throttle.timer = lambda: self.now
+        return throttle.allow_request(None, None), throttle
+
+    def test_full_window_then_weighted_previous(self):
+        self.assertTrue(all(self.check()[0] for _ in range(10)))
+        allowed, throttle = self.check()
+        self.assertFalse(allowed)
+        self.assertEqual(throttle.wait(), 60)
+
+        # Halfway into the next window the last one weighs 10 * 0.5 = 5.
+        self.now += 90
+        self.assertTrue(all(self.check()[0] for _ in range(5)))
+        allowed, throttle = self.check()
+        self.assertFalse(allowed)
+        # 10 * (1 - t / 60) + 5 < 10 from t = 36, 6 s from now.
+        self.assertEqual(throttle.wait(), 6)
+        self.now += 6
+        self.assertTrue(self.check()[0])
+
+    def test_windows_two_back_no_longer_count(self):
+        for _ in range(10):
+            self.check()
+        self.now += 120
+        self.assertTrue(all(self.check()[0] for _ in range(10)))
+
+
+class RegisterThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def register(self, email, ip):
+        return self.client.post(
+            reverse('register'), {'email': email, 'username': email.split('@')[0], 'password': 'pass-12345'},
+            REMOTE_ADDR=ip,
+        )
+
+    def test_one_address_from_rotating_ips_is_throttled(self):
+        with mock.patch.dict(SlidingWindowThrottle.THROTTLE_RATES, {'register_email': '2/hour'}):
+            for i in range(2):
+                self.assertNotEqual(self.register('sprayed@example.com', f'10.0.0.{i}').status_code, 429)
+            response = self.register('Sprayed@Example.com ', '10.0.0.9')
+            self.assertEqual(response.status_code, 429)
+            # The rest of the current hour's window.
+            self.assertIn(int(response['Retry-After']), range(1, 3601))
+            self.assertNotEqual(self.register('other@example.com', '10.0.0.9').status_code, 429)
+
+
+class LoginThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_root_token_endpoint_is_throttled(self):
+        with mock.patch.dict(SlidingWindowThrottle.THROTTLE_RATES, {'login_email': '2/hour'}):
+            for path in ('/api/accounts/token/', '/api/token/'):
+                response = self.client.post(path, {'email': 'guessed@example.com', 'password': 'wrong'}, REMOTE_ADDR='10.0.1.1')
+                self.assertNotEqual(response.status_code, 429)
+            response = self.client.post('/api/token/', {'email': 'guessed@example.com', 'password': 'wrong'}, REMOTE_ADDR='10.0.1.2')
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('Retry-After', response)
+
+
+class ImportUsersTests(TestCase):
+    """Bad rows go to the rejects file, without their passwords."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        User.objects.create_user('taken', 'taken@example.com', 'pass-12345')
+
+    def run_import(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(content)
+        call_command('import_users', path, '--workers', '1', stdout=io.StringIO())
+        with open(f'{path}.rejects.csv', newline='', encoding='utf-8') as fh:
+            return list(csv.reader(fh))[1:]
+
+    def test_csv_rejects_are_redacted(self):
+        rejects = self.run_import('users.csv', (
+            'username,email,password\n'
+            'fresh,fresh@example.com,Fresh-Secret-1\n'
+            'broken,not-an-email,Broken-Secret-2\n'
+            'taken,other@example.com,Taken-Secret-3\n'
+        ))
+        self.assertTrue(User.objects.get(username='fresh').check_password('Fresh-Secret-1'))
+        self.assertTrue(Wallet.objects.filter(user__username='fresh').exists())
+        self.assertEqual([(line, reason) for line, reason, _ in rejects], [
+            ('3', 'Invalid email'), ('4', 'Username already exists'),
+        ])
+        self.assertEqual(json.loads(rejects[0][2]), {
+            'username': 'broken', 'email': 'not-an-email', 'password': '[redacted]',
+        })
+        self.assertNotIn('Secret', str(rejects))
+
+    def test_ndjson_rejects_are_redacted(self):
+        rejects = self.run_import('users.ndjson', '\n'.join([
+            json.dumps({'username': 'hashed', 'email': 'bad', 'password_hash': 'pbkdf2_sha256$1$salt$Secret'}),
+            '{"username": "cut", "password": "Cut-Secret-4", "email": ',
+            json.dumps({'username': 5, 'email': 'five@example.com', 'password': 'Five-Secret-5'}),
+            json.dumps({'username': 'six', 'email': ['six@example.com'], 'password': 'Six-Secret-6'}),
+        ]) + '\n')
+        self.assertEqual([reason for _, reason, _ in rejects][0], 'Invalid email')
+        self.assertEqual([reason for _, reason, _ in rejects][2:], ['username must be a string', 'email must be a string'])
+        self.assertTrue(rejects[1][1].startswith('Invalid JSON'))
+        self.assertIn('"password": "[redacted]"', json.loads(rejects[1][2]))
+        self.assertNotIn('Secret', str(rejects))
@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import math
+from collections import Counter
+
+from rest_framework.throttling import SimpleRateThrottle
+
+logger = logging.getLogger(__name__)
+
+# Rejections seen by this process, per scope. The shared totals live in the
+# cache under REJECTED_KEY and are what `throttle_stats()` reports.
+rejected = Counter()
+REJECTED_KEY = 'throttle:rejected:%s'
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Sliding-window counter throttle.
+
+    Instead of DRF's per-client timestamp list, each client has one counter
+    per fixed window. The current rate is estimated as the current window's
+    count plus the previous window's count weighted by how much of it still
+    overlaps the sliding window, so every check costs one `get_many` and
+    every accepted request one `incr`, whatever the limit.
+
+    Rates come from ``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'][scope]``.
+    """
+
+    cache_format = 'throttle:%(scope)s:%(ident)s:%(window)s'
+
+    def get_ident_value(self, request):
+        """Return the value to limit on, or None to skip throttling."""
+        raise NotImplementedError('.get_ident_value() must be overridden')
+
+    def get_cache_key(self, request, view):
+        return self.get_ident_value(request)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        ident = self.get_cache_key(request, view)
+        if ident is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.key = self.cache_format % {'scope': self.scope, 'ident': ident, 'window': window}
+        previous_key = self.cache_format % {'scope': self.scope, 'ident': ident, 'window': window - 1}
+
+        counts = self.cache.get_many([self.key, previous_key])
+        self.elapsed = self.now - window * self.duration
+        self.previous = counts.get(previous_key, 0)
+        self.current = counts.get(self.key, 0)
+
+        weight = 1 - self.elapsed / self.duration
+        if self.previous * weight + self.current >= self.num_requests:
+            return self.throttle_failure()
+        return self.throttle_success()
+
+    def throttle_success(self):
+        # Keep each window long enough to act as the "previous" one.
+        self.cache.add(self.key, 0, self.duration * 2)
+        try:
+            self.cache.incr(self.key)
+        except ValueError:
+            # Expired between add() and incr(); start the window again.
+            self.cache.set(self.key, 1, self.duration * 2)
+        return True
+
+    def throttle_failure(self):
+        rejected[self.scope] += 1
+        key = REJECTED_KEY % self.scope
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            pass
+        logger.warning('Throttled request in scope %s', self.scope)
+        return False
+
+    def wait(self):
+        """Seconds until the estimate drops back under the limit."""
+        if self.current >= self.num_requests:
+            return self.duration - self.elapsed
+        if not self.previous:
+            return None
+        # Solve previous * (1 - t / duration) + current < num_requests for t.
+        needed = (self.previous + self.current - self.num_requests + 1) / self.previous
+        return max(math.ceil(needed * self.duration - self.elapsed), 1)
+
+
+class IPRateThrottle(SlidingWindowThrottle):
+    """Limit on the client IP (honours NUM_PROXIES like DRF's throttles)."""
+
+    def get_ident_value(self, request):
+        return self.get_ident(request)
+
+
+class EmailRateThrottle(SlidingWindowThrottle):
+    """Limit on the email address in the request body."""
+
+    fields = ('email', 'username')
+
+    def get_ident_value(self, request):
+        try:
+            data = request.data
+        except Exception:
+            return None
+        for field in self.fields:
+            value = data.get(field) if hasattr(data, 'get') else None
+            if value:
+                return hashlib.sha256(str(value).strip().lower().encode()).hexdigest()
+        return None
+
+
+class LoginIPThrottle(IPRateThrottle):
+    scope = 'login_ip'
+
+
+class LoginEmailThrottle(EmailRateThrottle):
+    scope = 'login_email'
+
+
+class RegisterIPThrottle(IPRateThrottle):
+    scope = 'register_ip'
+
+
+class RegisterEmailThrottle(EmailRateThrottle):
+    scope = 'register_email'
+    fields = ('email',)
+
+
+class OTPIPThrottle(IPRateThrottle):
+    scope = 'otp_ip'
+
+
+class OTPEmailThrottle(EmailRateThrottle):
+    scope = 'otp_email'
+    fields = ('email',)
+
+
+def throttle_stats():
+    """Rejected request totals per scope, shared across workers via the cache."""
+    scopes = sorted(SlidingWindowThrottle.THROTTLE_RATES)
+    totals = SlidingWindowThrottle.cache.get_many([REJECTED_KEY % s for s in scopes])
+    return {
+        scope: {
+            'rate': SlidingWindowThrottle.THROTTLE_RATES[scope],
+            'rejected': totals.get(REJECTED_KEY % scope, 0),
+            'rejected_this_process': rejected[scope],
+        }
+        for scope in scopes
+    }
@@ -0,0 +1,137 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    ``x in bf`` is False only if ``x`` was never added; a True answer can be
+    a false positive (about ``error_rate`` of the time at full capacity).
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class RevocationChecker:
+    """
+    In-process view of the token blacklist.
+
+    Blacklisted JTIs are kept in a Bloom filter that is topped up with new
+    ``BlacklistedToken`` rows (by id) at most every ``refresh_seconds`` and
+    rebuilt from scratch every ``rebuild_seconds`` so pruned tokens fall
+    out. Only JTIs the filter reports as possibly revoked hit the database.
+    """
+
+    def __init__(self, refresh_seconds=5, rebuild_seconds=3600, error_rate=0.01):
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._filter = None
+        self._last_id = 0
+        self._built_at = 0.0
+        self._checked_at = 0.0
+
+    def _rebuild(self):
+        rows = BlacklistedToken.objects.order_by("id").values_list("id", "token__jti")
+        bloom = BloomFilter(max(rows.count() * 2, 1024), self.error_rate)
+        last_id = 0
+        for pk, jti in rows.iterator(chunk_size=5000):
+            bloom.add(jti)
+            last_id = pk
+        self._filter, self._last_id = bloom, last_id
+        self._built_at = time.monotonic()
+
+    def _top_up(self):
+        rows = (
+            BlacklistedToken.objects.filter(id__gt=self._last_id)
+            .order_by("id")
+            .values_list("id", "token__jti")
+        )
+        for pk, jti in rows.iterator(chunk_size=5000):
+            self._filter.add(jti)
+            self._last_id = pk
+        if self._filter.count > self._filter.capacity:
+            self._rebuild()
+
+    def sync(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_seconds:
+            return
+        with self._lock:
+            if now - self._checked_at < self.refresh_seconds:
+                return
+            if self._filter is None or now - self._built_at > self.rebuild_seconds:
+                self._rebuild()
+            else:
+                self._top_up()
+            self._checked_at = now
+
+    def add(self, jti):
+        """Record a JTI this process has just blacklisted."""
+        if self._filter is not None:
+            self._filter.add(jti)
+
+    def is_revoked(self, jti):
+        self.sync()
+        if jti not in self._filter:
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+revocation_checker = RevocationChecker(
+    refresh_seconds=getattr(settings, "TOKEN_REVOCATION_REFRESH_SECONDS", 5),
+    rebuild_seconds=getattr(settings, "TOKEN_REVOCATION_REBUILD_SECONDS", 3600),
+)
+
+
+class RefreshToken(BaseRefreshToken):
+    """
+    Refresh token whose blacklist check goes through ``revocation_checker``
+    instead of querying ``BlacklistedToken`` every time.
+    """
+
+    def check_blacklist(self):
+        if revocation_checker.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        blacklisted, created = super().blacklist()
+        if not created:
+            # Another worker blacklisted it after our filter was last synced.
+            raise TokenError(_("Token is blacklisted"))
+        revocation_checker.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted, created
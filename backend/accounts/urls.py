@@ -11,6 +11,7 @@ from .views import (
     LogoutView,
     CustomTokenObtainPairView,
     VerifyResetOTPView,
+    ThrottleStatsView,
 )
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -34,4 +35,7 @@ urlpatterns = [
     path('verify-otp/', VerifyOTPView.as_view(), name='verify-otp'),
     path('verify-reset-otp/', VerifyResetOTPView.as_view(), name='verify-reset-otp'),
     path('resend-otp/', ResendOTPView.as_view(), name='resend-otp'),
+
+    # Admin: rate limiting stats
+    path('throttle-stats/', ThrottleStatsView.as_view(), name='throttle-stats'),
 ]
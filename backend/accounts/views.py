@@ -1,10 +1,12 @@
+import logging
+
 from django.http import JsonResponse
 from django.core.mail import send_mail
 from django.conf import settings
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import RefreshToken
 from django.contrib.auth import get_user_model
 from .serializers import (
     RegisterSerializer, 
@@ -15,9 +17,19 @@ from .serializers import (
 )
 
 from .models import OTPVerification
+from .throttling import (
+    LoginEmailThrottle,
+    LoginIPThrottle,
+    OTPEmailThrottle,
+    OTPIPThrottle,
+    RegisterEmailThrottle,
+    RegisterIPThrottle,
+    throttle_stats,
+)
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.contrib.auth.tokens import PasswordResetTokenGenerator 
+from monitoring.logs import event
 # from .serializers import ResetPasswordRequestSerializer, SetNewPasswordSerializer
 # from django.core.mail import send_mail
 
@@ -26,12 +38,14 @@ def index(request):
     return JsonResponse({"message": "Accounts API is working!"})
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 # Registration endpoint
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegisterIPThrottle, RegisterEmailThrottle]
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -97,6 +111,7 @@ class VerifyOTPView(APIView):
 
 class ResendOTPView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [OTPIPThrottle, OTPEmailThrottle]
     
     def post(self, request):
         email = request.data.get('email')
@@ -182,6 +197,7 @@ class ChangePasswordView(generics.UpdateAPIView):
 # Password reset request endpoint
 class ResetPasswordRequestView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [OTPIPThrottle, OTPEmailThrottle]
     def post(self, request):
         # Use OTP flow for password reset in development
         serializer = ResetPasswordRequestSerializer(data=request.data)
@@ -191,6 +207,7 @@ class ResetPasswordRequestView(APIView):
         try:
             user = User.objects.get(email=email)
         except User.DoesNotExist:
+            event(logger, 'auth.password_reset.unknown_email', email=email)
             # Do not reveal whether the email exists
             return Response({"message": "If that email exists, an OTP will be sent."})
 
@@ -210,10 +227,11 @@ This code will expire in 10 minutes. Do not share this code with anyone.'''
                 [email],
                 fail_silently=False,
             )
-        except Exception as e:
-            print(f"Failed to send reset OTP email: {e}")
+        except Exception:
+            event(logger, 'auth.password_reset.email_failed', logging.ERROR, exc_info=True, user_id=user.pk)
             return Response({"message": "Failed to send reset code."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        event(logger, 'auth.password_reset.sent', user_id=user.pk)
         return Response({"message": "Password reset code sent to email."})
 
 
@@ -296,6 +314,7 @@ from django.contrib.auth import authenticate
 
 class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = "email"
+    token_class = RefreshToken
 
     def validate(self, attrs):
         email = attrs.get("email")
@@ -305,9 +324,8 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
             # Check if user exists first
             try:
                 user = User.objects.get(email=email)
-                print(f"Found user {user.username} with email {email}")
             except User.DoesNotExist:
-                print(f"No user found with email {email}")
+                event(logger, 'auth.login.unknown_email', logging.WARNING, email=email)
                 raise InvalidToken("No active account found with the given credentials")
 
             # Now try to authenticate
@@ -318,14 +336,14 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
             )
 
             if not user:
-                print(f"Authentication failed for email {email}")
+                event(logger, 'auth.login.bad_password', logging.WARNING, email=email)
                 raise InvalidToken("No active account found with the given credentials")
 
             if not user.is_active:
-                print(f"User {user.username} is not active")
+                event(logger, 'auth.login.inactive', logging.WARNING, user_id=user.pk)
                 raise InvalidToken("User account is disabled")
 
-            print(f"Successful authentication for {user.username}")
+            event(logger, 'auth.login.succeeded', user_id=user.pk)
             refresh = self.get_token(user)
 
             return {
@@ -338,32 +356,37 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
 class CustomTokenObtainPairView(TokenObtainPairView):
     """Custom token view that handles login with email."""
     serializer_class = EmailTokenObtainPairSerializer
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
 
     def post(self, request, *args, **kwargs):
-        print("Login attempt data:", request.data)
-        
         # Rename username field to email if it exists
         if "username" in request.data:
             request.data["email"] = request.data.pop("username")
         
         try:
-            response = super().post(request, *args, **kwargs)
-            print("Login successful")
-            return response
+            return super().post(request, *args, **kwargs)
         except InvalidToken as e:
-            print("Login error:", str(e))
+            # Logged by the serializer, which knows why
             return Response(
                 {"detail": str(e)},
                 status=status.HTTP_401_UNAUTHORIZED
             )
-        except Exception as e:
-            print("Unexpected login error:", str(e))
+        except Exception:
+            event(logger, 'auth.login.error', logging.ERROR, exc_info=True)
             return Response(
                 {"detail": "An error occurred during login. Please try again."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
 
+class ThrottleStatsView(APIView):
+    """Admin: rejected request counts for each rate-limit scope."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(throttle_stats())
+
+
 class LogoutView(APIView):
     """Invalidate/blacklist the provided refresh token so it can't be reused.
 
@@ -0,0 +1,10 @@
+"""
+Standalone performance benchmarks for the Legacy Prime backend.
+
+Run them from the ``backend`` directory, for example::
+
+    python -m benchmarks.auth_queries
+
+Each benchmark builds a throwaway test database, so the development
+``db.sqlite3`` is never touched.
+"""
@@ -0,0 +1,153 @@
+"""
+Admin change list page loads on a large deposits table, with the stock
+ModelAdmin change list (exact COUNT(*), full result count, DISTINCT date
+drill-down) against LargeTableAdminMixin (legacy_prime_backend/large_admin.py).
+
+    python -m benchmarks.admin_changelist --rows 10000000
+
+The tracked figure is the 10M-row run. Smaller --rows values are for
+trying changes out. Rows are spread over three years and three statuses
+and are inserted with plain executemany into an on-disk test database.
+Seeding 10M rows into SQLite takes around half an hour. Each page is the mean of --repeat
+loads, after one warm-up load:
+
+* the unfiltered list;
+* one year of the date drill-down;
+* a status filter;
+* page 50.
+
+Exits with status 1 if any page exceeds --target-ms (default
+ADMIN_PAGE_TARGET_MS) with the mixin.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import create_user, print_table, setup, test_database
+from benchmarks.load_test import RESULTS_DIR
+
+ADMIN_PAGE_TARGET_MS = 300
+BATCH = 100_000
+USERS = 1000
+
+
+def seed(connection, rows):
+    from investments.models import Deposit
+
+    users = [create_user(f'admin-bench-{i}', password=None).pk for i in range(USERS)]
+    start = datetime(2022, 1, 1)
+    span = int(timedelta(days=3 * 365).total_seconds())
+    table = Deposit._meta.db_table
+    sql = (
+        f'INSERT INTO {table} (user_id, amount, proof, proof_thumbnail, proof_state, status, created_at, updated_at) '
+        f'VALUES (%s, %s, %s, %s, %s, %s, %s, %s)'
+    )
+    rng = random.Random(46)
+    with connection.cursor() as cursor:
+        for offset in range(0, rows, BATCH):
+            batch = []
+            for _ in range(min(BATCH, rows - offset)):
+                when = (start + timedelta(seconds=rng.randrange(span))).strftime('%Y-%m-%d %H:%M:%S')
+                status = rng.choices(('approved', 'rejected', 'pending'), (85, 10, 5))[0]
+                batch.append((
+                    rng.choice(users), '50.00', 'deposits/proof.jpg', 'deposits/thumbnails/proof.jpg', 'ready',
+                    status, when, when,
+                ))
+            cursor.executemany(sql, batch)
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def measure(client, url, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    client.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            response = client.get(url)
+        elapsed = (time.perf_counter() - start) / repeat
+    assert response.status_code == 200, (url, response.status_code)
+    slowest = max(queries, key=lambda query: float(query['time']), default=None)
+    return {
+        'ms': round(elapsed * 1000, 1),
+        'queries': len(queries) // repeat,
+        'slowest_sql': slowest['sql'][:120] if slowest else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--target-ms', type=float, default=ADMIN_PAGE_TARGET_MS)
+    parser.add_argument('--output', help=f'Results file (default: {RESULTS_DIR}/admin-<timestamp>.json)')
+    args = parser.parse_args()
+
+    setup()
+
+    from unittest import mock
+
+    from django.contrib import admin
+    from django.contrib.admin.views.main import ChangeList
+    from django.core.paginator import Paginator
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from investments.models import Deposit
+
+    pages = {
+        'list': '',
+        'year': '?created_at__year=2023',
+        'status filter': '?status__exact=pending',
+        'page 50': '?p=50',
+    }
+
+    with test_database(on_disk=True) as connection:
+        began = time.perf_counter()
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=None):
+            seed(connection, args.rows)
+        print(f'Seeded {args.rows:,} deposits in {time.perf_counter() - began:.0f}s')
+
+        client = Client()
+        client.force_login(create_user('admin-bench', is_staff=True, is_superuser=True))
+        base = reverse('admin:investments_deposit_changelist')
+        model_admin = admin.site._registry[Deposit]
+        stock = mock.patch.multiple(
+            model_admin,
+            show_full_result_count=True,
+            get_changelist=lambda request, **kwargs: ChangeList,
+            get_paginator=lambda request, queryset, per_page, *args, **kwargs: Paginator(queryset, per_page, *args, **kwargs),
+        )
+
+        results, rows = {}, []
+        for name, query in pages.items():
+            with stock:
+                before = measure(client, base + query, args.repeat)
+            after = measure(client, base + query, args.repeat)
+            results[name] = {'stock': before, 'large_table': after}
+            rows.append((name, before['ms'], before['queries'], after['ms'], after['queries'],
+                         f"{before['ms'] / after['ms']:.1f}x" if after['ms'] else '-'))
+
+    print(f'Deposit change list, {args.rows:,} rows, mean of {args.repeat} loads')
+    print_table(rows, ('page', 'stock ms', 'queries', 'mixin ms', 'queries', 'speed-up'))
+    worst = max(result['large_table']['ms'] for result in results.values())
+    met = worst <= args.target_ms
+    print(f'Slowest page with the mixin: {worst} ms (target {args.target_ms} ms): {"met" if met else "MISSED"}')
+
+    output = args.output or os.path.join(RESULTS_DIR, f"admin-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as fh:
+        json.dump({'args': vars(args), 'target_ms': args.target_ms, 'met': met, 'results': results}, fh, indent=2)
+    print(f'Results saved to {output}')
+    sys.exit(0 if met else 1)
+
+
+if __name__ == '__main__':
+    main()
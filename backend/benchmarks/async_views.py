@@ -0,0 +1,114 @@
+"""
+Sync (DRF) versus async dashboard endpoints on one ASGI worker.
+
+Each simulated dashboard session fetches overview, wallet, plans, history
+and active investments at once, the way the frontend does, then repeats.
+Requests go through Django's ASGI handler in-process (no network), so the
+numbers isolate how one worker's event loop copes as sessions pile up:
+sync views are funnelled through a single sync_to_async thread, async
+views only leave the loop for the database.
+
+    python -m benchmarks.async_views --users 200 --sessions 1 10 50 200
+
+The per-user response cache is off unless --cache is given, so both sides
+do the full work on every request.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+from datetime import datetime
+
+from benchmarks.common import bearer, print_table, setup, test_database
+from benchmarks.load_test import RESULTS_DIR, percentile
+
+ENDPOINTS = {
+    'sync': (
+        '/api/investments/overview/', '/api/wallet/', '/api/investments/plans/',
+        '/api/transactions/', '/api/investments/active/',
+    ),
+    'async': (
+        '/api/investments/async/overview/', '/api/wallet/async/', '/api/investments/async/plans/',
+        '/api/transactions/async/', '/api/investments/async/active/',
+    ),
+}
+
+
+async def drive(paths, headers, sessions, rounds):
+    """Run ``sessions`` concurrent dashboard sessions of ``rounds`` page loads each."""
+    from django.test import AsyncClient
+
+    latencies, errors = [], 0
+
+    async def session(index):
+        nonlocal errors
+        client = AsyncClient()
+        auth = headers[index % len(headers)]
+        for _ in range(rounds):
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(client.get(path, headers=auth) for path in paths))
+            latencies.append(time.perf_counter() - start)
+            errors += sum(1 for r in responses if r.status_code != 200)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200, help='Users to seed')
+    parser.add_argument('--tx-per-user', type=float, default=20)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 10, 50, 200],
+                        help='Concurrent dashboard sessions to test')
+    parser.add_argument('--rounds', type=int, default=5, help='Page loads per session')
+    parser.add_argument('--cache', action='store_true', help='Keep the per-user response cache on')
+    parser.add_argument('--output', help=f'Results file (default: {RESULTS_DIR}/async-<timestamp>.json)')
+    args = parser.parse_args()
+
+    setup()
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    settings.ALLOWED_HOSTS = ['*']
+    if not args.cache:
+        settings.USER_RESPONSE_CACHE_TIMEOUT = 0
+
+    results = {}
+    with test_database(on_disk=True):
+        call_command('seed_scale', users=args.users, tx_per_user=args.tx_per_user, workers=0, stdout=io.StringIO())
+        users = get_user_model().objects.filter(username__startswith='seed').order_by('pk')[:max(args.sessions)]
+        headers = [{'Authorization': bearer(user)} for user in users]
+
+        rows = []
+        for sessions in args.sessions:
+            for mode, paths in ENDPOINTS.items():
+                asyncio.run(drive(paths, headers, 1, 1))  # warm up
+                latencies, errors, elapsed = asyncio.run(drive(paths, headers, sessions, args.rounds))
+                latencies.sort()
+                result = {
+                    'page_loads_per_sec': round(len(latencies) / elapsed, 2),
+                    'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+                    'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+                    'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+                    'errors': errors,
+                }
+                results[f'{mode}@{sessions}'] = result
+                rows.append((sessions, mode, result['page_loads_per_sec'], result['p50_ms'],
+                             result['p95_ms'], result['p99_ms'], errors))
+
+    print_table(rows, ('sessions', 'mode', 'loads/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"async-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w') as fh:
+        json.dump({'args': vars(args), 'results': results}, fh, indent=2)
+    print(f'Results saved to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Queries and time per authenticated request, before and after the cached
+JWT user snapshot.
+
+    python -m benchmarks.auth_queries [--requests 500]
+"""
+import argparse
+
+from benchmarks.common import bearer, create_user, print_table, setup, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    setup()
+
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+
+    from accounts.authentication import CachedJWTAuthentication
+
+    with test_database():
+        cache.clear()
+        user = create_user()
+        header = bearer(user)
+        factory = APIRequestFactory()
+
+        rows = []
+        for label, auth_class in (
+            ('JWTAuthentication', JWTAuthentication),
+            ('CachedJWTAuthentication', CachedJWTAuthentication),
+        ):
+            auth = auth_class()
+            request = Request(factory.get('/', HTTP_AUTHORIZATION=header))
+            auth.authenticate(request)  # warm the cache for the cached class
+
+            with CaptureQueriesContext(connection) as ctx:
+                seconds = timed(lambda: auth.authenticate(request), args.requests)
+            rows.append((
+                label,
+                f'{len(ctx) / args.requests:.2f}',
+                f'{seconds * 1e6:.1f}',
+            ))
+
+        print_table(rows, ('authentication', 'queries/auth', 'us/auth'))
+        print()
+
+        client = Client(HTTP_AUTHORIZATION=header)
+        endpoints = ('/api/investments/my/', '/api/investments/active/', '/api/wallet/', '/api/transactions/')
+        rows = []
+        for url in endpoints:
+            client.get(url)
+            with CaptureQueriesContext(connection) as ctx:
+                client.get(url)
+            rows.append((url, len(ctx)))
+        print('With the configured authentication class:')
+        print_table(rows, ('endpoint', 'queries/request'))
+
+
+if __name__ == '__main__':
+    main()
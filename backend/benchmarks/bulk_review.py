@@ -0,0 +1,110 @@
+"""
+Throughput of bulk deposit and withdrawal review (investments/bulk.py)
+against reviewing the same rows one request at a time.
+
+    python -m benchmarks.bulk_review [--items 2000] [--users 200]
+
+For each kind, --items pending rows spread over --users users are seeded
+twice. Each user's wallet is funded to cover their withdrawals.
+
+* One at a time: each row is approved in its own transaction. The row and
+  its wallet are locked, Wallet.deposit()/withdraw() moves the balance, and
+  the row's status and its history entry are written. The
+  approve-deposit/ and approve-withdrawal/ endpoints are not the baseline:
+  they review their one row through the bulk code too. Saving the row
+  would also fire the transactions post_save receivers, which mark it
+  failed.
+* Bulk: a single POST of every id to deposits/bulk-review/ or
+  withdrawals/bulk-review/.
+
+Reported per mode: wall time, rows per second and queries per row.
+"""
+import argparse
+import time
+from decimal import Decimal
+
+from benchmarks.common import create_user, print_table, setup, test_database
+
+
+def seed(model, users, items):
+    extra = {'proof': 'deposits/proof.png'} if model.__name__ == 'Deposit' else {'wallet_address': 'T' * 34}
+    rows = model.objects.bulk_create([
+        model(user=users[i % len(users)], amount=Decimal('25.00'), status='pending', **extra)
+        for i in range(items)
+    ])
+    return [row.pk for row in rows]
+
+
+def one_at_a_time(model, ids):
+    from django.db import transaction
+    from django.db.models.functions import Now
+
+    from investments.bulk import HISTORY
+    from investments.models import Deposit
+    from transactions.models import TransactionHistory
+    from wallets.models import Wallet
+
+    for pk in ids:
+        with transaction.atomic():
+            row = model.objects.select_for_update().get(pk=pk)
+            wallet = Wallet.objects.select_for_update().get(user_id=row.user_id)
+            before = wallet.balance
+            if (wallet.deposit if model is Deposit else wallet.withdraw)(row.amount):
+                model.objects.filter(pk=pk).update(status='approved', updated_at=Now())
+                kind, prefix, description = HISTORY[model]
+                TransactionHistory.objects.create(
+                    user_id=row.user_id, transaction_type=kind, amount=row.amount, description=description,
+                    balance_before=before, balance_after=wallet.balance, reference=f'{prefix}-{pk}',
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=200)
+    args = parser.parse_args()
+
+    setup()
+
+    from django.db import connection
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+
+    from investments.models import Deposit, Withdrawal
+    from wallets.models import Wallet
+
+    rows = []
+    with test_database(), override_settings(SLOW_QUERY_THRESHOLD_MS=None):
+        admin = create_user('bulk-admin', is_staff=True, is_superuser=True)
+        client = APIClient()
+        client.force_authenticate(admin)
+        for model, bulk in (
+            (Deposit, '/api/investments/deposits/bulk-review/'),
+            (Withdrawal, '/api/investments/withdrawals/bulk-review/'),
+        ):
+            name = model._meta.verbose_name_plural
+            for mode in ('one at a time', 'bulk'):
+                users = [create_user(f'bulk-{name}-{mode[0]}-{i}', password=None) for i in range(args.users)]
+                Wallet.objects.filter(user__in=users).update(balance=Decimal('25.00') * args.items)
+                ids = seed(model, users, args.items)
+                queries = []
+                with connection.execute_wrapper(lambda execute, sql, *rest: queries.append(sql) or execute(sql, *rest)):
+                    start = time.perf_counter()
+                    if mode == 'bulk':
+                        response = client.post(bulk, {'ids': ids, 'action': 'approve'}, format='json')
+                        assert response.status_code == 200, response.content
+                    else:
+                        one_at_a_time(model, ids)
+                    elapsed = time.perf_counter() - start
+                approved = model.objects.filter(pk__in=ids, status='approved').count()
+                rows.append((
+                    name, mode, f'{elapsed:.2f}', f'{args.items / elapsed:,.0f}',
+                    f'{len(queries) / args.items:.2f}', f'{approved:,}',
+                ))
+
+    print(f'{args.items:,} pending rows per run over {args.users:,} users')
+    print_table(rows, ('rows', 'mode', 'seconds', 'rows/s', 'queries/row', 'approved'))
+
+
+if __name__ == '__main__':
+    main()
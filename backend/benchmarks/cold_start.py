@@ -0,0 +1,201 @@
+"""
+Cold start: how long a fresh process takes to import Django and the
+project and answer its first request. On a serverless platform this is
+latency every cold invocation adds.
+
+Each run starts a new interpreter. It sets up Django, builds the WSGI
+handler and serves the first request in-process, timing each phase.
+The medians of several runs are reported for the stock and lean
+(LEGACY_PRIME_LEAN_STARTUP=1) configurations:
+
+    python -m benchmarks.cold_start --runs 10
+
+Exits with status 1 if the lean median exceeds the target (--target-ms,
+default COLD_START_TARGET_MS). `python manage.py startup_profile` breaks
+one start down by module.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.common import print_table
+from benchmarks.load_test import RESULTS_DIR
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Median wall time, process start to first response, of a lean start.
+# Measured at 0.6-0.9s on a single shared CPU; the target leaves headroom
+# for noise but catches a heavy import creeping into startup.
+COLD_START_TARGET_MS = 1200
+
+PHASES = ('interpreter', 'settings', 'apps', 'handler', 'first_request')
+
+# Runs in the child interpreter. Phase markers go to stderr so that
+# -X importtime output can be split by phase.
+BOOT = r'''
+import sys
+sys.stderr.write('cold-start-phase interpreter\n')
+import io, json, os, time
+marks = [('start', time.perf_counter())]
+
+def mark(phase):
+    marks.append((phase, time.perf_counter()))
+    sys.stderr.write(f'cold-start-phase {phase}\n')
+    sys.stderr.flush()
+
+import django
+from django.conf import settings
+if os.environ.get('COLD_START_DB'):
+    settings.DATABASES['default']['NAME'] = os.environ['COLD_START_DB']
+mark('settings')
+django.setup(set_prefix=False)
+mark('apps')
+from django.core.handlers.wsgi import WSGIHandler
+handler = WSGIHandler()
+mark('handler')
+
+watch = json.loads(os.environ.get('COLD_START_WATCH', '[]'))
+requests = []
+for path in json.loads(os.environ['COLD_START_PATHS']):
+    status = []
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+        'HTTP_HOST': 'localhost', 'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http',
+    }
+    response = handler(environ, lambda s, headers: status.append(s))
+    b''.join(response)
+    response.close()
+    mark('first_request' if not requests else path)
+    requests.append({
+        'path': path, 'status': int(status[0].split()[0]),
+        'loaded': {name: name in sys.modules for name in watch},
+    })
+
+print(json.dumps({
+    'phases': {phase: (at - marks[i][1]) * 1000 for i, (phase, at) in enumerate(marks[1:])},
+    'requests': requests,
+}))
+'''
+
+_IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+
+def boot(lean=False, paths=('/',), watch=(), database=None, importtime=False, settings_module=None):
+    """
+    Start a fresh interpreter and serve ``paths``. Returns the phase times
+    in ms (with 'interpreter' = process start-up before Django), the
+    responses, the wall time and, with ``importtime``, every import as a
+    (phase, module, self_us, cumulative_us) tuple.
+    """
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': settings_module or os.environ.get('DJANGO_SETTINGS_MODULE', 'legacy_prime_backend.settings'),
+        'LEGACY_PRIME_LEAN_STARTUP': '1' if lean else '',
+        'COLD_START_PATHS': json.dumps(list(paths)),
+        'COLD_START_WATCH': json.dumps(list(watch)),
+        'COLD_START_DB': database or '',
+    }
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', BOOT]
+    start = time.perf_counter()
+    proc = subprocess.run(command, cwd=BASE_DIR, env=env, capture_output=True, text=True)
+    wall = (time.perf_counter() - start) * 1000
+    if proc.returncode:
+        raise RuntimeError(f'Startup failed:\n{proc.stderr[-3000:]}')
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    phases = result['phases']
+    phases['interpreter'] = wall - sum(phases.values())
+    result.update(wall_ms=wall, imports=parse_importtime(proc.stderr) if importtime else [])
+    return result
+
+
+def parse_importtime(stderr):
+    """Split ``-X importtime`` output into (phase, module, self_us, cumulative_us)."""
+    imports, pending = [], []
+    for line in stderr.splitlines():
+        if line.startswith('cold-start-phase '):
+            phase = line.split(' ', 1)[1]
+            imports += [(phase, *entry) for entry in pending]
+            pending = []
+            continue
+        match = _IMPORT_LINE.match(line)
+        if match:
+            pending.append((match[4], int(match[1]), int(match[2])))
+    return imports
+
+
+def package(module):
+    """Group modules by distribution, and Django by contrib app or subpackage."""
+    parts = module.split('.')
+    if parts[0] == 'django' and len(parts) > 2 and parts[1] in ('contrib', 'db', 'core'):
+        return '.'.join(parts[:3])
+    if parts[0] == 'django' and len(parts) > 1:
+        return '.'.join(parts[:2])
+    return parts[0]
+
+
+def prepare_database(workdir):
+    """A copy of the configured SQLite database, so the run leaves it untouched."""
+    from django.conf import settings
+
+    source = settings.DATABASES['default']['NAME']
+    target = os.path.join(workdir, 'cold_start.sqlite3')
+    if os.path.exists(source):
+        shutil.copyfile(source, target)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Fresh processes per mode')
+    parser.add_argument('--path', default='/api/investments/plans/', help='First request')
+    parser.add_argument('--target-ms', type=float, default=COLD_START_TARGET_MS)
+    parser.add_argument('--output', help=f'Results file (default: {RESULTS_DIR}/cold-start-<timestamp>.json)')
+    args = parser.parse_args()
+
+    from benchmarks.common import setup
+    setup()
+
+    workdir = tempfile.mkdtemp(prefix='legacy_prime_cold_')
+    results, rows = {}, []
+    try:
+        database = prepare_database(workdir)
+        for mode in ('stock', 'lean'):
+            runs = [boot(mode == 'lean', [args.path], database=database) for _ in range(args.runs)]
+            statuses = {run['requests'][0]['status'] for run in runs}
+            medians = {phase: statistics.median(run['phases'][phase] for run in runs) for phase in PHASES}
+            walls = sorted(run['wall_ms'] for run in runs)
+            results[mode] = {
+                **{f'{phase}_ms': round(value, 1) for phase, value in medians.items()},
+                'median_ms': round(statistics.median(walls), 1),
+                'max_ms': round(walls[-1], 1),
+                'statuses': sorted(statuses),
+            }
+            rows.append((mode, *(f'{medians[p]:.0f}' for p in PHASES),
+                         f'{statistics.median(walls):.0f}', f'{walls[-1]:.0f}', ','.join(map(str, sorted(statuses)))))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(rows, ('mode', *PHASES, 'total', 'max', 'status'))
+    lean = results['lean']['median_ms']
+    met = lean <= args.target_ms
+    print(f"Lean cold start {lean:.0f} ms vs target {args.target_ms:.0f} ms: {'met' if met else 'MISSED'}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"cold-start-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w') as fh:
+        json.dump({'args': vars(args), 'target_ms': args.target_ms, 'met': met, 'results': results}, fh, indent=2)
+    print(f'Results saved to {output}')
+    sys.exit(0 if met else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    """Configure Django for a benchmark script."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'legacy_prime_backend.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database(verbosity=0, on_disk=False):
+    """
+    Create a fresh test database for the duration of the block.
+
+    SQLite test databases live in memory by default; pass ``on_disk=True``
+    when other threads (e.g. a live server) need their own connections.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    if on_disk and connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            tempfile.gettempdir(), f'legacy_prime_bench_{os.getpid()}.sqlite3'
+        )
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        teardown_test_environment()
+
+
+@contextmanager
+def live_server(application=None, host='127.0.0.1'):
+    """Serve the WSGI app from a background thread; yields the base URL."""
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadedWSGIServer((host, 0), QuietHandler, allow_reuse_address=False)
+    server.set_app(application or get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def create_user(username='bench', password='bench-pass-123', **extra):
+    from django.contrib.auth import get_user_model
+
+    return get_user_model().objects.create_user(
+        username=username,
+        email=extra.pop('email', f'{username}@example.com'),
+        password=password,
+        **extra,
+    )
+
+
+def bearer(user):
+    """Return an Authorization header value for ``user``."""
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+
+def timed(fn, repeat):
+    """Call ``fn`` ``repeat`` times and return the mean seconds per call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def print_table(rows, headers):
+    widths = [max(len(str(x)) for x in col) for col in zip(headers, *rows)]
+    line = '  '.join(f'{{:<{w}}}' for w in widths)
+    print(line.format(*headers))
+    print(line.format(*('-' * w for w in widths)))
+    for row in rows:
+        print(line.format(*row))
@@ -0,0 +1,212 @@
+"""
+Deposit proof uploads and the admin pages that show them (investments/proofs.py).
+
+    python -m benchmarks.deposit_proofs [--uploads 40] [--workers 2]
+
+Every upload is the same phone photo: a --width x --height JPEG with EXIF
+orientation, camera and GPS tags. Each mode posts it --uploads times to
+deposit/ and reports the upload latency:
+
+* stock: the proof is an ImageField and is stored as sent, untouched. This
+  is the serializer before the pipeline.
+* inline: the pipeline with PROOF_WORKERS = 0. The proof is processed on
+  the request thread, as a synchronous implementation would have to.
+* pool: the pipeline with --workers processes. The request only checks the
+  upload. The time until every proof is ready gives the pipeline's
+  throughput.
+
+The admin deposit list is then loaded with the pool mode's deposits, and
+the bytes of the images it shows are compared with the originals it would
+have shown.
+
+Exits with status 1 if the pool's median upload is not at most half the
+inline one, or if the list's images weigh more than --page-ratio of the
+originals.
+"""
+import argparse
+import io
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.common import create_user, print_table, setup, test_database
+from benchmarks.load_test import RESULTS_DIR
+
+PAGE_RATIO_TARGET = 0.1
+
+
+def photo(width, height):
+    from PIL import ExifTags, Image
+
+    # Noise over a gradient compresses about as badly as a real photo.
+    image = Image.merge('RGB', [
+        Image.linear_gradient('L').resize((width, height)),
+        Image.effect_noise((width, height), 60),
+        Image.radial_gradient('L').resize((width, height)),
+    ])
+    exif = Image.Exif()
+    exif[ExifTags.Base.Orientation] = 6
+    exif[ExifTags.Base.Make] = 'PhoneMaker'
+    exif[ExifTags.IFD.GPSInfo] = {ExifTags.GPS.GPSLatitudeRef: 'N', ExifTags.GPS.GPSLatitude: (6.0, 27.0, 0.0)}
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=92, exif=exif)
+    return buffer.getvalue()
+
+
+def upload(client, data):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    start = time.perf_counter()
+    response = client.post(
+        '/api/investments/deposit/', {'amount': '50.00', 'proof': SimpleUploadedFile('proof.jpg', data)}, format='multipart',
+    )
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 201, response.content
+    return elapsed, response.json()['id']
+
+
+def stock():
+    """The deposit view and serializer as they were: an ImageField, stored as sent."""
+    from unittest import mock
+
+    from rest_framework import serializers
+
+    from investments import proofs
+    from investments.serializers import DepositSerializer
+    from investments.views import DepositCreateView
+
+    class ImageFieldDepositSerializer(DepositSerializer):
+        proof = serializers.ImageField()
+
+    patches = (
+        mock.patch.object(DepositCreateView, 'serializer_class', ImageFieldDepositSerializer),
+        mock.patch.object(proofs, 'submit_on_commit', lambda deposit: None),
+    )
+    for patch in patches:
+        patch.start()
+    return lambda: [patch.stop() for patch in patches]
+
+
+def wait_ready(ids, timeout=600):
+    from investments.models import Deposit
+
+    deadline = time.monotonic() + timeout
+    while Deposit.objects.filter(pk__in=ids, proof_state='processing').exists():
+        if time.monotonic() > deadline:
+            raise RuntimeError('Proofs still processing after %d s' % timeout)
+        time.sleep(0.01)
+
+
+def page_weight(client, ids):
+    """(bytes of the admin list's HTML, bytes of the images it shows, deposits listed)."""
+    from django.conf import settings
+
+    from investments.models import Deposit
+
+    page = client.get('/admin/investments/deposit/').content.decode()
+    shown = re.findall(r'<img src="%s([^"]+)"' % re.escape(settings.MEDIA_URL), page)
+    assert len(shown) == len(ids), f'{len(shown)} thumbnails on the page, {len(ids)} deposits'
+    weight = sum(os.path.getsize(os.path.join(settings.MEDIA_ROOT, name)) for name in shown)
+    return len(page), weight, Deposit.objects.filter(pk__in=ids).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--width', type=int, default=4032)
+    parser.add_argument('--height', type=int, default=3024)
+    parser.add_argument('--page-ratio', type=float, default=PAGE_RATIO_TARGET)
+    parser.add_argument('--output', help=f'Results file (default: {RESULTS_DIR}/proofs-<timestamp>.json)')
+    args = parser.parse_args()
+
+    setup()
+
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+
+    from investments import proofs
+    from investments.models import Deposit
+
+    data = photo(args.width, args.height)
+    media = tempfile.mkdtemp()
+    results = {}
+    try:
+        with test_database(on_disk=True), override_settings(
+            SLOW_QUERY_THRESHOLD_MS=None, MEDIA_ROOT=media, PROOF_WORKERS=args.workers, DEBUG=False,
+        ):
+            user = create_user('proof-bench', password=None)
+            admin = create_user('proof-bench-admin', password=None, is_staff=True, is_superuser=True)
+            client = APIClient()
+            client.force_authenticate(user)
+
+            for mode in ('stock', 'inline', 'pool'):
+                undo = stock() if mode == 'stock' else (lambda: None)
+                workers = 0 if mode == 'inline' else args.workers
+                with override_settings(PROOF_WORKERS=workers):
+                    upload(client, data)  # warm up: the first request imports Pillow, the pool starts its workers
+                    start = time.perf_counter()
+                    timings, ids = zip(*(upload(client, data) for _ in range(args.uploads)))
+                    uploaded = time.perf_counter() - start
+                    if mode == 'pool':
+                        wait_ready(ids)
+                    done = time.perf_counter() - start
+                undo()
+                results[mode] = {
+                    'p50_ms': statistics.median(timings) * 1000,
+                    'p95_ms': statistics.quantiles(timings, n=20)[-1] * 1000,
+                    'uploads_per_s': args.uploads / uploaded,
+                    'processed_per_s': None if mode == 'stock' else args.uploads / done,
+                }
+            proofs.shutdown()
+
+            admin_client = APIClient()
+            admin_client.force_login(admin)
+            Deposit.objects.exclude(pk__in=ids).delete()
+            html_bytes, image_bytes, shown = page_weight(admin_client, ids)
+            original_bytes = shown * len(data)
+    finally:
+        shutil.rmtree(media)
+
+    print(f'{args.uploads} uploads of a {args.width}x{args.height} JPEG ({len(data) / 2 ** 20:.1f} MiB) per mode, '
+          f'{args.workers} pool workers')
+    print_table([
+        (mode, f"{r['p50_ms']:.1f}", f"{r['p95_ms']:.1f}", f"{r['uploads_per_s']:.1f}",
+         '-' if r['processed_per_s'] is None else f"{r['processed_per_s']:.1f}")
+        for mode, r in results.items()
+    ], ('mode', 'upload p50 ms', 'upload p95 ms', 'uploads/s', 'proofs processed/s'))
+    print()
+    print_table([
+        ('originals', f'{original_bytes / 2 ** 20:.1f} MiB'),
+        ('thumbnails', f'{image_bytes / 2 ** 10:.1f} KiB'),
+        ('page HTML', f'{html_bytes / 2 ** 10:.1f} KiB'),
+    ], (f'admin list of {shown} deposits', 'bytes'))
+
+    ratio = image_bytes / original_bytes
+    faster = results['pool']['p50_ms'] <= results['inline']['p50_ms'] / 2
+    lighter = ratio <= args.page_ratio
+    print(f"Upload p50: pool {results['pool']['p50_ms']:.1f} ms vs inline {results['inline']['p50_ms']:.1f} ms: "
+          f"{'met' if faster else 'MISSED'}")
+    print(f'Admin images: {ratio:.2%} of the originals (target {args.page_ratio:.0%}): {"met" if lighter else "MISSED"}')
+
+    output = args.output or os.path.join(RESULTS_DIR, f"proofs-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as fh:
+        json.dump({
+            'args': vars(args), 'upload_bytes': len(data), 'results': results,
+            'admin': {'deposits': shown, 'html_bytes': html_bytes, 'image_bytes': image_bytes,
+                      'original_bytes': original_bytes, 'ratio': ratio},
+            'met': faster and lighter,
+        }, fh, indent=2)
+    print(f'Results saved to {output}')
+    sys.exit(0 if faster and lighter else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,433 @@
+"""
+End-to-end API load test.
+
+Drives every /api/ endpoint over real HTTP with concurrent keep-alive
+clients and reports p50/p95/p99 latency, throughput, error rate and DB
+queries per request (taken from the server's /metrics).
+
+    # seed a throwaway database, serve it from a threaded WSGI server, run
+    python -m benchmarks.load_test run --users 2000 --duration 10 --concurrency 8
+
+    # or point at an already running server (gunicorn, uvicorn, ...) whose
+    # database was seeded with `manage.py seed_scale`
+    python -m benchmarks.load_test run --url http://127.0.0.1:8000
+
+    # compare two saved runs; exits 1 if anything regressed past --threshold %
+    python -m benchmarks.load_test compare old.json new.json --threshold 10
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import re
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from benchmarks.common import live_server, print_table, setup, test_database
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+BENCH_PASSWORD = 'load-test-pass-123'
+
+
+# ---------------------------------------------------------------------------
+# HTTP client
+# ---------------------------------------------------------------------------
+
+class Client:
+    """One keep-alive connection per worker thread."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                response = self.conn.getresponse()
+                data = response.read()
+                return response.status, data
+            except (http.client.HTTPException, ConnectionError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def scrape_queries(base_url, token=None):
+    """
+    Totals seen by the server, excluding /metrics: (requests, db queries,
+    response cache hits, response cache misses).
+    """
+    client = Client(base_url)
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    status, body = client.request('GET', '/metrics', headers=headers)
+    if status != 200:
+        return None
+    requests = queries = hits = misses = 0
+    pattern = re.compile(
+        r'^(http_requests_total|db_queries_total|response_cache_requests_total)\{(.*)\} ([0-9.e+-]+)$'
+    )
+    for line in body.decode().splitlines():
+        match = pattern.match(line)
+        if not match or 'route="metrics"' in match.group(2):
+            continue
+        name, labels, value = match.group(1), match.group(2), float(match.group(3))
+        if name == 'http_requests_total':
+            requests += value
+        elif name == 'db_queries_total':
+            queries += value
+        elif 'result="hit"' in labels:
+            hits += value
+        else:
+            misses += value
+    return requests, queries, hits, misses
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+def _png():
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new('RGB', (32, 32), (200, 160, 40)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def _multipart(fields, files):
+    boundary = 'loadtestboundary7MA4YWxkTrZu0gW'
+    lines = []
+    for name, value in fields.items():
+        lines += [f'--{boundary}', f'Content-Disposition: form-data; name="{name}"', '', str(value)]
+    body = '\r\n'.join(lines).encode() + b'\r\n'
+    for name, (filename, content, content_type) in files.items():
+        body += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode() + content + b'\r\n'
+    body += f'--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def prepare_fixtures():
+    """Create (or reuse) the load-test accounts and return what scenarios need."""
+    from django.contrib.auth import get_user_model
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from investments.models import Deposit, InvestmentPlan
+    from wallets.models import Wallet
+
+    User = get_user_model()
+    user, created = User.objects.get_or_create(
+        username='loadtest', defaults={'email': 'loadtest@example.com', 'is_verified': True}
+    )
+    staff, staff_created = User.objects.get_or_create(
+        username='loadtest-admin', defaults={'email': 'loadtest-admin@example.com', 'is_staff': True}
+    )
+    for account, new in ((user, created), (staff, staff_created)):
+        if new:
+            account.set_password(BENCH_PASSWORD)
+            account.save()
+    Wallet.objects.update_or_create(user=user, defaults={'balance': 10 ** 9})
+
+    # Enough pending deposits for the approval scenario to never run dry.
+    missing = 2000 - Deposit.objects.filter(status='pending').count()
+    if missing > 0:
+        Deposit.objects.bulk_create(
+            Deposit(user=user, amount=100, proof='deposits/seed.png', status='pending')
+            for _ in range(missing)
+        )
+
+    plan = InvestmentPlan.objects.order_by('min_amount').first()
+    return {
+        'user_token': str(RefreshToken.for_user(user).access_token),
+        'staff_token': str(RefreshToken.for_user(staff).access_token),
+        'plan': plan.id,
+        'plan_amount': str(plan.min_amount),
+        'pending_deposits': list(
+            Deposit.objects.filter(status='pending').order_by('id').values_list('id', flat=True)[:100000]
+        ),
+    }
+
+
+def build_scenarios(fx, approve_status):
+    user = {'Authorization': f"Bearer {fx['user_token']}"}
+    staff = {'Authorization': f"Bearer {fx['staff_token']}"}
+    as_json = {'Content-Type': 'application/json'}
+    deposit_body, deposit_type = _multipart({'amount': '100.00'}, {'proof': ('proof.png', _png(), 'image/png')})
+    pending = iter(fx['pending_deposits'])
+    pending_lock = threading.Lock()
+
+    def next_deposit():
+        with pending_lock:
+            return next(pending, None)
+
+    def approve():
+        pk = next_deposit()
+        if pk is None:
+            return None
+        body = json.dumps({'status': approve_status})
+        return 'PATCH', f'/api/investments/approve-deposit/{pk}/', body, {**staff, **as_json}
+
+    def get(path, headers):
+        return lambda: ('GET', path, None, headers)
+
+    def post(path, payload, headers):
+        body = json.dumps(payload)
+        return lambda: ('POST', path, body, {**headers, **as_json})
+
+    return {
+        'plans': get('/api/investments/plans/', {}),
+        'overview': get('/api/investments/overview/', user),
+        'wallet': get('/api/wallet/', user),
+        'investments-wallet': get('/api/investments/wallet/', user),
+        'history': get('/api/transactions/', user),
+        'history-admin': get('/api/transactions/', staff),
+        'my-investments': get('/api/investments/my/', user),
+        'active-investments': get('/api/investments/active/', user),
+        'start-investment': post('/api/investments/start/',
+                                 {'plan': fx['plan'], 'amount': fx['plan_amount']}, user),
+        'deposit-create': lambda: ('POST', '/api/investments/deposit/', deposit_body,
+                                   {**user, 'Content-Type': deposit_type}),
+        'withdraw-create': post('/api/investments/withdraw/',
+                                {'amount': '10.00', 'wallet_address': 'T' + 'x' * 33}, user),
+        'deposits-admin': get('/api/investments/deposits/', staff),
+        'approve-deposit': approve,
+        'token': post('/api/accounts/token/',
+                      {'email': 'loadtest@example.com', 'password': BENCH_PASSWORD}, {}),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def drive(base_url, make_request, concurrency, duration, max_requests):
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    remaining = [max_requests]
+
+    def worker():
+        client = Client(base_url)
+        local_latencies, local_statuses = [], {}
+        while time.perf_counter() < deadline:
+            with lock:
+                if remaining[0] is not None:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+            spec = make_request()
+            if spec is None:
+                break
+            method, path, body, headers = spec
+            start = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body, headers)
+            except Exception:
+                status = 'error'
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def run_scenarios(base_url, scenarios, args):
+    results = {}
+    for name, make_request in scenarios.items():
+        if args.only and name not in args.only:
+            continue
+        drive(base_url, make_request, 1, 60, args.warmup)
+        before = scrape_queries(base_url, args.metrics_token)
+        latencies, statuses, elapsed = drive(
+            base_url, make_request, args.concurrency, args.duration, args.requests
+        )
+        after = scrape_queries(base_url, args.metrics_token)
+
+        latencies.sort()
+        count = len(latencies)
+        errors = sum(n for s, n in statuses.items() if s == 'error' or int(s) >= 400)
+        queries = hit_ratio = None
+        if before and after and after[0] > before[0]:
+            queries = round((after[1] - before[1]) / (after[0] - before[0]), 2)
+            lookups = (after[2] - before[2]) + (after[3] - before[3])
+            if lookups:
+                hit_ratio = round((after[2] - before[2]) / lookups, 3)
+        results[name] = {
+            'requests': count,
+            'errors': errors,
+            'statuses': {str(k): v for k, v in statuses.items()},
+            'throughput_rps': round(count / elapsed, 2) if elapsed else 0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'queries_per_request': queries,
+            'cache_hit_ratio': hit_ratio,
+        }
+        r = results[name]
+        print(f"{name:<20} {r['throughput_rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.1f}ms  "
+              f"p95 {r['p95_ms']:>8.1f}ms  p99 {r['p99_ms']:>8.1f}ms  "
+              f"queries {queries if queries is not None else '-':>6}  "
+              f"cache hits {hit_ratio if hit_ratio is not None else '-':>5}  errors {errors}")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except Exception:
+        return None
+
+
+def cmd_run(args):
+    setup()
+    from django.test.utils import override_settings
+
+    with ExitStack() as stack:
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            import tempfile
+
+            from django.core.management import call_command
+
+            stack.enter_context(test_database(on_disk=True))
+            stack.enter_context(override_settings(MEDIA_ROOT=stack.enter_context(tempfile.TemporaryDirectory())))
+            # The test environment turns DEBUG off, which closes /metrics without a token.
+            args.metrics_token = args.metrics_token or secrets.token_hex(16)
+            stack.enter_context(override_settings(METRICS_TOKEN=args.metrics_token))
+            if not args.keep_throttles:
+                from accounts.throttling import SlidingWindowThrottle
+                SlidingWindowThrottle.allow_request = lambda self, request, view: True
+            print(f'Seeding {args.users} users...')
+            call_command('seed_scale', users=args.users, tx_per_user=args.tx_per_user,
+                         workers=0, stdout=open(os.devnull, 'w'))
+            base_url = stack.enter_context(live_server())
+
+        fixtures = prepare_fixtures()
+        scenarios = build_scenarios(fixtures, args.approve_status)
+        print(f'Load testing {base_url} with {args.concurrency} clients...')
+        results = run_scenarios(base_url, scenarios, args)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'revision': git_revision(),
+            'server': args.url or 'threaded-wsgi (in-process)',
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'requests': args.requests,
+            'users': None if args.url else args.users,
+            'python': sys.version.split()[0],
+        },
+        'endpoints': results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    print(f'Results saved to {output}')
+
+
+def cmd_compare(args):
+    with open(args.baseline) as fh:
+        old = json.load(fh)['endpoints']
+    with open(args.current) as fh:
+        new = json.load(fh)['endpoints']
+
+    def change(a, b):
+        return (b - a) / a * 100 if a else 0.0
+
+    rows, regressions = [], []
+    for name in sorted(set(old) & set(new)):
+        o, n = old[name], new[name]
+        p95 = change(o['p95_ms'], n['p95_ms'])
+        rps = change(o['throughput_rps'], n['throughput_rps'])
+        oq, nq = o.get('queries_per_request'), n.get('queries_per_request')
+        flags = []
+        if p95 > args.threshold:
+            flags.append('p95')
+        if -rps > args.threshold:
+            flags.append('throughput')
+        if oq is not None and nq is not None and nq > oq + 0.5:
+            flags.append('queries')
+        if n['errors'] > o['errors']:
+            flags.append('errors')
+        if flags:
+            regressions.append(name)
+        rows.append((
+            name, f"{o['p95_ms']} -> {n['p95_ms']}", f'{p95:+.1f}%',
+            f"{o['throughput_rps']} -> {n['throughput_rps']}", f'{rps:+.1f}%',
+            f'{oq} -> {nq}', ','.join(flags) or 'ok',
+        ))
+
+    print_table(rows, ('endpoint', 'p95 ms', 'Δp95', 'req/s', 'Δreq/s', 'queries', 'regression'))
+    if regressions:
+        print(f"\n{len(regressions)} endpoint(s) regressed beyond {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+    print('\nNo regressions.')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='Run the load test')
+    run.add_argument('--url', help='Target an already running server instead of starting one')
+    run.add_argument('--users', type=int, default=1000, help='Users to seed (in-process mode)')
+    run.add_argument('--tx-per-user', type=float, default=20)
+    run.add_argument('--concurrency', type=int, default=8)
+    run.add_argument('--duration', type=float, default=10, help='Seconds per endpoint')
+    run.add_argument('--requests', type=int, help='Stop each endpoint after this many requests')
+    run.add_argument('--warmup', type=int, default=5, help='Sequential warm-up requests per endpoint')
+    run.add_argument('--only', nargs='+', help='Endpoints to run (default: all)')
+    run.add_argument('--approve-status', choices=['approved', 'rejected'], default='approved')
+    run.add_argument('--keep-throttles', action='store_true',
+                     help='Leave auth rate limits on (in-process mode)')
+    run.add_argument('--metrics-token', help='Bearer token for /metrics (the server\'s METRICS_TOKEN)')
+    run.add_argument('--output', help=f'Results file (default: {RESULTS_DIR}/load-<timestamp>.json)')
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser('compare', help='Compare two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=10, help='Allowed change in percent')
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Microbenchmarks for model and serializer hot paths.
+
+Run with ``python manage.py microbench`` (or ``python -m benchmarks.micro``).
+Each case is timed over several samples, each long enough to swamp timer
+noise, and reported as ops/sec with a 95% confidence interval. A separate
+tracemalloc pass reports peak memory and net allocated blocks per op.
+"""
+import gc
+import math
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+# Two-sided 95% Student's t critical values by degrees of freedom.
+T95 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+    9: 2.262, 10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131,
+    16: 2.120, 17: 2.110, 18: 2.101, 19: 2.093, 20: 2.086, 21: 2.080, 22: 2.074,
+    23: 2.069, 24: 2.064, 25: 2.060, 26: 2.056, 27: 2.052, 28: 2.048, 29: 2.045,
+    30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980,
+}
+
+
+def t_critical(df):
+    # Between entries, the next lower df: its larger t keeps the interval from being too narrow.
+    return T95[max(k for k in T95 if k <= df)]
+
+
+def calibrate(fn, min_time):
+    """Loops per sample so one sample takes at least ``min_time`` seconds."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - start >= min_time:
+            return loops
+        loops *= 2
+
+
+def measure(fn, samples=10, min_time=0.1, ops_per_call=1):
+    fn()  # warm caches and lazy imports
+    loops = calibrate(fn, min_time)
+    rates = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(samples):
+            start = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            rates.append(loops * ops_per_call / (time.perf_counter() - start))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    mean = statistics.fmean(rates)
+    stdev = statistics.stdev(rates) if len(rates) > 1 else 0.0
+    half_width = t_critical(len(rates) - 1) * stdev / math.sqrt(len(rates)) if len(rates) > 1 else 0.0
+
+    tracemalloc.start()
+    before_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.reset_peak()
+    for _ in range(loops):
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    after_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+
+    ops = loops * ops_per_call
+    return {
+        'ops_per_sec': mean,
+        'ci95': half_width,
+        'ci95_pct': half_width / mean * 100 if mean else 0.0,
+        'samples': len(rates),
+        'loops': loops,
+        'peak_kib': peak / 1024,
+        'net_blocks_per_op': (after_blocks - before_blocks) / ops,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Cases
+# ---------------------------------------------------------------------------
+
+def build_cases(rows=100):
+    """Create fixtures in the current (test) database and return the cases."""
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from django.utils import timezone
+
+    from investments.models import Investment, InvestmentPlan, UserInvestment
+    from investments.serializers import InvestmentPlanSerializer, UserInvestmentSerializer
+    from transactions.models import TransactionHistory
+    from transactions.serializers import TransactionHistorySerializer
+
+    User = get_user_model()
+    user = User.objects.create_user(username='microbench', email='microbench@example.com', password='x')
+    wallet = user.wallet
+    plan = InvestmentPlan.objects.order_by('id').first()
+    long_plan = InvestmentPlan.objects.create(
+        name='Microbench Long', min_amount=10, max_amount=100000, daily_roi=Decimal('1.50'),
+        duration_days=365, total_return=Decimal('5.00'), compound_interest=True,
+    )
+    now = timezone.now()
+
+    for i in range(rows):
+        UserInvestment.objects.create(user=user, plan=plan, amount=Decimal('100.00') + i)
+        Investment.objects.create(user=user, plan=plan, amount=Decimal('50.00'),
+                                  ends_at=now + timedelta(days=plan.duration_days))
+        TransactionHistory.objects.create(
+            user=user, transaction_type='deposit', amount=Decimal('25.00'),
+            balance_before=Decimal(i), balance_after=Decimal(i) + 25,
+        )
+
+    def running_investment(compound):
+        inv = Investment(user=user, plan=long_plan, amount=Decimal('1000.00'), compound_interest=compound)
+        inv.created_at = now - timedelta(days=300)
+        inv.ends_at = now + timedelta(days=65)
+        return inv
+
+    simple, compound = running_investment(False), running_investment(True)
+    expected = UserInvestment(user=user, plan=plan, amount=Decimal('250.00'))
+
+    histories = list(TransactionHistory.objects.filter(user=user).select_related('user'))
+    user_investments = list(UserInvestment.objects.filter(user=user).select_related('plan'))
+    plans = list(InvestmentPlan.objects.all())
+
+    def save_history():
+        # Roll back so the table doesn't grow between samples.
+        with transaction.atomic():
+            TransactionHistory(user=user, transaction_type='profit', amount=Decimal('1.00')).save()
+            transaction.set_rollback(True)
+
+    return [
+        ('Investment.calculate_profit (simple)', simple.calculate_profit, 1),
+        ('Investment.calculate_profit (compound, 300d)', compound.calculate_profit, 1),
+        ('UserInvestment.calculate_expected_profit', expected.calculate_expected_profit, 1),
+        ('TransactionHistory.save (reference + insert)', save_history, 1),
+        (f'Wallet.get_available_balance ({rows} investments)', wallet.get_available_balance, 1),
+        ('TransactionHistorySerializer (per row)',
+         lambda: TransactionHistorySerializer(histories, many=True).data, len(histories)),
+        ('UserInvestmentSerializer (per row)',
+         lambda: UserInvestmentSerializer(user_investments, many=True).data, len(user_investments)),
+        ('InvestmentPlanSerializer (per row)',
+         lambda: InvestmentPlanSerializer(plans, many=True).data, len(plans)),
+    ]
+
+
+def run(samples=10, min_time=0.1, rows=100, only=None, stdout=None):
+    import sys
+
+    out = stdout or sys.stdout
+    results = {}
+    for name, fn, ops_per_call in build_cases(rows):
+        if only and not any(word.lower() in name.lower() for word in only):
+            continue
+        result = measure(fn, samples=samples, min_time=min_time, ops_per_call=ops_per_call)
+        results[name] = result
+        out.write(
+            f"{name:<48} {result['ops_per_sec']:>12,.0f} ops/s ± {result['ci95_pct']:>4.1f}%  "
+            f"peak {result['peak_kib']:>8.1f} KiB  net blocks/op {result['net_blocks_per_op']:>6.2f}\n"
+        )
+    return results
+
+
+if __name__ == '__main__':
+    from benchmarks.common import setup, test_database
+
+    setup()
+    with test_database():
+        run()
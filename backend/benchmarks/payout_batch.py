@@ -0,0 +1,137 @@
+"""
+Payout batch building and settlement file streaming (investments/payouts.py).
+
+    python -m benchmarks.payout_batch [--withdrawals 50000] [--builders 4]
+
+Seeds --withdrawals approved withdrawals over four networks into an
+on-disk test database, then:
+
+* builds one batch of all of them and streams its CSV and JSON files;
+* resets them and lets --builders threads build batches of --batch-size
+  concurrently until none are left. Afterwards every withdrawal must be in
+  exactly one batch, and the batch counts must add up.
+
+Exits with status 1 if building plus streaming the CSV takes more than
+--target-s seconds (default PAYOUT_BATCH_TARGET_S), or if the concurrent
+builders overlapped or missed a withdrawal.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from benchmarks.common import create_user, print_table, setup, test_database
+from benchmarks.load_test import RESULTS_DIR
+
+PAYOUT_BATCH_TARGET_S = 5
+USERS = 500
+ADDRESSES = ('T' + 'a' * 33, '0x' + 'b' * 40, 'bc1q' + 'c' * 38, '1' + 'd' * 33)
+
+
+def seed(count):
+    from investments.models import Withdrawal
+
+    users = [create_user(f'payout-bench-{i}', password=None) for i in range(USERS)]
+    # bulk_create sends no post_save, which would pay out each approved row again.
+    Withdrawal.objects.bulk_create([
+        Withdrawal(user=users[i % USERS], amount=Decimal('25.00'), wallet_address=ADDRESSES[i % 4], status='approved')
+        for i in range(count)
+    ], batch_size=5000)
+
+
+def stream(chunks):
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in chunks)
+    return time.perf_counter() - start, size
+
+
+def build_concurrently(builders, batch_size):
+    from django.db import connection
+
+    from investments import payouts
+
+    errors = []
+
+    def work():
+        try:
+            while payouts.build(limit=batch_size) is not None:
+                pass
+        except Exception as exc:  # reported below; a thread's exception would be lost
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=work) for _ in range(builders)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--withdrawals', type=int, default=50_000)
+    parser.add_argument('--builders', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=5_000)
+    parser.add_argument('--target-s', type=float, default=PAYOUT_BATCH_TARGET_S)
+    parser.add_argument('--output', help=f'Results file (default: {RESULTS_DIR}/payout-<timestamp>.json)')
+    args = parser.parse_args()
+
+    setup()
+
+    from django.db.models import Count, Sum
+    from django.test import override_settings
+
+    from investments import payouts
+    from investments.models import PayoutBatch, Withdrawal
+
+    with test_database(on_disk=True), override_settings(SLOW_QUERY_THRESHOLD_MS=None):
+        seed(args.withdrawals)
+
+        start = time.perf_counter()
+        batch = payouts.build(limit=args.withdrawals)
+        build_s = time.perf_counter() - start
+        csv_s, csv_bytes = stream(payouts.csv_lines(batch))
+        json_s, json_bytes = stream(payouts.json_chunks(batch))
+
+        Withdrawal.objects.update(payout_batch=None)
+        PayoutBatch.objects.all().delete()
+        concurrent_s, errors = build_concurrently(args.builders, args.batch_size)
+        claimed = Withdrawal.objects.filter(payout_batch__isnull=False).count()
+        batches = PayoutBatch.objects.aggregate(batches=Count('pk'), counted=Sum('withdrawal_count'))
+
+    rows = [
+        ('build', f'{build_s:.2f}', f'{args.withdrawals / build_s:,.0f}', '-'),
+        ('CSV file', f'{csv_s:.2f}', f'{args.withdrawals / csv_s:,.0f}', f'{csv_bytes / 2 ** 20:.1f} MiB'),
+        ('JSON file', f'{json_s:.2f}', f'{args.withdrawals / json_s:,.0f}', f'{json_bytes / 2 ** 20:.1f} MiB'),
+        (f'{args.builders} concurrent builders', f'{concurrent_s:.2f}', f'{args.withdrawals / concurrent_s:,.0f}',
+         f"{batches['batches']} batches"),
+    ]
+    print(f'{args.withdrawals:,} approved withdrawals')
+    print_table(rows, ('step', 'seconds', 'withdrawals/s', 'size'))
+
+    exact = not errors and claimed == batches['counted'] == args.withdrawals
+    print(f"Concurrent builders: {claimed:,} claimed, {batches['counted'] or 0:,} counted in batches"
+          f"{', errors: ' + '; '.join(map(repr, errors)) if errors else ''}: {'no overlap' if exact else 'MISMATCH'}")
+    met = build_s + csv_s <= args.target_s
+    print(f'Build + CSV: {build_s + csv_s:.2f} s (target {args.target_s} s): {"met" if met else "MISSED"}')
+
+    output = args.output or os.path.join(RESULTS_DIR, f"payout-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as fh:
+        json.dump({
+            'args': vars(args), 'target_s': args.target_s, 'met': met, 'exact': exact,
+            'results': {step: {'seconds': float(seconds)} for step, seconds, *_ in rows},
+        }, fh, indent=2)
+    print(f'Results saved to {output}')
+    sys.exit(0 if met and exact else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Encode time and wire size of a transaction history page, stdlib
+JSONRenderer against FastJSONRenderer, and the size and cost of gzip at
+Django's level and at level 1.
+
+    python -m benchmarks.rendering [--rows 1000] [--repeat 50]
+
+The page is the serialized output of TransactionHistorySerializer, the
+list TransactionHistoryListView renders, so the Decimal fields arrive as
+strings and the timestamps as ISO strings, as in production.
+"""
+import argparse
+import gzip
+
+from benchmarks.common import create_user, print_table, setup, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+
+    from decimal import Decimal
+
+    from django.utils.text import compress_string
+    from rest_framework.renderers import JSONRenderer
+
+    from legacy_prime_backend.renderers import FastJSONRenderer
+    from transactions.models import TransactionHistory
+    from transactions.serializers import TransactionHistorySerializer
+
+    with test_database():
+        user = create_user('rendering')
+        TransactionHistory.objects.bulk_create([
+            TransactionHistory(
+                user=user, transaction_type='deposit', amount=Decimal('125.50') + i,
+                balance_before=Decimal(i), balance_after=Decimal(i) + Decimal('125.50'),
+                description=f'Deposit {i} approved', reference=f'TXN-BENCH-{i:06d}',
+            )
+            for i in range(args.rows)
+        ])
+        page = TransactionHistorySerializer(
+            TransactionHistory.objects.select_related('user').order_by('-created_at'), many=True,
+        ).data
+
+    rows = []
+    body = None
+    for name, renderer in (('JSONRenderer', JSONRenderer()), ('FastJSONRenderer', FastJSONRenderer())):
+        seconds = timed(lambda: renderer.render(page), args.repeat)
+        body = renderer.render(page)
+        rows.append((f'encode: {name}', f'{seconds * 1000:.2f}', f'{len(body):,}'))
+    assert JSONRenderer().render(page) == body, 'renderers disagree'
+
+    codings = [('gzip (Django, level 6)', lambda: compress_string(body, max_random_bytes=100)),
+               ('gzip level 1', lambda: gzip.compress(body, compresslevel=1))]
+    for name, compress in codings:
+        seconds = timed(compress, args.repeat)
+        rows.append((f'compress: {name}', f'{seconds * 1000:.2f}', f'{len(compress()):,}'))
+
+    print(f'History page of {args.rows} rows, mean of {args.repeat} calls')
+    print_table(rows, ('step', 'ms', 'bytes'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+SQLite read/write contention: stock settings versus the tuned profile in
+settings.SQLITE_TUNING.
+
+Seeds a database file, then for each profile starts reader and writer
+processes against its own copy for a fixed time. Readers run the
+dashboard overview queries; writers run an approval-shaped transaction
+(read the wallet, update it, insert a history row). Each operation ends
+with close_old_connections(), as a request would, so CONN_MAX_AGE matters.
+
+    python -m benchmarks.sqlite_contention --readers 4 --writers 2 --duration 10
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.common import print_table, setup
+from benchmarks.load_test import percentile
+
+
+def stock_profile():
+    return {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+
+
+def tuned_profile():
+    from django.conf import settings
+
+    return dict(settings.SQLITE_TUNING)
+
+
+def use_database(path, profile):
+    from django.db import connections
+
+    connections.close_all()
+    connections.settings['default'].update(profile, NAME=path)
+
+
+def worker(kind, path, profile, user_ids, duration, seed, results):
+    setup()
+    use_database(path, profile)
+
+    from decimal import Decimal
+
+    from django.db import OperationalError, close_old_connections, models, transaction
+
+    from investments.models import Deposit
+    from transactions.models import TransactionHistory
+    from wallets.models import Wallet
+
+    rng = random.Random(seed)
+
+    def read(user_id):
+        Wallet.objects.get(user_id=user_id)
+        Deposit.objects.filter(user_id=user_id, status='approved').aggregate(total=models.Sum('amount'))
+        TransactionHistory.objects.filter(user_id=user_id).order_by('-created_at').first()
+
+    def write(user_id):
+        with transaction.atomic():
+            wallet = Wallet.objects.get(user_id=user_id)
+            before = wallet.balance
+            wallet.balance += Decimal('1.00')
+            wallet.save(update_fields=['balance', 'updated_at'])
+            TransactionHistory.objects.create(
+                user_id=user_id, transaction_type='manual_credit', amount=Decimal('1.00'),
+                balance_before=before, balance_after=wallet.balance,
+            )
+
+    operation = read if kind == 'reader' else write
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            operation(rng.choice(user_ids))
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors += 1
+        close_old_connections()
+    results.put((kind, latencies, errors))
+
+
+def run_profile(name, path, profile, args, user_ids):
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(
+            target=worker,
+            args=(kind, path, profile, user_ids, args.duration, i, results),
+        )
+        for i, kind in enumerate(['reader'] * args.readers + ['writer'] * args.writers)
+    ]
+    for proc in procs:
+        proc.start()
+    collected = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    row = [name]
+    for kind in ('reader', 'writer'):
+        latencies = sorted(l for k, ls, _ in collected if k == kind for l in ls)
+        errors = sum(e for k, _, e in collected if k == kind)
+        row += [
+            f'{len(latencies) / args.duration:,.0f}',
+            f'{percentile(latencies, 95) * 1000:.1f}',
+            errors,
+        ]
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=500, help='Users to seed')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per profile')
+    args = parser.parse_args()
+
+    setup()
+    from django.core.management import call_command
+    from django.db import connections
+
+    from wallets.models import Wallet
+
+    workdir = tempfile.mkdtemp(prefix='legacy_prime_sqlite_')
+    try:
+        seeded = os.path.join(workdir, 'seeded.sqlite3')
+        profiles = (('stock', stock_profile()), ('tuned', tuned_profile()))
+        use_database(seeded, stock_profile())
+        call_command('migrate', verbosity=0)
+        call_command('seed_scale', users=args.users, workers=0, stdout=io.StringIO())
+        user_ids = list(Wallet.objects.values_list('user_id', flat=True))
+        connections.close_all()
+
+        rows = []
+        for name, profile in profiles:
+            path = os.path.join(workdir, f'{name}.sqlite3')
+            shutil.copyfile(seeded, path)
+            with sqlite3.connect(path) as conn:
+                conn.execute('PRAGMA journal_mode=DELETE')
+            print(f'Running {name} profile with {args.readers} readers and {args.writers} writers...')
+            rows.append(run_profile(name, path, profile, args, user_ids))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(rows, ('profile', 'reads/s', 'read p95 ms', 'read errors',
+                       'writes/s', 'write p95 ms', 'write errors'))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,18 @@
-from django.contrib import admin
+from collections import Counter
+
+from django.contrib import admin, messages
+from django.contrib.admin.utils import model_ngettext
+from django.urls import reverse
+from django.utils.html import format_html
+from legacy_prime_backend.sharded_admin import ShardedAdminMixin
+from legacy_prime_backend.sharding import each_shard
+from . import bulk
 from .models import (
     InvestmentPlan,
     UserInvestment,
     Deposit,
     Withdrawal,
+    PayoutBatch,
 )
 
 
@@ -20,36 +29,107 @@ class InvestmentPlanAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserInvestment)
-class UserInvestmentAdmin(admin.ModelAdmin):
+class UserInvestmentAdmin(ShardedAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'plan', 'amount', 'status', 'start_date', 'end_date', 'expected_profit', 'total_payout')
     list_filter = ('status', 'plan')
+    list_select_related = ('user', 'plan')  # used by __str__ and list_display
+    autocomplete_fields = ('user', 'plan')
     search_fields = ('user__username', 'plan__name')
     date_hierarchy = 'start_date'
     ordering = ('-start_date',)
 
 
 
+# ==============================
+# ✅ Bulk Review Actions
+# ==============================
+OUTCOME_LABELS = {
+    bulk.APPROVED: 'approved',
+    bulk.REJECTED: 'rejected',
+    bulk.INSUFFICIENT_FUNDS: 'left pending: insufficient funds',
+    bulk.NOT_PENDING: 'skipped: no longer pending',
+    bulk.CLAIMED_BY_OTHER: 'skipped: claimed by another reviewer',
+    bulk.NOT_FOUND: 'skipped: not found',
+}
+
+
+def review_selected(model_admin, request, queryset, action):
+    ids = [pk for part in each_shard(queryset.order_by()) for pk in part.values_list('pk', flat=True)]
+    counts = Counter(outcome for _, outcome in bulk.review(model_admin.model, ids, action, reviewer=request.user))
+    for outcome, count in counts.items():
+        done = outcome in (bulk.APPROVED, bulk.REJECTED)
+        model_admin.message_user(
+            request, f'{count} {model_ngettext(queryset, count)} {OUTCOME_LABELS[outcome]}.',
+            messages.SUCCESS if done else messages.WARNING,
+        )
+
+
+@admin.action(description='Approve selected %(verbose_name_plural)s', permissions=['change'])
+def approve_selected(model_admin, request, queryset):
+    review_selected(model_admin, request, queryset, bulk.APPROVE)
+
+
+@admin.action(description='Reject selected %(verbose_name_plural)s', permissions=['change'])
+def reject_selected(model_admin, request, queryset):
+    review_selected(model_admin, request, queryset, bulk.REJECT)
+
+
 @admin.register(Deposit)
-class DepositAdmin(admin.ModelAdmin):
-    list_display = ('user', 'amount', 'status', 'created_at', 'updated_at')
+class DepositAdmin(ShardedAdminMixin, admin.ModelAdmin):
+    list_display = ('user', 'amount', 'proof_preview', 'status', 'created_at', 'updated_at')
     list_filter = ('status',)
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
     search_fields = ('user__username',)
+    readonly_fields = ('proof_preview', 'proof_state')
     date_hierarchy = 'created_at'
     ordering = ('-created_at',)
+    actions = (approve_selected, reject_selected)
+
+    @admin.display(description='Proof')
+    def proof_preview(self, obj):
+        # The thumbnail, linking to the full proof: the list never loads the originals.
+        if not obj.proof_thumbnail:
+            return obj.get_proof_state_display()
+        return format_html(
+            '<a href="{}"><img src="{}" alt="Proof" loading="lazy" style="max-height: 80px"></a>',
+            obj.proof.url, obj.proof_thumbnail.url,
+        )
 
 
 @admin.register(Withdrawal)
-class WithdrawalAdmin(admin.ModelAdmin):
+class WithdrawalAdmin(ShardedAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'amount', 'status', 'created_at', 'updated_at')
     list_filter = ('status',)
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
     search_fields = ('user__username',)
     date_hierarchy = 'created_at'
     ordering = ('-created_at',)
-    
-# Note: Consider adding actions for bulk approving/rejecting deposits and withdrawals in the future.
+    actions = (approve_selected, reject_selected)
+
+
 # ==============================
-# 🧩 Developer Note
+# 🧾 Payout Batches
 # ==============================
-# Note: Consider adding admin actions for bulk approving/rejecting
-# deposits and withdrawals in the future. This can streamline
-# admin workflow and reduce manual review time.
\ No newline at end of file
+@admin.register(PayoutBatch)
+class PayoutBatchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'withdrawal_count', 'total_amount', 'created_by', 'created_at', 'settlement')
+    list_filter = ('status',)
+    list_select_related = ('created_by',)
+    readonly_fields = ('status', 'withdrawal_count', 'total_amount', 'totals', 'created_by', 'created_at')
+    date_hierarchy = 'created_at'
+
+    # Batches are built through the API (investments/payouts.py) and keep their withdrawals.
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Settlement file')
+    def settlement(self, obj):
+        return format_html(
+            '<a href="{}">CSV</a> / <a href="{}">JSON</a>',
+            reverse('payout-batch-file', args=[obj.pk, 'csv']), reverse('payout-batch-file', args=[obj.pk, 'json']),
+        )
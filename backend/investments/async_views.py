@@ -0,0 +1,75 @@
+"""
+Async versions of the read-heavy investment endpoints, served under
+``async/`` next to their DRF counterparts (see accounts/async_api.py).
+"""
+from decimal import Decimal
+
+from django.db import models
+
+from accounts.async_api import async_api_view
+from transactions.models import TransactionHistory
+from wallets.cache import acache_per_user
+from wallets.models import Wallet
+from .models import Deposit, InvestmentPlan, UserInvestment, Withdrawal
+from .serializers import InvestmentPlanSerializer, UserInvestmentSerializer
+
+
+@async_api_view(authenticated=False)
+async def investment_plans(request):
+    """Async InvestmentPlanListView."""
+    plans = [plan async for plan in InvestmentPlan.objects.all()]
+    return InvestmentPlanSerializer(plans, many=True).data
+
+
+@async_api_view()
+@acache_per_user('active-investments')
+async def active_investments(request):
+    """Async ActiveInvestmentsView."""
+    investments = [
+        investment async for investment in
+        UserInvestment.objects.filter(user=request.user, status='active')
+        .select_related('plan')
+        .order_by('-start_date')
+    ]
+    return UserInvestmentSerializer(investments, many=True).data
+
+
+async def _sum(queryset, field):
+    result = await queryset.aaggregate(total=models.Sum(field))
+    return result['total'] or Decimal('0.00')
+
+
+@async_api_view()
+@acache_per_user('overview')
+async def wallet_overview(request):
+    """
+    Async WalletOverviewView. The lookups are awaited one after another:
+    the async ORM runs them all on the same thread-sensitive executor, so
+    gathering them would not overlap them. A user without a wallet gets a
+    zero balance rather than a write on this read path.
+    """
+    user = request.user
+    wallet = await Wallet.objects.filter(user=user).afirst()
+    total_deposits = await _sum(Deposit.objects.filter(user=user, status='approved'), 'amount')
+    total_withdrawals = await _sum(Withdrawal.objects.filter(user=user, status='approved'), 'amount')
+    total_profits = await _sum(UserInvestment.objects.filter(user=user, status='completed'), 'expected_profit')
+    last_txn = await TransactionHistory.objects.filter(user=user).order_by('-created_at').afirst()
+
+    last_transaction_data = (
+        {
+            'transaction_type': last_txn.transaction_type,
+            'amount': last_txn.amount,
+            'status': last_txn.status,
+            'created_at': last_txn.created_at,
+        }
+        if last_txn
+        else None
+    )
+
+    return {
+        'balance': wallet.balance if wallet else Decimal('0.00'),
+        'total_deposits': total_deposits,
+        'total_withdrawals': total_withdrawals,
+        'total_profits': total_profits,
+        'last_transaction': last_transaction_data,
+    }
@@ -0,0 +1,199 @@
+"""
+Bulk review of deposits and withdrawals.
+
+``review(model, ids, action)`` approves or rejects many pending deposits or
+withdrawals at once. The admin actions and the bulk API
+(``deposits/bulk-review/`` and ``withdrawals/bulk-review/``) both use it.
+
+The ids are processed in chunks of ``BULK_REVIEW_CHUNK_SIZE``, on each
+shard in turn. Each chunk runs in its own transaction with a fixed number
+of statements, however many rows it holds:
+
+* lock the chunk's pending rows and, for approvals, their owners' wallets;
+* for withdrawal approvals, one aggregate of each owner's funds locked in
+  active investments;
+* one UPDATE for the status of the rows that pass;
+* one UPDATE moving every affected wallet by its total, through a CASE on
+  the user id;
+* one ``bulk_create`` for the history rows (``DEP-<id>``, ``WDR-<id>``).
+
+Withdrawals are approved oldest first while the wallet's available balance
+covers them: the balance less the funds locked in active investments, as
+in ``Wallet.get_available_balance()``. The rest stay pending as
+``insufficient_funds``. Rows that are no longer pending are reported and
+left alone, and so are rows another reviewer has claimed from the review
+queue (investments/review_queue.py). A decision clears the row's claim.
+None of this sends model signals, so the owners' cached responses are
+invalidated, and their reads pinned to the primary, when each chunk
+commits. Payout batches (investments/payouts.py) approve the pending
+withdrawals they claim through ``approve_locked()``.
+
+Every id gets one outcome, in the order given: ``approved``, ``rejected``,
+``insufficient_funds``, ``not_pending``, ``claimed_by_other`` or
+``not_found``.
+"""
+import logging
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from legacy_prime_backend.db_router import pin_user
+from legacy_prime_backend.sharding import each_shard
+from monitoring.logs import event
+from transactions.models import TransactionHistory
+from wallets.cache import bump_generation
+from wallets.models import Wallet
+from .models import Deposit, Investment, Withdrawal
+from .review_queue import held_by_other
+
+logger = logging.getLogger(__name__)
+
+APPROVE, REJECT = 'approve', 'reject'
+ACTIONS = (APPROVE, REJECT)
+APPROVED, REJECTED = 'approved', 'rejected'
+INSUFFICIENT_FUNDS, NOT_PENDING, NOT_FOUND = 'insufficient_funds', 'not_pending', 'not_found'
+CLAIMED_BY_OTHER = 'claimed_by_other'
+# A decision ends the row's review queue claim.
+DECIDED = {'updated_at': Now(), 'claimed_by': None, 'claimed_until': None}
+
+# transaction_type, reference prefix and description of the history row an approval writes
+HISTORY = {
+    Deposit: ('deposit', 'DEP', 'Deposit approved and credited to wallet'),
+    Withdrawal: ('withdrawal', 'WDR', 'Withdrawal approved and sent'),
+}
+
+
+def chunk_size():
+    return getattr(settings, 'BULK_REVIEW_CHUNK_SIZE', 500)
+
+
+def _per_user(column, amounts):
+    """``column + amounts[user_id]``, for every wallet of ``amounts`` in one expression."""
+    # One branch per distinct amount: round sums are common, and each branch is compiled and evaluated per row.
+    users_by_amount = defaultdict(list)
+    for user_id, amount in amounts.items():
+        users_by_amount[amount].append(user_id)
+    return F(column) + Case(
+        *(When(user_id__in=user_ids, then=Value(amount)) for amount, user_ids in users_by_amount.items()),
+        default=Value(Decimal('0')),
+        output_field=DecimalField(max_digits=20, decimal_places=2),
+    )
+
+
+def _invalidate(user_ids):
+    for user_id in user_ids:
+        bump_generation(user_id)
+        pin_user(user_id)
+
+
+def _approve(model, alias, pending, outcomes):
+    wallets = Wallet.objects.using(alias)
+    user_ids = {user_id for _, user_id, _ in pending}
+    balances = dict(wallets.select_for_update().filter(user_id__in=user_ids).values_list('user_id', 'balance'))
+    if model is Deposit:
+        missing = user_ids - balances.keys()
+        if missing:
+            wallets.bulk_create([Wallet(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+            balances.update(dict.fromkeys(missing, Decimal('0')))
+        locked = {}
+    else:
+        locked = dict(
+            Investment.objects.using(alias).filter(user_id__in=user_ids, is_completed=False)
+            .values('user_id').annotate(total=Sum('amount')).values_list('user_id', 'total')
+        )
+
+    sign = 1 if model is Deposit else -1
+    transaction_type, prefix, description = HISTORY[model]
+    approved, history, moved = [], [], defaultdict(Decimal)
+    for pk, user_id, amount in pending:
+        before = balances.get(user_id)
+        if before is None or before + sign * amount < locked.get(user_id, 0):
+            outcomes[pk] = INSUFFICIENT_FUNDS
+            continue
+        balances[user_id] = after = before + sign * amount
+        moved[user_id] += amount
+        approved.append(pk)
+        outcomes[pk] = APPROVED
+        history.append(TransactionHistory(
+            user_id=user_id, transaction_type=transaction_type, amount=amount, status='successful',
+            balance_before=before, balance_after=after, description=description, reference=f'{prefix}-{pk}',
+        ))
+    if not approved:
+        return set()
+
+    model.objects.using(alias).filter(pk__in=approved).update(status=APPROVED, **DECIDED)
+    # updated_at moves too, so conditional GETs on the wallet see the change (wallets/conditional.py).
+    changes = {'balance': _per_user('balance', {user_id: sign * amount for user_id, amount in moved.items()})}
+    if model is Withdrawal:
+        changes['total_withdrawn'] = _per_user('total_withdrawn', moved)
+    wallets.filter(user_id__in=moved).update(updated_at=Now(), **changes)
+    TransactionHistory.objects.using(alias).bulk_create(history)
+    return set(moved)
+
+
+def approve_locked(model, alias, pending):
+    """
+    Approve ``pending`` ((pk, user_id, amount) of ``model`` rows on
+    ``alias``, oldest first), which the caller has locked in its open
+    transaction. Returns {pk: outcome}.
+    """
+    outcomes = {}
+    touched = _approve(model, alias, pending, outcomes)
+    if touched:
+        transaction.on_commit(lambda: _invalidate(touched), using=alias)
+    return outcomes
+
+
+def _review_chunk(queryset, ids, action, reviewer, outcomes):
+    """Review the rows of ``ids`` on ``queryset``'s database in one transaction."""
+    model, alias = queryset.model, queryset.db
+    now = timezone.now()
+    with transaction.atomic(using=alias):
+        rows = (
+            queryset.select_for_update().filter(pk__in=ids).order_by('created_at', 'pk')
+            .values_list('pk', 'user_id', 'amount', 'status', 'claimed_by_id', 'claimed_until')
+        )
+        pending = []
+        for pk, user_id, amount, status, claimed_by_id, claimed_until in rows:
+            if status != 'pending':
+                outcomes[pk] = NOT_PENDING
+            elif held_by_other(claimed_by_id, claimed_until, reviewer, now):
+                outcomes[pk] = CLAIMED_BY_OTHER
+            else:
+                pending.append((pk, user_id, amount))
+        if not pending:
+            return
+
+        if action == APPROVE:
+            outcomes.update(approve_locked(model, alias, pending))
+            return
+        model.objects.using(alias).filter(pk__in=[pk for pk, _, _ in pending]).update(status=REJECTED, **DECIDED)
+        outcomes.update((pk, REJECTED) for pk, _, _ in pending)
+        touched = {user_id for _, user_id, _ in pending}
+        transaction.on_commit(lambda: _invalidate(touched), using=alias)
+
+
+def review(model, ids, action, reviewer=None):
+    """Approve or reject the pending ``model`` rows with ``ids``. Returns ``[(id, outcome)]`` in the order given."""
+    if model not in HISTORY or action not in ACTIONS:
+        raise ValueError(f'Cannot {action} {model.__name__} rows in bulk.')
+    ids = list(dict.fromkeys(int(pk) for pk in ids))
+    # Pinned to the primary of each shard: the rows are locked and written.
+    parts = [part.using(part._db or router.db_for_write(model)) for part in each_shard(model.objects.all())]
+    outcomes = {}
+    size = chunk_size()
+    for start in range(0, len(ids), size):
+        for part in parts:
+            _review_chunk(part, ids[start:start + size], action, reviewer, outcomes)
+
+    results = [(pk, outcomes.get(pk, NOT_FOUND)) for pk in ids]
+    event(
+        logger, f'{model._meta.model_name}.bulk_reviewed', action=action,
+        reviewer_id=getattr(reviewer, 'pk', None), **Counter(outcome for _, outcome in results),
+    )
+    return results
@@ -0,0 +1,72 @@
+"""
+Deposit proof image processing, with Pillow only.
+
+``process()`` runs in the proof worker processes (investments/proofs.py),
+which are spawned rather than forked and never set up Django, so nothing
+here may import it. Bytes in, bytes out. Pillow is imported on first use,
+to keep it out of the lean startup (LEAN_STARTUP).
+"""
+import io
+
+FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _rgb(image):
+    from PIL import Image
+
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+
+def _jpeg(image, quality):
+    # Only what is passed to save() is written: no EXIF, ICC profile or
+    # XMP. Comments are carried over from image.info, so clear that too.
+    image.info = {}
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _open(source):
+    from PIL import Image
+
+    return Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def process(source, max_side, thumbnail_side, max_pixels):
+    """
+    The proof upload ``source`` (its bytes, or the path to it) re-encoded as a metadata-free JPEG of at most
+    ``max_side`` pixels a side, and a ``thumbnail_side`` thumbnail of it.
+    Raises InvalidImage for anything that is not a whole JPEG, PNG or WebP
+    image of at most ``max_pixels`` pixels.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with _open(source) as probe:
+            if probe.format not in FORMATS:
+                raise InvalidImage(f'{probe.format} images are not accepted.')
+            if probe.width * probe.height > max_pixels:
+                raise InvalidImage(f'The image has more than {max_pixels:,} pixels.')
+            probe.verify()
+        with _open(source) as image:
+            # JPEGs decode straight at a reduced scale, much faster than in full.
+            image.draft('RGB', (max_side, max_side))
+            image = _rgb(ImageOps.exif_transpose(image))
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            proof = _jpeg(image, quality=85)
+            image.thumbnail((thumbnail_side, thumbnail_side), Image.Resampling.LANCZOS)
+            thumbnail = _jpeg(image, quality=75)
+    except InvalidImage:
+        raise
+    except Exception as exc:  # Pillow raises OSError, SyntaxError, ValueError, DecompressionBombError...
+        raise InvalidImage(f'The file is not a readable image ({exc}).') from exc
+    return proof, thumbnail
@@ -0,0 +1,37 @@
+from collections import Counter
+from itertools import chain, islice
+
+from django.core.management.base import BaseCommand
+
+from investments import proofs
+from investments.models import Deposit
+from legacy_prime_backend.sharding import each_shard
+
+
+class Command(BaseCommand):
+    help = 'Check, strip and thumbnail the deposit proofs still waiting for it (see investments/proofs.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Process at most this many deposits (default all)')
+
+    def handle(self, *args, **options):
+        waiting = Deposit.objects.filter(proof_state='processing').order_by('created_at', 'pk').only('pk', 'user_id', 'proof')
+        limit = options['limit']
+        # Each shard's rows are read before its first proof is stored: they leave the filter as they are.
+        deposits = chain.from_iterable(list(part[:limit] if limit else part) for part in each_shard(waiting))
+        if limit is not None:
+            deposits = islice(deposits, limit)
+
+        states = Counter()
+        try:
+            for deposit, state in proofs.process_many(deposits):
+                states[state] += 1
+                if not sum(states.values()) % 100:
+                    self.stdout.write(f'Processed {sum(states.values())} proof(s)...')
+        finally:
+            proofs.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {sum(states.values())} proof(s): {states['ready']} ready, {states['invalid']} invalid."
+        ))
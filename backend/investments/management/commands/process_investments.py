@@ -4,6 +4,8 @@ from django.db import transaction
 from investments.models import Investment
 from transactions.models import TransactionHistory
 from decimal import Decimal
+from itertools import chain
+from legacy_prime_backend.sharding import each_shard
 
 class Command(BaseCommand):
     help = 'Process active investments and distribute profits'
@@ -17,9 +19,9 @@ class Command(BaseCommand):
             ends_at__lte=timezone.now()
         ).select_related('user', 'plan')
 
-        for investment in active_investments:
+        for investment in chain.from_iterable(each_shard(active_investments)):
             try:
-                with transaction.atomic():
+                with transaction.atomic(using=investment._state.db):
                     # Calculate and distribute profit
                     profit = investment.calculate_profit()
                     
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0008_userinvestment_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['created_at', 'id'], name='deposit_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userinvestment',
+            index=models.Index(fields=['start_date', 'id'], name='userinvestment_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['created_at', 'id'], name='withdrawal_created_idx'),
+        ),
+    ]
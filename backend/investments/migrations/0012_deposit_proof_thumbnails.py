@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0011_review_queue_leases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deposit',
+            name='proof_state',
+            field=models.CharField(choices=[('processing', 'Processing'), ('ready', 'Ready'), ('invalid', 'Invalid')], default='processing', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='deposit',
+            name='proof_thumbnail',
+            field=models.ImageField(blank=True, upload_to='deposits/thumbnails/'),
+        ),
+    ]
@@ -5,6 +5,8 @@ from datetime import timedelta
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
+from legacy_prime_backend.sharding import ShardedQuerySet
+
 User = settings.AUTH_USER_MODEL
 
 
@@ -42,6 +44,12 @@ class UserInvestment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     expected_profit = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
     total_payout = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['start_date', 'id'], name='userinvestment_start_idx')]
 
     def __str__(self):
         return f"{self.user.username} - {self.plan.name}"
@@ -68,6 +76,8 @@ class Investment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     ends_at = models.DateTimeField(null=True, blank=True)
 
+    objects = ShardedQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         if not self.ends_at:
             self.ends_at = self.created_at + timedelta(days=self.plan.duration_days)
@@ -130,14 +140,36 @@ class Deposit(models.Model):
         ('approved', 'Approved'),
         ('rejected', 'Rejected'),
     ]
+    PROOF_STATE_CHOICES = [
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('invalid', 'Invalid'),
+    ]
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="deposits")
     amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(10)])
     proof = models.ImageField(upload_to='deposits/')
+    # Filled in by the proof workers (investments/proofs.py) once the upload is checked and re-encoded.
+    proof_thumbnail = models.ImageField(upload_to='deposits/thumbnails/', blank=True)
+    proof_state = models.CharField(max_length=10, choices=PROOF_STATE_CHOICES, default='processing')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # Review queue lease (investments/review_queue.py): who is reviewing the row, and until when.
+    claimed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.DO_NOTHING, related_name="+", db_constraint=False,
+    )
+    claimed_until = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='deposit_created_idx'),
+            # The review queue takes the oldest pending rows.
+            models.Index(fields=['status', 'created_at', 'id'], name='deposit_queue_idx'),
+        ]
+
     def approve(self):
         if self.status != 'approved':
             self.status = 'approved'
@@ -169,9 +201,27 @@ class Withdrawal(models.Model):
     amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(10)])
     wallet_address = models.CharField(max_length=255)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Set when a payout batch claims the withdrawal (investments/payouts.py).
+    payout_batch = models.ForeignKey(
+        'PayoutBatch', null=True, blank=True, on_delete=models.PROTECT, related_name="withdrawals",
+    )
+    # Review queue lease (investments/review_queue.py): who is reviewing the row, and until when.
+    claimed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.DO_NOTHING, related_name="+", db_constraint=False,
+    )
+    claimed_until = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='withdrawal_created_idx'),
+            # The review queue takes the oldest pending rows.
+            models.Index(fields=['status', 'created_at', 'id'], name='withdrawal_queue_idx'),
+        ]
+
     def approve(self):
         """Approve withdrawal only if user has enough balance."""
         from wallets.models import Wallet
@@ -188,3 +238,29 @@ class Withdrawal(models.Model):
 
     def __str__(self):
         return f"Withdrawal {self.id} - {self.user.username} ({self.status})"
+
+
+# -----------------------------
+# PAYOUT BATCH MODEL
+# -----------------------------
+class PayoutBatch(models.Model):
+    """A set of withdrawals paid out together, settled from one file per batch."""
+    STATUS_CHOICES = [
+        ('building', 'Building'),
+        ('ready', 'Ready'),
+    ]
+
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="payout_batches")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='building')
+    withdrawal_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    # {network: {"count": n, "amount": "123.45"}}
+    totals = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = "Payout batches"
+
+    def __str__(self):
+        return f"Payout batch {self.id} ({self.withdrawal_count} withdrawals, {self.status})"
@@ -0,0 +1,193 @@
+"""
+Payout batches: withdrawals paid out together from one settlement file.
+
+``build(limit, statuses)`` creates a ``PayoutBatch`` and claims up to
+``limit`` (``PAYOUT_BATCH_MAX_ITEMS``) unbatched withdrawals for it,
+oldest first. By default only approved withdrawals are claimed. With
+``statuses=['pending', 'approved']`` the pending ones are approved first,
+in the same transaction as the claim and exactly as bulk review approves
+them (``bulk.approve_locked()``): the wallet is debited and a history row
+written. Pending withdrawals the wallet cannot cover, or that another
+reviewer holds in the review queue, stay pending and out of the batch. So
+every withdrawal in a settlement file has been paid for.
+
+Each shard's claim is one transaction. It locks the oldest unbatched
+candidates, approves the pending ones, then claims the approved rows with
+one UPDATE:
+
+    UPDATE withdrawal SET payout_batch_id = <batch>
+    WHERE payout_batch_id IS NULL AND id IN (<the approved candidate ids>)
+
+The ``payout_batch_id IS NULL`` test is what keeps concurrent builders
+apart. On PostgreSQL the second builder to lock a row waits for the first
+and then finds it claimed; SQLite runs one write at a time. A batch can
+end up smaller than ``limit``, but no withdrawal is ever in two batches.
+
+The withdrawals are grouped by the network their ``wallet_address`` names:
+``T...`` is TRC20, ``0x...`` is ERC20, ``bc1q...`` is BTC, and anything
+else is OTHER. ``csv_lines()`` and ``json_chunks()`` stream the settlement
+file network by network, oldest first within each network, without
+loading the batch into memory.
+"""
+import csv
+import heapq
+import json
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Case, Count, Sum, Value, When
+from django.db.models.functions import Left, Now
+from django.db.models.lookups import Exact
+from django.utils import timezone
+
+from legacy_prime_backend.sharding import each_shard
+from monitoring.logs import event
+from . import bulk
+from .models import PayoutBatch, Withdrawal
+from .review_queue import held_by_other
+
+logger = logging.getLogger(__name__)
+
+# (network, wallet_address prefix), checked in this order.
+NETWORKS = (
+    ('TRC20', 'T'),
+    ('ERC20', '0x'),
+    ('BTC', 'bc1q'),
+)
+OTHER = 'OTHER'
+CLAIMABLE = ('pending', 'approved')
+COLUMNS = ('network', 'withdrawal_id', 'user_id', 'wallet_address', 'amount', 'requested_at')
+ITERATOR_CHUNK_SIZE = 2000
+CENT = Decimal('0.01')
+
+
+def max_items():
+    return getattr(settings, 'PAYOUT_BATCH_MAX_ITEMS', 50000)
+
+
+def network_for(address):
+    for network, prefix in NETWORKS:
+        if address.startswith(prefix):
+            return network
+    return OTHER
+
+
+def network_expression():
+    """``network_for(wallet_address)`` in SQL."""
+    # Comparing a prefix with = rather than LIKE: SQLite's LIKE ignores case.
+    return Case(
+        *(When(Exact(Left('wallet_address', len(prefix)), prefix), then=Value(network)) for network, prefix in NETWORKS),
+        default=Value(OTHER),
+    )
+
+
+def _claim(part, batch, statuses, limit, created_by):
+    """Claim up to ``limit`` of ``part``'s unbatched withdrawals for ``batch``, approving the pending ones first."""
+    with transaction.atomic(using=part.db):
+        candidates = list(
+            part.select_for_update().filter(payout_batch__isnull=True, status__in=statuses)
+            .order_by('created_at', 'pk')
+            .values_list('pk', 'user_id', 'amount', 'status', 'claimed_by_id', 'claimed_until')[:limit]
+        )
+        now = timezone.now()
+        ids = [pk for pk, _, _, status, _, _ in candidates if status == 'approved']
+        pending = [
+            (pk, user_id, amount) for pk, user_id, amount, status, claimed_by_id, claimed_until in candidates
+            if status == 'pending' and not held_by_other(claimed_by_id, claimed_until, created_by, now)
+        ]
+        if pending:
+            outcomes = bulk.approve_locked(Withdrawal, part.db, pending)
+            ids += [pk for pk, outcome in outcomes.items() if outcome == bulk.APPROVED]
+        return part.filter(pk__in=ids, payout_batch__isnull=True).update(payout_batch=batch, updated_at=Now())
+
+
+def build(limit=None, statuses=('approved',), created_by=None):
+    """Create a batch and claim up to ``limit`` withdrawals for it. None if there was nothing to claim."""
+    if not set(statuses) <= set(CLAIMABLE):
+        raise ValueError(f'Only {" and ".join(CLAIMABLE)} withdrawals can be batched.')
+    limit = max_items() if limit is None else limit
+    batch = PayoutBatch.objects.create(created_by=created_by)
+
+    claimed = 0
+    for part in each_shard(Withdrawal.objects.all()):
+        if claimed >= limit:
+            break
+        # Pinned to the primary of each shard: the rows are locked and written.
+        part = part.using(part._db or router.db_for_write(Withdrawal))
+        claimed += _claim(part, batch, list(statuses), limit - claimed, created_by)
+    if not claimed:
+        batch.delete()
+        return None
+
+    totals = {}
+    for part in each_shard(Withdrawal.objects.filter(payout_batch=batch)):
+        groups = part.annotate(network=network_expression()).values('network').annotate(
+            count=Count('pk'), amount=Sum('amount'),
+        ).order_by()
+        for row in groups:
+            entry = totals.setdefault(row['network'], {'count': 0, 'amount': 0})
+            entry['count'] += row['count']
+            entry['amount'] += row['amount']
+    batch.withdrawal_count = sum(entry['count'] for entry in totals.values())
+    batch.total_amount = sum(entry['amount'] for entry in totals.values())
+    batch.totals = {
+        network: {'count': entry['count'], 'amount': str(Decimal(entry['amount']).quantize(CENT))}
+        for network, entry in sorted(totals.items())
+    }
+    batch.status = 'ready'
+    batch.save(update_fields=['withdrawal_count', 'total_amount', 'totals', 'status'])
+
+    event(
+        logger, 'payout_batch.built', batch_id=batch.pk, withdrawals=batch.withdrawal_count,
+        amount=batch.total_amount, created_by=getattr(created_by, 'pk', None),
+    )
+    return batch
+
+
+def rows(batch):
+    """The batch's withdrawals as ``COLUMNS`` tuples, by network, then oldest first, merged across shards."""
+    networks = [network for network, _ in NETWORKS] + [OTHER]
+    fields = ('pk', 'user_id', 'wallet_address', 'amount', 'created_at')
+    for network in networks:
+        parts = [
+            part.alias(network=network_expression()).filter(network=network)
+            .order_by('created_at', 'pk').values_list(*fields).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+            for part in each_shard(Withdrawal.objects.filter(payout_batch=batch))
+        ]
+        for pk, user_id, address, amount, created_at in heapq.merge(*parts, key=lambda row: (row[4], row[0])):
+            yield network, pk, user_id, address, amount, created_at
+
+
+class _Echo:
+    """A file-like object whose write() hands back what it was given."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(batch):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for network, pk, user_id, address, amount, created_at in rows(batch):
+        yield writer.writerow((network, pk, user_id, address, amount, created_at.isoformat()))
+
+
+def json_chunks(batch):
+    header = {
+        'batch': batch.pk,
+        'created_at': batch.created_at.isoformat(),
+        'withdrawal_count': batch.withdrawal_count,
+        'total_amount': str(batch.total_amount),
+        'networks': batch.totals,
+    }
+    yield json.dumps(header)[:-1] + ', "withdrawals": ['
+    separator = ''
+    for row in rows(batch):
+        network, pk, user_id, address, amount, created_at = row
+        yield separator + json.dumps(dict(zip(COLUMNS, (
+            network, pk, user_id, address, str(amount), created_at.isoformat(),
+        ))))
+        separator = ', '
+    yield ']}'
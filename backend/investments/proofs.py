@@ -0,0 +1,192 @@
+"""
+Deposit proofs, processed off the request thread.
+
+The upload request only checks the proof's size, extension and leading
+bytes (``validate_upload``) and stores the file as sent, with the deposit's
+``proof_state`` set to ``processing``. Once the deposit is committed,
+``submit()`` hands the file to a pool of ``PROOF_WORKERS`` processes.
+There, investments/images.py does the following with Pillow:
+
+* checks the file is a whole JPEG, PNG or WebP image of at most
+  ``PROOF_MAX_PIXELS`` pixels;
+* applies its EXIF orientation, then drops the EXIF and every other
+  metadata block (GPS position, camera serial numbers, ...);
+* re-encodes it as a JPEG of at most ``PROOF_MAX_SIDE`` pixels a side;
+* makes a ``PROOF_THUMBNAIL_SIDE`` thumbnail for the review screens.
+
+The re-encoded image replaces the upload, the thumbnail goes in
+``proof_thumbnail``, and the deposit becomes ``ready``. A file that fails
+is marked ``invalid`` and kept as sent, for the reviewer to reject.
+
+The workers are spawned, not forked from a threaded server, and import
+only Pillow. ``PROOF_WORKERS = 0`` processes inline instead, on the thread
+that commits. ``manage.py process_deposit_proofs`` picks up deposits left
+``processing`` by a restart, and any stored before this pipeline existed.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models.functions import Now
+
+from monitoring.logs import event
+from . import images
+from .models import Deposit
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+# Leading bytes of each accepted format; WebP is RIFF....WEBP.
+SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'RIFF')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def workers():
+    return _setting('PROOF_WORKERS', 2)
+
+
+def validate_upload(upload):
+    """The checks worth making on the request thread; the image itself is read by the workers."""
+    if upload.size > _setting('PROOF_MAX_BYTES', 10 * 1024 * 1024):
+        raise ValidationError('The proof must be at most %(limit)d MB.', params={
+            'limit': _setting('PROOF_MAX_BYTES', 10 * 1024 * 1024) // (1024 * 1024),
+        })
+    if not upload.name.lower().endswith(EXTENSIONS):
+        raise ValidationError('The proof must be a JPEG, PNG or WebP image.')
+    head = upload.read(12)
+    upload.seek(0)
+    if not head.startswith(SIGNATURES) or (head.startswith(b'RIFF') and head[8:12] != b'WEBP'):
+        raise ValidationError('The proof must be a JPEG, PNG or WebP image.')
+
+
+def pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers(), mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        current, _pool = _pool, None
+    if current is not None:
+        current.shutdown(wait=True)
+
+
+def _options():
+    return (
+        _setting('PROOF_MAX_SIDE', 2048),
+        _setting('PROOF_THUMBNAIL_SIDE', 320),
+        _setting('PROOF_MAX_PIXELS', 40_000_000),
+    )
+
+
+def _read(deposit):
+    with default_storage.open(deposit.proof.name, 'rb') as fh:
+        return fh.read()
+
+
+def _source(deposit):
+    # A local file is read by the worker, not copied to it through the request thread.
+    try:
+        return default_storage.path(deposit.proof.name)
+    except NotImplementedError:
+        return _read(deposit)
+
+
+def _outcome(future):
+    try:
+        return future.result()
+    except images.InvalidImage as exc:
+        return exc
+
+
+def _run(data):
+    try:
+        return images.process(data, *_options())
+    except images.InvalidImage as exc:
+        return exc
+
+
+def _submit(deposit):
+    # images.process itself, not a wrapper here: the workers must not import Django.
+    return pool().submit(images.process, _source(deposit), *_options())
+
+
+def _store(deposit, result):
+    """Save the worker's ``result`` for ``deposit``: (proof, thumbnail) bytes or an InvalidImage. Returns the new state."""
+    rows = Deposit.objects.filter(user_id=deposit.user_id, pk=deposit.pk)
+    if isinstance(result, images.InvalidImage):
+        rows.update(proof_state='invalid', updated_at=Now())
+        event(logger, 'deposit.proof_invalid', logging.WARNING, deposit_id=deposit.pk, reason=str(result))
+        return 'invalid'
+    proof, thumbnail = result
+    original = deposit.proof.name
+    stem = f'{deposit.pk}-{os.path.splitext(os.path.basename(original))[0]}'
+    proof_name = default_storage.save(f'deposits/{stem}.jpg', ContentFile(proof))
+    thumbnail_name = default_storage.save(f'deposits/thumbnails/{stem}.jpg', ContentFile(thumbnail))
+    rows.update(proof=proof_name, proof_thumbnail=thumbnail_name, proof_state='ready', updated_at=Now())
+    if original != proof_name:
+        default_storage.delete(original)
+    event(logger, 'deposit.proof_processed', deposit_id=deposit.pk, proof_bytes=len(proof), thumbnail_bytes=len(thumbnail))
+    return 'ready'
+
+
+def process(deposit):
+    """Process ``deposit``'s proof on this thread. Returns its new ``proof_state``."""
+    return _store(deposit, _run(_source(deposit)))
+
+
+def process_many(deposits):
+    """
+    Process the proofs of ``deposits`` in the pool, a few per worker at a
+    time, storing each result on this thread. Yields (deposit, proof_state).
+    """
+    if not workers():
+        for deposit in deposits:
+            yield deposit, process(deposit)
+        return
+    deposits = iter(deposits)
+    while batch := list(islice(deposits, workers() * 4)):
+        futures = {_submit(deposit): deposit for deposit in batch}
+        for future in as_completed(futures):
+            yield futures[future], _store(futures[future], _outcome(future))
+
+
+def _finished(deposit, future):
+    # Runs on the pool's result thread, which has its own connections.
+    try:
+        _store(deposit, _outcome(future))
+    except Exception:  # left processing, for process_deposit_proofs to retry
+        event(logger, 'deposit.proof_failed', logging.ERROR, exc_info=True, deposit_id=deposit.pk)
+    finally:
+        connections.close_all()
+
+
+def submit(deposit):
+    """Process ``deposit``'s proof in the worker pool, or inline with ``PROOF_WORKERS = 0``."""
+    if not workers():
+        return process(deposit)
+    future = _submit(deposit)
+    future.add_done_callback(lambda done: _finished(deposit, done))
+    return future
+
+
+def submit_on_commit(deposit):
+    transaction.on_commit(lambda: submit(deposit), using=deposit._state.db)
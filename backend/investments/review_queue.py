@@ -0,0 +1,116 @@
+"""
+Review queue for pending deposits and withdrawals.
+
+Instead of paging through the same admin list, each reviewer asks for the
+next ``count`` pending rows with ``claim()``. The rows are leased to them
+for ``REVIEW_CLAIM_SECONDS`` through ``claimed_by`` and ``claimed_until``.
+Leased rows are skipped by other reviewers' claims and by their bulk
+reviews (investments/bulk.py). An expired lease frees the row again, so a
+reviewer who walks away holds nothing for long. ``release()`` hands rows
+back early.
+
+Claiming never waits on another reviewer:
+
+* On databases with ``SELECT ... FOR UPDATE SKIP LOCKED`` (PostgreSQL),
+  the candidate rows are locked with ``skip_locked``. Rows another
+  reviewer's claim is leasing at that moment are passed over, not waited
+  for. The lease is then written in the same transaction.
+* Elsewhere (SQLite), one UPDATE writes the lease on the oldest free rows.
+  It is guarded by the lease still being free, and SQLite runs one write
+  at a time. The rows that UPDATE leased are then read back by the
+  claim's own ``claimed_until``.
+
+``stats()`` reports the queue's depth and the age of its oldest rows.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from legacy_prime_backend.sharding import each_shard
+
+MAX_CLAIM = 100
+
+
+def claim_seconds():
+    return getattr(settings, 'REVIEW_CLAIM_SECONDS', 300)
+
+
+def _free(now):
+    return Q(claimed_until__isnull=True) | Q(claimed_until__lte=now)
+
+
+def _pending(model):
+    return model.objects.filter(status='pending')
+
+
+def _claim_part(part, reviewer, count, now, until):
+    free = part.filter(_free(now))
+    if connections[part.db].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=part.db):
+            ids = list(
+                free.select_for_update(skip_locked=True).order_by('created_at', 'pk').values_list('pk', flat=True)[:count]
+            )
+            part.filter(pk__in=ids).update(claimed_by=reviewer, claimed_until=until)
+    else:
+        candidates = free.order_by('created_at', 'pk').values('pk')[:count]
+        free.filter(pk__in=candidates).update(claimed_by=reviewer, claimed_until=until)
+    return list(part.filter(claimed_by=reviewer, claimed_until=until).order_by('created_at', 'pk'))
+
+
+def claim(model, reviewer, count):
+    """Lease the ``count`` oldest free pending ``model`` rows to ``reviewer``. Returns (rows, claimed_until)."""
+    now = timezone.now()
+    until = now + timedelta(seconds=claim_seconds())
+    rows = []
+    for part in each_shard(_pending(model)):
+        if len(rows) >= count:
+            break
+        # Pinned to the primary of each shard: the lease is written and read back.
+        part = part.using(part._db or router.db_for_write(model))
+        rows.extend(_claim_part(part, reviewer, count - len(rows), now, until))
+    return rows, until
+
+
+def release(model, reviewer, ids):
+    """Hand ``reviewer``'s leases on ``ids`` back to the queue. Returns how many were released."""
+    return sum(
+        part.filter(pk__in=ids, claimed_by=reviewer).update(claimed_by=None, claimed_until=None)
+        for part in each_shard(model.objects.all())
+    )
+
+
+def held_by_other(claimed_by_id, claimed_until, reviewer, now):
+    """Whether a row's lease keeps ``reviewer`` away from it."""
+    return (
+        claimed_by_id is not None and claimed_until is not None and claimed_until > now
+        and claimed_by_id != getattr(reviewer, 'pk', None)
+    )
+
+
+def stats(model):
+    """Depth (pending, claimed, available) and the age in seconds of the oldest pending and available rows."""
+    now = timezone.now()
+    depth = {'pending': 0, 'claimed': 0, 'available': 0}
+    oldest = {'pending': None, 'available': None}
+    for part in each_shard(_pending(model)):
+        row = part.aggregate(
+            pending=Count('pk'),
+            available=Count('pk', filter=_free(now)),
+            oldest_pending=Min('created_at'),
+            oldest_available=Min('created_at', filter=_free(now)),
+        )
+        depth['pending'] += row['pending']
+        depth['available'] += row['available']
+        for key in oldest:
+            value = row[f'oldest_{key}']
+            if value is not None and (oldest[key] is None or value < oldest[key]):
+                oldest[key] = value
+    depth['claimed'] = depth['pending'] - depth['available']
+    return {
+        **depth,
+        **{f'oldest_{key}_age_seconds': None if value is None else round((now - value).total_seconds())
+           for key, value in oldest.items()},
+    }
@@ -4,8 +4,11 @@ from .models import (
     UserInvestment,
     Deposit,
     Withdrawal,
+    PayoutBatch,
 )
 from wallets.models import Wallet
+from . import proofs
+from .review_queue import MAX_CLAIM
 
 
 # ==========================
@@ -77,10 +80,13 @@ class InvestmentProfitSerializer(serializers.ModelSerializer):
 
 class DepositSerializer(serializers.ModelSerializer):
     """Serializer for user deposit creation and viewing."""
+    # Only the cheap checks here: the proof workers decode the image (investments/proofs.py).
+    proof = serializers.FileField(validators=[proofs.validate_upload])
+
     class Meta:
         model = Deposit
-        fields = ['id', 'user', 'amount', 'proof', 'status', 'created_at']
-        read_only_fields = ['user', 'status', 'created_at']
+        fields = ['id', 'user', 'amount', 'proof', 'proof_thumbnail', 'proof_state', 'status', 'created_at']
+        read_only_fields = ['user', 'proof_thumbnail', 'proof_state', 'status', 'created_at']
 
 
 class DepositApprovalSerializer(serializers.ModelSerializer):
@@ -146,6 +152,40 @@ class WithdrawalApprovalSerializer(serializers.ModelSerializer):
         return instance
 
 
+class BulkReviewSerializer(serializers.Serializer):
+    """Admin serializer for approving or rejecting many deposits or withdrawals at once."""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=1, max_length=10000)
+    action = serializers.ChoiceField(choices=['approve', 'reject'])
+
+
+class ReviewQueueClaimSerializer(serializers.Serializer):
+    """Admin serializer for claiming the next rows of the review queue."""
+    count = serializers.IntegerField(min_value=1, max_value=MAX_CLAIM, default=10)
+
+
+class ReviewQueueReleaseSerializer(serializers.Serializer):
+    """Admin serializer for handing claimed rows back to the review queue."""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=1, max_length=MAX_CLAIM)
+
+
+# ==========================
+# 🧾 PAYOUT BATCH SERIALIZERS
+# ==========================
+
+class PayoutBatchSerializer(serializers.ModelSerializer):
+    """Admin serializer for payout batches and their per-network totals."""
+    class Meta:
+        model = PayoutBatch
+        fields = ['id', 'status', 'withdrawal_count', 'total_amount', 'totals', 'created_by', 'created_at']
+        read_only_fields = fields
+
+
+class PayoutBatchCreateSerializer(serializers.Serializer):
+    """Admin serializer for building a payout batch from unbatched withdrawals."""
+    max_items = serializers.IntegerField(min_value=1, required=False)
+    statuses = serializers.MultipleChoiceField(choices=['pending', 'approved'], required=False, default=['approved'])
+
+
 # ==========================
 # 👛 WALLET SERIALIZER
 # ==========================
@@ -154,6 +194,6 @@ class WalletSerializer(serializers.ModelSerializer):
     """Serializer for displaying wallet balance."""
     class Meta:
         model = Wallet
-        fields = ['id', 'user', 'balance', 'last_updated']
-        read_only_fields = ['user', 'balance', 'last_updated']
+        fields = ['id', 'user', 'balance', 'updated_at']
+        read_only_fields = ['user', 'balance', 'updated_at']
         
@@ -1,3 +1,815 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from PIL import ExifTags, Image
+
+from django.conf import settings
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from legacy_prime_backend.large_admin import periods
+from legacy_prime_backend.sharding import drop_global_constraints, reserve_id_range, shard_for_user
+from monitoring.testing import QueryBudgetMixin
+from transactions.models import TransactionHistory
+from wallets.cache import bump_generation
+from wallets.models import Wallet
+from . import bulk, payouts
+from .admin import DepositAdmin
+from .models import Deposit, Investment, InvestmentPlan, PayoutBatch, UserInvestment, Withdrawal
+
+User = get_user_model()
+
+
+@override_settings(NPLUSONE_DETECT=True, NPLUSONE_RAISE=True)
+class ListQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every list endpoint runs a fixed number of queries, at 1 row or 1,000."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget', 'budget@example.com', 'pass-12345')
+        cls.staff = User.objects.create_user('budget-staff', 'staff@example.com', 'pass-12345', is_staff=True)
+        cls.plan = InvestmentPlan.objects.order_by('id').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.staff_client = APIClient()
+        self.staff_client.force_authenticate(self.staff)
+
+    def grow(self, model, make):
+        def grow(size):
+            existing = model.objects.count()
+            model.objects.bulk_create([make(i) for i in range(existing, size)])
+            # bulk_create sends no signals; invalidate cached responses by hand
+            bump_generation(self.user.pk)
+        return grow
+
+    def test_plans(self):
+        seeded = InvestmentPlan.objects.count()
+        grow = self.grow(InvestmentPlan, lambda i: InvestmentPlan(
+            name=f'Plan {i}', min_amount=10, max_amount=1000, daily_roi=Decimal('1.00'),
+            duration_days=7, total_return=Decimal('7.00'),
+        ))
+        self.assertBudgetAtSizes(1, self.client, reverse('investment-plans'),
+                                 lambda size: grow(seeded + size), offset=seeded)
+
+    def test_my_investments(self):
+        grow = self.grow(UserInvestment, lambda i: UserInvestment(user=self.user, plan=self.plan, amount=100))
+        # The conditional-GET state query, then the list
+        self.assertBudgetAtSizes(2, self.client, reverse('my-investments'), grow, offset=0)
+
+    def test_active_investments(self):
+        grow = self.grow(UserInvestment, lambda i: UserInvestment(user=self.user, plan=self.plan, amount=100))
+        self.assertBudgetAtSizes(1, self.client, reverse('active-investments'), grow, offset=0)
+
+    def test_deposits(self):
+        grow = self.grow(Deposit, lambda i: Deposit(user=self.user, amount=50, proof='deposits/proof.png'))
+        self.assertBudgetAtSizes(1, self.staff_client, reverse('list-deposits'), grow, offset=0)
+
+    def test_withdrawals(self):
+        grow = self.grow(Withdrawal, lambda i: Withdrawal(user=self.user, amount=50, wallet_address='T' * 34))
+        self.assertBudgetAtSizes(1, self.staff_client, reverse('list-withdrawals'), grow, offset=0)
+
+
+@override_settings(NPLUSONE_DETECT=True, NPLUSONE_RAISE=True)
+class AdminChangelistQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Admin changelists render __str__ of related users/plans without per-row
+    queries. The date drill-down reads its first and last date as two index
+    seeks (legacy_prime_backend/large_admin.py).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('budget-admin', 'admin@example.com', 'pass-12345')
+        cls.plan = InvestmentPlan.objects.order_by('id').first()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def grow(self, model, make):
+        def grow(size):
+            existing = model.objects.count()
+            users = User.objects.bulk_create([
+                User(username=f'{model._meta.model_name}-{i}', email=f'{model._meta.model_name}-{i}@example.com')
+                for i in range(existing, size)
+            ])
+            model.objects.bulk_create([make(user) for user in users])
+        return grow
+
+    def test_user_investments(self):
+        grow = self.grow(UserInvestment, lambda user: UserInvestment(user=user, plan=self.plan, amount=100))
+        self.assertBudgetAtSizes(8, self.client, reverse('admin:investments_userinvestment_changelist'), grow)
+
+    def test_deposits(self):
+        grow = self.grow(Deposit, lambda user: Deposit(user=user, amount=50, proof='deposits/proof.png'))
+        self.assertBudgetAtSizes(7, self.client, reverse('admin:investments_deposit_changelist'), grow)
+
+    def test_withdrawals(self):
+        grow = self.grow(Withdrawal, lambda user: Withdrawal(user=user, amount=50, wallet_address='T' * 34))
+        self.assertBudgetAtSizes(7, self.client, reverse('admin:investments_withdrawal_changelist'), grow)
+
+
+class LargeTableAdminTests(TestCase):
+    """Change lists count a bounded number of rows and drill down by date without a DISTINCT scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('large-admin', 'large-admin@example.com', 'pass-12345')
+        cls.user = User.objects.create_user('depositor', 'depositor@example.com', 'pass-12345')
+        Deposit.objects.bulk_create([Deposit(user=cls.user, amount=50, proof='deposits/proof.png') for _ in range(5)])
+        # Two deposits in March 2023 and three in December 2024; nothing in between.
+        for pk, when in zip(Deposit.objects.order_by('pk').values_list('pk', flat=True), (
+            datetime(2023, 3, 2), datetime(2023, 3, 9), datetime(2024, 12, 1), datetime(2024, 12, 31), datetime(2024, 12, 31),
+        )):
+            Deposit.objects.filter(pk=pk).update(created_at=timezone.make_aware(when))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, query=''):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            response = self.client.get(reverse('admin:investments_deposit_changelist') + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query['sql'] for query in queries if 'DISTINCT' in query['sql']])
+        return response
+
+    def test_years_and_months_are_probed(self):
+        def choices(query=''):
+            return [choice['title'] for choice in date_hierarchy(self.changelist(query).context['cl'])['choices']]
+
+        self.assertEqual(choices(), ['2023', '2024'])
+        self.assertEqual(choices('?created_at__year=2024'), ['December 2024'])
+        self.assertEqual(choices('?created_at__year=2024&created_at__month=12'), ['December 1', 'December 31'])
+
+    def test_probes_seek_from_their_own_period(self):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            self.changelist('?created_at__year=2024')
+        probes = [query['sql'] for query in queries if query['sql'].startswith('SELECT 1 AS')]
+        self.assertTrue(probes)
+        for probe in probes:
+            where = probe.split(' WHERE ', 1)[1]
+            # The month's range alone, without the year's.
+            self.assertIn("'2024-12-01", where)
+            self.assertNotIn("'2024-01-01", where)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=3)
+    def test_count_past_the_limit(self):
+        # SQLite has no estimate: the count stays exact and the last page can be reached.
+        self.assertEqual(self.changelist().context['cl'].result_count, 5)
+        with mock.patch.object(DepositAdmin, 'list_per_page', 2):
+            self.assertEqual(len(self.changelist('?p=3').context['cl'].result_list), 1)
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'vendor', 'postgresql'), \
+                mock.patch('legacy_prime_backend.large_admin.planner_estimate', return_value=4000) as estimate:
+            self.assertEqual(self.changelist().context['cl'].result_count, 4000)
+            self.assertEqual(self.changelist('?created_at__year=2023').context['cl'].result_count, 2)
+        self.assertEqual(estimate.call_count, 1)
+
+    def test_periods_roll_over_the_year(self):
+        months = [start.month for start, _ in periods(datetime(2023, 11, 5), datetime(2024, 2, 1), 'month')]
+        self.assertEqual(months, [11, 12, 1, 2])
+
+    def test_user_autocomplete(self):
+        change_form = self.client.get(reverse('admin:investments_deposit_change', args=[Deposit.objects.first().pk]))
+        self.assertContains(change_form, 'admin-autocomplete')
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'investments', 'model_name': 'deposit', 'field_name': 'user', 'term': 'depo',
+        })
+        self.assertEqual([result['text'] for result in response.json()['results']], ['depositor'])
+
+
+class BulkReviewTests(TestCase):
+    """Bulk approval moves wallets and writes history in a fixed number of statements per chunk."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('bulk-admin', 'bulk-admin@example.com', 'pass-12345')
+        cls.first = User.objects.create_user('bulk-first', 'bulk-first@example.com', 'pass-12345')
+        cls.second = User.objects.create_user('bulk-second', 'bulk-second@example.com', 'pass-12345')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def deposits(self, *amounts, user=None):
+        return [
+            Deposit.objects.create(user=user or self.first, amount=amount, proof='deposits/proof.png')
+            for amount in amounts
+        ]
+
+    def review(self, name, ids, action='approve'):
+        response = self.client.post(reverse(name), {'ids': ids, 'action': action}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_approve_deposits(self):
+        first, second = self.deposits(20, 30)
+        other, = self.deposits(50, user=self.second)
+        done, = self.deposits(40)
+        Deposit.objects.filter(pk=done.pk).update(status='approved')
+        before = Wallet.objects.get(user=self.first).updated_at
+
+        body = self.review('bulk-review-deposits', [first.pk, second.pk, other.pk, done.pk, 999999])
+        self.assertEqual(body['counts'], {'approved': 3, 'not_pending': 1, 'not_found': 1})
+        self.assertEqual([row['outcome'] for row in body['results']], [
+            'approved', 'approved', 'approved', 'not_pending', 'not_found',
+        ])
+        wallet = Wallet.objects.get(user=self.first)
+        self.assertEqual(wallet.balance, Decimal('50.00'))
+        self.assertGreater(wallet.updated_at, before)
+        self.assertEqual(Wallet.objects.get(user=self.second).balance, Decimal('50.00'))
+        self.assertEqual(
+            list(TransactionHistory.objects.filter(user=self.first).order_by('balance_after')
+                 .values_list('reference', 'balance_before', 'balance_after')),
+            [(f'DEP-{first.pk}', Decimal('0.00'), Decimal('20.00')), (f'DEP-{second.pk}', Decimal('20.00'), Decimal('50.00'))],
+        )
+
+    def test_withdrawals_are_paid_oldest_first_while_funds_last(self):
+        Wallet.objects.filter(user=self.first).update(balance=Decimal('50.00'))
+        withdrawals = [
+            Withdrawal.objects.create(user=self.first, amount=amount, wallet_address='T' * 34) for amount in (30, 30, 20)
+        ]
+        body = self.review('bulk-review-withdrawals', [w.pk for w in withdrawals])
+        self.assertEqual([row['outcome'] for row in body['results']], ['approved', 'insufficient_funds', 'approved'])
+        wallet = Wallet.objects.get(user=self.first)
+        self.assertEqual((wallet.balance, wallet.total_withdrawn), (Decimal('0.00'), Decimal('50.00')))
+        self.assertEqual(Withdrawal.objects.get(pk=withdrawals[1].pk).status, 'pending')
+
+    def test_withdrawals_leave_funds_locked_in_investments(self):
+        Wallet.objects.filter(user=self.first).update(balance=Decimal('100.00'))
+        plan = InvestmentPlan.objects.order_by('id').first()
+        ends = timezone.now() + timedelta(days=plan.duration_days)
+        Investment.objects.create(user=self.first, plan=plan, amount=60, ends_at=ends)
+        Investment.objects.create(user=self.first, plan=plan, amount=500, is_completed=True, ends_at=ends)
+        withdrawals = [
+            Withdrawal.objects.create(user=self.first, amount=amount, wallet_address='T' * 34) for amount in (50, 40)
+        ]
+        body = self.review('bulk-review-withdrawals', [w.pk for w in withdrawals])
+        self.assertEqual([row['outcome'] for row in body['results']], ['insufficient_funds', 'approved'])
+        wallet = Wallet.objects.get(user=self.first)
+        self.assertEqual(wallet.balance, Decimal('60.00'))
+        self.assertEqual(wallet.get_available_balance(), Decimal('0.00'))
+
+    def test_reject_leaves_wallets_alone(self):
+        deposits = self.deposits(20, 30)
+        body = self.review('bulk-review-deposits', [d.pk for d in deposits], action='reject')
+        self.assertEqual(body['counts'], {'rejected': 2})
+        self.assertEqual(Wallet.objects.get(user=self.first).balance, 0)
+        self.assertFalse(TransactionHistory.objects.filter(user=self.first).exists())
+
+    @override_settings(BULK_REVIEW_CHUNK_SIZE=1000)
+    def test_statements_do_not_grow_with_rows(self):
+        def queries(count):
+            ids = [d.pk for d in self.deposits(*[10] * count)]
+            with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as captured:
+                bulk.review(Deposit, ids, bulk.APPROVE)
+            return len(captured)
+
+        self.assertEqual(queries(3), queries(60))
+
+    @override_settings(BULK_REVIEW_CHUNK_SIZE=2)
+    def test_chunks(self):
+        deposits = self.deposits(10, 10, 10, 10, 10)
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as captured:
+            results = bulk.review(Deposit, [d.pk for d in deposits], bulk.APPROVE)
+        self.assertEqual({outcome for _, outcome in results}, {'approved'})
+        self.assertEqual(Wallet.objects.get(user=self.first).balance, 50)
+        self.assertEqual(sum(query['sql'].startswith('SAVEPOINT') for query in captured), 3)
+
+    def test_admin_action(self):
+        deposits = self.deposits(20, 30)
+        client = self.client_class()
+        client.force_login(self.admin)
+        response = client.post(reverse('admin:investments_deposit_changelist'), {
+            'action': 'approve_selected', '_selected_action': [d.pk for d in deposits],
+        }, follow=True)
+        self.assertContains(response, '2 deposits approved')
+        self.assertEqual(Wallet.objects.get(user=self.first).balance, 50)
+
+    def test_admins_only(self):
+        deposit, = self.deposits(20)
+        self.client.force_authenticate(self.first)
+        response = self.client.post(reverse('bulk-review-deposits'), {'ids': [deposit.pk], 'action': 'approve'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class ReviewQueueTests(TestCase):
+    """Reviewers claim disjoint rows, claims expire, and leased rows are off limits to everyone else."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_superuser('queue-alice', 'queue-alice@example.com', 'pass-12345')
+        cls.bob = User.objects.create_superuser('queue-bob', 'queue-bob@example.com', 'pass-12345')
+        cls.user = User.objects.create_user('queued', 'queued@example.com', 'pass-12345')
+        cls.deposits = [
+            Deposit.objects.create(user=cls.user, amount=10 + i, proof='deposits/proof.png') for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def api(self, reviewer):
+        client = APIClient()
+        client.force_authenticate(reviewer)
+        return client
+
+    def claim(self, reviewer, count):
+        response = self.api(reviewer).post(reverse('review-queue', args=['deposits']), {'count': count}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_reviewers_claim_disjoint_rows_oldest_first(self):
+        ids = [d.pk for d in self.deposits]
+        for skip_locked in (False, True):
+            with self.subTest(skip_locked=skip_locked), mock.patch.object(
+                connections[DEFAULT_DB_ALIAS].features, 'has_select_for_update_skip_locked', skip_locked,
+            ):
+                Deposit.objects.update(claimed_by=None, claimed_until=None)
+                self.assertEqual(self.claim(self.alice, 2), ids[:2])
+                self.assertEqual(self.claim(self.bob, 2), ids[2:4])
+                self.assertEqual(self.claim(self.alice, 5), ids[4:])
+                self.assertEqual(self.claim(self.bob, 5), [])
+
+    def test_depth_and_age(self):
+        Deposit.objects.filter(pk=self.deposits[0].pk).update(created_at=timezone.now() - timedelta(hours=1))
+        self.claim(self.alice, 1)
+        stats = self.api(self.bob).get(reverse('review-queue', args=['withdrawals'])).json()
+        self.assertEqual(stats['pending'], 0)
+        stats = self.api(self.bob).get(reverse('review-queue', args=['deposits'])).json()
+        self.assertEqual((stats['pending'], stats['claimed'], stats['available']), (5, 1, 4))
+        self.assertGreaterEqual(stats['oldest_pending_age_seconds'], 3600)
+        self.assertLess(stats['oldest_available_age_seconds'], 3600)
+        self.assertEqual(self.api(self.bob).get(reverse('review-queue', args=['plans'])).status_code, 404)
+
+    def test_expired_and_released_claims_go_back_to_the_queue(self):
+        first, second = self.claim(self.alice, 2)
+        Deposit.objects.filter(pk=first).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.claim(self.bob, 1), [first])
+
+        response = self.api(self.bob).post(reverse('review-queue-release', args=['deposits']), {'ids': [second]}, format='json')
+        self.assertEqual(response.json(), {'released': 0})
+        response = self.api(self.alice).post(reverse('review-queue-release', args=['deposits']), {'ids': [second]}, format='json')
+        self.assertEqual(response.json(), {'released': 1})
+        self.assertEqual(self.claim(self.bob, 1), [second])
+
+    def test_claimed_rows_are_left_to_their_reviewer(self):
+        first, second = self.claim(self.alice, 2)
+        results = bulk.review(Deposit, [first, second], bulk.APPROVE, reviewer=self.bob)
+        self.assertEqual(results, [(first, bulk.CLAIMED_BY_OTHER), (second, bulk.CLAIMED_BY_OTHER)])
+        response = self.api(self.bob).patch(reverse('approve-deposit', args=[first]), {'status': 'rejected'})
+        self.assertEqual(response.status_code, 409)
+
+        results = bulk.review(Deposit, [first], bulk.REJECT, reviewer=self.alice)
+        self.assertEqual(results, [(first, bulk.REJECTED)])
+        self.assertEqual(Deposit.objects.filter(pk=first).values_list('claimed_by', 'claimed_until').get(), (None, None))
+
+    def test_single_deposit_review(self):
+        first, second = self.claim(self.alice, 2)
+        response = self.api(self.alice).patch(reverse('approve-deposit', args=[first]), {'status': 'approved'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), {'message': 'Deposit approved successfully.'})
+        self.assertEqual(Deposit.objects.get(pk=first).status, 'approved')
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, self.deposits[0].amount)
+        self.assertEqual(TransactionHistory.objects.get(user=self.user).reference, f'DEP-{first}')
+        response = self.api(self.alice).patch(reverse('approve-deposit', args=[first]), {'status': 'rejected'})
+        self.assertEqual(response.status_code, 409)
+        response = self.api(self.alice).patch(reverse('approve-deposit', args=[second]), {'status': 'rejected'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Deposit.objects.get(pk=second).status, 'rejected')
+
+
+class DepositProofTests(TestCase):
+    """Proofs are checked cheaply on upload, then stripped, re-encoded and thumbnailed after the commit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('prover', 'prover@example.com', 'pass-12345')
+        cls.admin = User.objects.create_superuser('proof-admin', 'proof-admin@example.com', 'pass-12345')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media, PROOF_WORKERS=0, PROOF_THUMBNAIL_SIDE=64))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def photo(self, size=(400, 300), **save):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 160, 40)).save(buffer, 'JPEG', **save)
+        return buffer.getvalue()
+
+    def upload(self, data, name='proof.jpg'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('create-deposit'), {'amount': '50.00', 'proof': SimpleUploadedFile(name, data)}, format='multipart',
+            )
+
+    def api_as(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_upload_is_stripped_rotated_and_thumbnailed(self):
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6  # taken rotated: display turned 90 degrees
+        exif[ExifTags.Base.Make] = 'PhoneMaker'
+        exif[ExifTags.IFD.GPSInfo] = {ExifTags.GPS.GPSLatitudeRef: 'N'}
+        response = self.upload(self.photo(exif=exif, comment=b'private'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['proof_state'], 'processing')
+
+        deposit = Deposit.objects.get(pk=response.json()['id'])
+        self.assertEqual(deposit.proof_state, 'ready')
+        with deposit.proof.open('rb') as fh, Image.open(fh) as proof:
+            self.assertEqual((proof.format, proof.size), ('JPEG', (300, 400)))
+            self.assertFalse(proof.getexif())
+            self.assertNotIn('comment', proof.info)
+        with deposit.proof_thumbnail.open('rb') as fh, Image.open(fh) as thumbnail:
+            self.assertEqual(thumbnail.size, (48, 64))
+        # The upload as sent is gone: only the re-encoded proof is kept.
+        self.assertCountEqual(
+            os.listdir(os.path.join(settings.MEDIA_ROOT, 'deposits')), ['thumbnails', os.path.basename(deposit.proof.name)],
+        )
+
+        listed = self.api_as(self.admin).get(reverse('list-deposits')).json()
+        listed = listed['results'] if isinstance(listed, dict) else listed
+        self.assertTrue(listed[0]['proof_thumbnail'].endswith(deposit.proof_thumbnail.name))
+
+    def test_non_images_are_refused_at_upload(self):
+        for name, data in (('proof.jpg', b'%PDF-1.7 not an image'), ('proof.gif', b'GIF89a' + bytes(64))):
+            with self.subTest(name=name):
+                response = self.upload(data, name)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('proof', response.json())
+        with override_settings(PROOF_MAX_BYTES=1024):
+            self.assertEqual(self.upload(self.photo(size=(800, 800), quality=100)).status_code, 400)
+        self.assertFalse(Deposit.objects.exists())
+
+    def test_broken_images_are_marked_invalid(self):
+        response = self.upload(self.photo()[:200])
+        self.assertEqual(response.status_code, 201)
+        deposit = Deposit.objects.get(pk=response.json()['id'])
+        self.assertEqual(deposit.proof_state, 'invalid')
+        self.assertFalse(deposit.proof_thumbnail)
+        self.assertTrue(deposit.proof.storage.exists(deposit.proof.name))
+
+    def test_admin_list_shows_thumbnails(self):
+        ready = Deposit.objects.get(pk=self.upload(self.photo()).json()['id'])
+        Deposit.objects.create(user=self.user, amount=60, proof='deposits/elsewhere.png')
+        self.client.force_login(self.admin)
+        page = self.client.get(reverse('admin:investments_deposit_changelist')).content.decode()
+        self.assertIn(f'<img src="{ready.proof_thumbnail.url}"', page)
+        self.assertIn('loading="lazy"', page)
+        self.assertIn('Processing', page)
+        self.assertNotIn(f'src="{ready.proof.url}"', page)
+
+    def test_command_processes_waiting_proofs_in_the_pool(self):
+        default_storage.save('deposits/waiting.png', ContentFile(self.photo()))
+        waiting = Deposit.objects.create(user=self.user, amount=60, proof='deposits/waiting.png')
+        out = io.StringIO()
+        with override_settings(PROOF_WORKERS=1):
+            call_command('process_deposit_proofs', stdout=out)
+        self.assertIn('1 ready, 0 invalid', out.getvalue())
+        waiting.refresh_from_db()
+        self.assertEqual((waiting.proof_state, waiting.proof.name), ('ready', f'deposits/{waiting.pk}-waiting.jpg'))
+        self.assertFalse(default_storage.exists('deposits/waiting.png'))
+
+
+class PayoutBatchTests(TestCase):
+    """Batches claim each withdrawal once, group it by network and stream the settlement file."""
+
+    ADDRESSES = ('T' + 'a' * 33, '0x' + 'b' * 40, 'bc1q' + 'c' * 38, 'tb1q' + 'd' * 38, 'T' + 'e' * 33)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('payout-admin', 'payout-admin@example.com', 'pass-12345')
+        cls.user = User.objects.create_user('payee', 'payee@example.com', 'pass-12345')
+        # bulk_create: saving an approved withdrawal runs the legacy post_save payout in transactions/models.py.
+        cls.approved = Withdrawal.objects.bulk_create([
+            Withdrawal(user=cls.user, amount=10 + i, wallet_address=address, status='approved')
+            for i, address in enumerate(cls.ADDRESSES)
+        ])
+        cls.pending, _ = Withdrawal.objects.bulk_create([
+            Withdrawal(user=cls.user, amount=50, wallet_address='T' * 34),
+            Withdrawal(user=cls.user, amount=60, wallet_address='T' * 34, status='rejected'),
+        ])
+        Wallet.objects.filter(user=cls.user).update(balance=Decimal('80.00'))
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_build_claims_approved_withdrawals_by_network(self):
+        batch = payouts.build()
+        self.assertEqual((batch.status, batch.withdrawal_count, batch.total_amount), ('ready', 5, Decimal('60.00')))
+        self.assertEqual(batch.totals, {
+            'BTC': {'count': 1, 'amount': '12.00'},
+            'ERC20': {'count': 1, 'amount': '11.00'},
+            # tb1q... is not T...: the prefixes are compared case-sensitively.
+            'OTHER': {'count': 1, 'amount': '13.00'},
+            'TRC20': {'count': 2, 'amount': '24.00'},
+        })
+        self.assertEqual(
+            set(Withdrawal.objects.filter(payout_batch=batch).values_list('pk', flat=True)), {w.pk for w in self.approved},
+        )
+        self.assertIsNone(Withdrawal.objects.get(pk=self.pending.pk).payout_batch_id)
+
+    def test_builders_never_share_a_withdrawal(self):
+        first = payouts.build(limit=2)
+        second = payouts.build(statuses=('pending', 'approved'))
+        self.assertEqual((first.withdrawal_count, second.withdrawal_count), (2, 4))
+        self.assertEqual(
+            list(Withdrawal.objects.filter(payout_batch=first).order_by('pk').values_list('pk', flat=True)),
+            [w.pk for w in self.approved[:2]],
+        )
+        self.assertIsNone(payouts.build())
+        self.assertEqual(PayoutBatch.objects.count(), 2)
+
+    def test_pending_withdrawals_are_paid_for_when_batched(self):
+        batch = payouts.build(statuses=('pending',))
+        withdrawal = Withdrawal.objects.get(pk=self.pending.pk)
+        self.assertEqual((withdrawal.payout_batch_id, withdrawal.status), (batch.pk, 'approved'))
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('30.00'))
+        self.assertEqual(
+            list(TransactionHistory.objects.filter(reference=f'WDR-{withdrawal.pk}').values_list('amount', 'balance_after')),
+            [(Decimal('50.00'), Decimal('30.00'))],
+        )
+        response = self.client.patch(reverse('approve-withdrawal', args=[withdrawal.pk]), {'status': 'rejected'})
+        self.assertEqual(response.status_code, 409)
+
+    def test_pending_withdrawals_the_wallet_cannot_cover_stay_out(self):
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('40.00'))
+        self.assertIsNone(payouts.build(statuses=('pending',)))
+        withdrawal = Withdrawal.objects.get(pk=self.pending.pk)
+        self.assertEqual((withdrawal.payout_batch_id, withdrawal.status), (None, 'pending'))
+        self.assertEqual(bulk.review(Withdrawal, [withdrawal.pk], bulk.REJECT), [(withdrawal.pk, 'rejected')])
+
+    def test_settlement_files(self):
+        response = self.client.post(reverse('payout-batches'), {}, format='json')
+        self.assertEqual(response.status_code, 201)
+        batch_id = response.json()['id']
+
+        response = self.client.get(reverse('payout-batch-file', args=[batch_id, 'csv']), HTTP_ACCEPT='text/csv')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="payout-batch-{batch_id}.csv"')
+        lines = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(tuple(lines[0]), payouts.COLUMNS)
+        self.assertEqual([line[0] for line in lines[1:]], ['TRC20', 'TRC20', 'ERC20', 'BTC', 'OTHER'])
+        for line in lines[1:]:
+            self.assertEqual(line[0], payouts.network_for(line[3]))
+
+        response = self.client.get(reverse('payout-batch-file', args=[batch_id, 'json']))
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(body['withdrawal_count'], 5)
+        self.assertEqual([row['withdrawal_id'] for row in body['withdrawals'][:2]], [self.approved[0].pk, self.approved[4].pk])
+        self.assertEqual(body['withdrawals'][0]['amount'], '10.00')
+
+        self.assertEqual(self.client.get(reverse('payout-batch-file', args=[batch_id, 'xml'])).status_code, 404)
+        self.assertEqual(
+            self.client.post(reverse('payout-batches'), {}, format='json').json(),
+            {'message': 'No withdrawals are waiting for a payout batch.'},
+        )
+
+    def test_admins_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post(reverse('payout-batches'), {}, format='json').status_code, 403)
+        self.assertFalse(PayoutBatch.objects.exists())
+
+
+class AsyncReadEndpointTests(TestCase):
+    """The async endpoints return exactly what their DRF counterparts do."""
+
+    PAIRS = (
+        ('investment-plans', 'investment-plans-async'),
+        ('active-investments', 'active-investments-async'),
+        ('wallet-overview', 'wallet-overview-async'),
+        ('transaction-history', 'transaction-history-async'),
+        ('wallet-detail', 'wallet-detail-async'),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('async', 'async@example.com', 'pass-12345')
+        plan = InvestmentPlan.objects.order_by('id').first()
+        UserInvestment.objects.create(user=cls.user, plan=plan, amount=150)
+        UserInvestment.objects.create(user=cls.user, plan=plan, amount=80, status='completed', expected_profit=12)
+        Withdrawal.objects.create(user=cls.user, amount=25, wallet_address='T' * 34)
+        TransactionHistory.objects.create(user=cls.user, transaction_type='deposit', amount=500,
+                                          reference='TXN-ASYNC-1')
+        TransactionHistory.objects.create(user=cls.user, transaction_type='profit', amount=12,
+                                          reference='TXN-ASYNC-2')
+        cls.auth = f'Bearer {AccessToken.for_user(cls.user)}'
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_same_response_as_sync(self):
+        for sync_name, async_name in self.PAIRS:
+            with self.subTest(view=async_name):
+                expected = await sync_to_async(self.client.get)(
+                    reverse(sync_name), headers={'Authorization': self.auth}
+                )
+                response = await self.async_client.get(reverse(async_name), headers={'Authorization': self.auth})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    async def test_history_filters(self):
+        url = reverse('transaction-history-async')
+        response = await self.async_client.get(url, {'type': 'deposit'}, headers={'Authorization': self.auth})
+        self.assertEqual([row['reference'] for row in json.loads(response.content)], ['TXN-ASYNC-1'])
+        response = await self.async_client.get(url, {'search': 'async-2'}, headers={'Authorization': self.auth})
+        self.assertEqual([row['reference'] for row in json.loads(response.content)], ['TXN-ASYNC-2'])
+
+    async def test_authentication_errors(self):
+        url = reverse('wallet-overview-async')
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(response.content), {'detail': 'Authentication credentials were not provided.'})
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+        response = await self.async_client.get(url, headers={'Authorization': 'Bearer not-a-token'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(response.content)['code'], 'token_not_valid')
+
+    async def test_overview_without_a_wallet_reads_zero(self):
+        await Wallet.objects.filter(user=self.user).adelete()
+        response = await self.async_client.get(reverse('wallet-overview-async'), headers={'Authorization': self.auth})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(str(json.loads(response.content)['balance'])), 0)
+        self.assertFalse(await Wallet.objects.filter(user=self.user).aexists())
+
+    async def test_read_only(self):
+        response = await self.async_client.post(reverse('investment-plans-async'))
+        self.assertEqual(response.status_code, 405)
+
+
+SHARDS = ['default', 'shard1']
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardingTests(TestCase):
+    """
+    Two shards: the test database and a second in-memory SQLite database,
+    created here rather than by the test runner, which would give it every
+    table. It joins ``databases`` once it exists.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        config = {**connections[DEFAULT_DB_ALIAS].settings_dict}
+        config['TEST'] = {**config['TEST'], 'NAME': None, 'MIRROR': None}
+        connections.settings['shard1'] = config
+        with override_settings(DATABASE_SHARDS=SHARDS):
+            connections['shard1'].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            drop_global_constraints('shard1')
+            reserve_id_range('shard1')
+        cls.databases = set(SHARDS)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['shard1'].creation.destroy_test_db('shard1', verbosity=0)
+        del connections['shard1']
+        del connections.settings['shard1']
+
+    @classmethod
+    def setUpTestData(cls):
+        first = User.objects.create_user('shard-a', 'shard-a@example.com', 'pass-12345')
+        second = User.objects.create_user('shard-b', 'shard-b@example.com', 'pass-12345')
+        cls.home, cls.away = sorted((first, second), key=shard_for_user)
+        cls.admin = User.objects.create_superuser('shard-admin', 'shard-admin@example.com', 'pass-12345')
+        cls.deposits = [
+            Deposit.objects.create(user=user, amount=10 + i, proof='deposits/proof.png')
+            for i, user in enumerate([cls.home, cls.away] * 3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rows_live_on_their_users_shard(self):
+        self.assertEqual((shard_for_user(self.home), shard_for_user(self.away)), ('default', 'shard1'))
+        self.assertTrue(Wallet.objects.using('shard1').filter(user=self.away).exists())
+        self.assertFalse(Wallet.objects.using('default').filter(user=self.away).exists())
+        self.assertEqual(Wallet.objects.get(user=self.away).pk // settings.SHARD_ID_SPAN, 1)
+        self.assertEqual(self.away.wallet._state.db, 'shard1')
+        self.assertEqual(self.away.deposits.count(), 3)
+
+    def test_global_tables_stay_on_default(self):
+        tables = connections['shard1'].introspection.table_names()
+        self.assertIn('investments_deposit', tables)
+        self.assertNotIn('accounts_user', tables)
+        self.assertNotIn('investments_investmentplan', tables)
+
+    def test_only_default_keeps_constraints_to_global_tables(self):
+        def foreign_keys(alias):
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, 'investments_deposit')
+            return {c['foreign_key'][0] for c in constraints.values() if c['foreign_key']}
+
+        self.assertIn('accounts_user', foreign_keys('default'))
+        self.assertEqual(foreign_keys('shard1'), set())
+
+    def test_user_endpoints_read_their_shard(self):
+        TransactionHistory.objects.create(user=self.away, transaction_type='deposit', amount=25)
+        client = APIClient()
+        client.force_authenticate(self.away)
+
+        history = client.get(reverse('transaction-history'))
+        self.assertEqual([row['username'] for row in history.json()], [self.away.username])
+        overview = client.get(reverse('wallet-overview'))
+        self.assertEqual(Decimal(str(overview.json()['last_transaction']['amount'])), 25)
+
+    def test_staff_async_history_gathers_shards(self):
+        for user in (self.home, self.away):
+            TransactionHistory.objects.create(user=user, transaction_type='deposit', amount=25)
+        token = AccessToken.for_user(self.admin)
+        response = self.client.get(reverse('transaction-history-async'), headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual({row['username'] for row in response.json()}, {self.home.username, self.away.username})
+
+    def test_staff_list_gathers_shards_in_order(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        ids = [row['id'] for row in client.get(reverse('list-deposits')).json()]
+        self.assertEqual(ids, [d.pk for d in reversed(self.deposits)])
+
+    def test_bulk_review_spans_shards(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post(
+            reverse('bulk-review-deposits'), {'ids': [d.pk for d in self.deposits], 'action': 'approve'}, format='json',
+        )
+        self.assertEqual(response.json()['counts'], {'approved': 6})
+        self.assertEqual(Wallet.objects.get(user=self.home).balance, 10 + 12 + 14)
+        self.assertEqual(Wallet.objects.get(user=self.away).balance, 11 + 13 + 15)
+        self.assertEqual(TransactionHistory.objects.using('shard1').filter(user=self.away).count(), 3)
+
+    def test_payout_batch_spans_shards(self):
+        withdrawals = [
+            Withdrawal.objects.bulk_create([Withdrawal(user=user, amount=20, wallet_address='T' * 34, status='approved')])[0]
+            for user in (self.home, self.away, self.home)
+        ]
+        batch = payouts.build()
+        self.assertEqual(batch.totals, {'TRC20': {'count': 3, 'amount': '60.00'}})
+        self.assertEqual(Withdrawal.objects.using('shard1').get(pk=withdrawals[1].pk).payout_batch_id, batch.pk)
+        self.assertEqual([row[1] for row in payouts.rows(batch)], [w.pk for w in withdrawals])
+
+    def test_staff_lookup_by_id_finds_the_shard(self):
+        withdrawal = Withdrawal.objects.create(user=self.away, amount=20, wallet_address='T' * 34)
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.patch(reverse('approve-withdrawal', args=[withdrawal.pk]), {'status': 'rejected'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Withdrawal.objects.using('shard1').get(pk=withdrawal.pk).status, 'rejected')
+
+    def test_admin_changelist_merges_pages(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:investments_deposit_changelist')
+        with mock.patch.object(DepositAdmin, 'list_per_page', 4):
+            first = self.client.get(url).context['cl']
+            second = self.client.get(url, {'p': 2}).context['cl']
+        newest_first = [d.pk for d in reversed(self.deposits)]
+        self.assertEqual(first.result_count, 6)
+        self.assertEqual([d.pk for d in first.result_list], newest_first[:4])
+        self.assertEqual([d.pk for d in second.result_list], newest_first[4:])
+
+        searched = self.client.get(url, {'q': self.away.username}).context['cl']
+        self.assertEqual({d.user_id for d in searched.result_list}, {self.away.pk})
+
+    def test_admin_change_view_finds_the_shard(self):
+        self.client.force_login(self.admin)
+        deposit = self.deposits[1]
+        response = self.client.get(reverse('admin:investments_deposit_change', args=[deposit.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['original'], deposit)
+
+    def test_deleting_a_user_deletes_their_shard_rows(self):
+        user_id = self.away.pk
+        self.away.delete()
+        self.assertFalse(Deposit.objects.using('shard1').filter(user_id=user_id).exists())
+        self.assertFalse(Wallet.objects.using('shard1').filter(user_id=user_id).exists())
@@ -19,9 +19,23 @@ from .views import (
     WithdrawalListView,
     ApproveWithdrawalView,
 
+    # ✅ Bulk Review Views
+    BulkReviewDepositsView,
+    BulkReviewWithdrawalsView,
+    ReviewQueueView,
+    ReviewQueueReleaseView,
+
+    # 🧾 Payout Batch Views
+    PayoutBatchListView,
+    PayoutBatchFileView,
+
     # 👛 Wallet View
     WalletView,
+
+    # 📊 Dashboard View
+    WalletOverviewView,
 )
+from . import async_views
 
 urlpatterns = [
     # ==========================
@@ -49,8 +63,34 @@ urlpatterns = [
     path('withdrawals/', WithdrawalListView.as_view(), name='list-withdrawals'),           # Admin: view all withdrawals
     path('approve-withdrawal/<int:pk>/', ApproveWithdrawalView.as_view(), name='approve-withdrawal'),  # Admin: approve/reject withdrawal
 
+    # ==========================
+    # ✅ BULK REVIEW ROUTES
+    # ==========================
+    path('deposits/bulk-review/', BulkReviewDepositsView.as_view(), name='bulk-review-deposits'),          # Admin: approve/reject many deposits
+    path('withdrawals/bulk-review/', BulkReviewWithdrawalsView.as_view(), name='bulk-review-withdrawals'), # Admin: approve/reject many withdrawals
+    path('review-queue/<str:kind>/', ReviewQueueView.as_view(), name='review-queue'),                     # Admin: queue depth/age, claim the next rows
+    path('review-queue/<str:kind>/release/', ReviewQueueReleaseView.as_view(), name='review-queue-release'),  # Admin: hand claimed rows back
+
+    # ==========================
+    # 🧾 PAYOUT BATCH ROUTES
+    # ==========================
+    path('payout-batches/', PayoutBatchListView.as_view(), name='payout-batches'),                  # Admin: list or build payout batches
+    path('payout-batches/<int:pk>/settlement.<str:kind>', PayoutBatchFileView.as_view(), name='payout-batch-file'),  # Admin: CSV/JSON settlement file
+
     # ==========================
     # 👛 WALLET ROUTE
     # ==========================
     path('wallet/', WalletView.as_view(), name='user-wallet'),                             # View user’s wallet balance
+
+    # ==========================
+    # 📊 DASHBOARD ROUTE
+    # ==========================
+    path('overview/', WalletOverviewView.as_view(), name='wallet-overview'),               # Dashboard overview summary
+
+    # ==========================
+    # ⚡ ASYNC READ ROUTES (ASGI)
+    # ==========================
+    path('async/plans/', async_views.investment_plans, name='investment-plans-async'),
+    path('async/active/', async_views.active_investments, name='active-investments-async'),
+    path('async/overview/', async_views.wallet_overview, name='wallet-overview-async'),
 ]
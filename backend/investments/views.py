@@ -1,10 +1,15 @@
+import logging
+
 from rest_framework import generics, status, permissions
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError
+from rest_framework.negotiation import BaseContentNegotiation
 from decimal import Decimal
 from django.db import models
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from transactions.models import TransactionHistory
 from .models import (
@@ -12,8 +17,14 @@ from .models import (
     UserInvestment,
     Deposit,
     Withdrawal,
+    PayoutBatch,
 )
 from wallets.models import Wallet  # ✅ Correct wallet import
+from wallets.cache import bump_generation_on_commit, cache_per_user
+from wallets.conditional import conditional_per_user, dashboard_state, queryset_state, wallet_state
+from legacy_prime_backend.db_router import ReplicaReadMixin, pin_user
+from legacy_prime_backend.sharding import ShardedViewMixin, each_shard
+from monitoring.logs import event
 
 from .serializers import (
     InvestmentPlanSerializer,
@@ -23,28 +34,45 @@ from .serializers import (
     WithdrawalSerializer,
     WalletSerializer,
     DepositApprovalSerializer,
-    WithdrawalApprovalSerializer
+    WithdrawalApprovalSerializer,
+    BulkReviewSerializer,
+    PayoutBatchSerializer,
+    PayoutBatchCreateSerializer,
+    ReviewQueueClaimSerializer,
+    ReviewQueueReleaseSerializer,
 )
+from . import bulk, payouts, proofs, review_queue
+
+logger = logging.getLogger(__name__)
 
 
 # ==========================
 # 📈 INVESTMENT VIEWS
 # ==========================
 
-class InvestmentPlanListView(generics.ListAPIView):
+class InvestmentPlanListView(ReplicaReadMixin, generics.ListAPIView):
     """List all available investment plans."""
     queryset = InvestmentPlan.objects.all()
     serializer_class = InvestmentPlanSerializer
     permission_classes = [permissions.AllowAny]
 
 
-class UserInvestmentListView(generics.ListAPIView):
+class UserInvestmentListView(ReplicaReadMixin, generics.ListAPIView):
     """List all investments by the authenticated user."""
     serializer_class = UserInvestmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return UserInvestment.objects.filter(user=self.request.user).order_by("-start_date")
+        return (
+            UserInvestment.objects.filter(user=self.request.user)
+            .select_related("plan")
+            .order_by("-start_date")
+        )
+
+    @conditional_per_user("my-investments", queryset_state("updated_at"))
+    @cache_per_user("my-investments")
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
 
 class StartInvestmentView(generics.CreateAPIView):
@@ -56,22 +84,22 @@ class StartInvestmentView(generics.CreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class UserInvestmentDetailView(generics.RetrieveAPIView):
+class UserInvestmentDetailView(ReplicaReadMixin, generics.RetrieveAPIView):
     """Get a single investment detail."""
     serializer_class = UserInvestmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return UserInvestment.objects.filter(user=self.request.user)
+        return UserInvestment.objects.filter(user=self.request.user).select_related("plan")
 
 
-class InvestmentProfitView(APIView):
+class InvestmentProfitView(ReplicaReadMixin, APIView):
     """View investment profit & status."""
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, pk):
         try:
-            investment = UserInvestment.objects.get(pk=pk, user=request.user)
+            investment = UserInvestment.objects.select_related("plan").get(pk=pk, user=request.user)
         except UserInvestment.DoesNotExist:
             return Response({"error": "Investment not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -79,13 +107,21 @@ class InvestmentProfitView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class ActiveInvestmentsView(generics.ListAPIView):
+class ActiveInvestmentsView(ReplicaReadMixin, generics.ListAPIView):
     """List active investments."""
     serializer_class = UserInvestmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return UserInvestment.objects.filter(user=self.request.user, status="active").order_by("-start_date")
+        return (
+            UserInvestment.objects.filter(user=self.request.user, status="active")
+            .select_related("plan")
+            .order_by("-start_date")
+        )
+
+    @cache_per_user("active-investments")
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
 
 class CompleteExpiredInvestmentsView(APIView):
@@ -94,8 +130,14 @@ class CompleteExpiredInvestmentsView(APIView):
 
     def post(self, request):
         now = timezone.now()
-        expired_investments = UserInvestment.objects.filter(end_date__lt=now, status="active")
-        count = expired_investments.update(status="completed")
+        count = 0
+        for expired_investments in each_shard(UserInvestment.objects.filter(end_date__lt=now, status="active")):
+            # update() sends no signals, so invalidate the owners' cached views here
+            user_ids = set(expired_investments.values_list("user_id", flat=True))
+            count += expired_investments.update(status="completed", updated_at=now)
+            for user_id in user_ids:
+                bump_generation_on_commit(user_id)
+                pin_user(user_id)
         return Response({"message": f"{count} investment(s) marked as completed."}, status=status.HTTP_200_OK)
 
 
@@ -109,35 +151,65 @@ class DepositCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user, status="pending")
+        deposit = serializer.save(user=self.request.user, status="pending")
+        # Checked, stripped and thumbnailed off the request (investments/proofs.py).
+        proofs.submit_on_commit(deposit)
 
 
-class DepositListView(generics.ListAPIView):
+class DepositListView(ShardedViewMixin, ReplicaReadMixin, generics.ListAPIView):
     """Admin: View all deposits."""
     queryset = Deposit.objects.all().order_by('-created_at')
     serializer_class = DepositSerializer
     permission_classes = [permissions.IsAdminUser]
 
 
-class ApproveDepositView(generics.UpdateAPIView):
-    """Admin approves or rejects a deposit."""
-    queryset = Deposit.objects.all()
-    serializer_class = DepositApprovalSerializer
-    permission_classes = [permissions.IsAdminUser]
+class ReviewOneMixin:
+    """
+    PATCH ``{"status": "approved"}`` or ``{"status": "rejected"}`` on one
+    pending row. It is reviewed as a bulk review of that row would be
+    (investments/bulk.py): locked, its wallet moved once, its history row
+    written, and refused while another reviewer holds it.
+    """
+    ACTIONS = {"approved": bulk.APPROVE, "rejected": bulk.REJECT}
+    REFUSALS = {
+        bulk.CLAIMED_BY_OTHER: ("Claimed by another reviewer.", status.HTTP_409_CONFLICT),
+        bulk.NOT_PENDING: ("Already reviewed.", status.HTTP_409_CONFLICT),
+        bulk.INSUFFICIENT_FUNDS: ("Insufficient wallet balance.", status.HTTP_400_BAD_REQUEST),
+    }
+
+    def refusal(self, instance):
+        """A response refusing to review ``instance`` before it is tried, or None."""
+        return None
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-
-        # 💵 Update wallet if approved
-        if instance.status == "approved":
-            wallet, _ = Wallet.objects.get_or_create(user=instance.user)
-            wallet.balance += instance.amount
-            wallet.save()
-
-        return Response({"message": f"Deposit {instance.status} successfully."}, status=status.HTTP_200_OK)
+        action = self.ACTIONS.get(serializer.validated_data.get("status"))
+        if action is None:
+            raise ValidationError({"status": "Invalid status option."})
+        refused = self.refusal(instance)
+        if refused is not None:
+            return refused
+
+        model = type(instance)
+        name = model._meta.model_name
+        [(_, outcome)] = bulk.review(model, [instance.pk], action, reviewer=request.user)
+        fields = {f'{name}_id': instance.pk, 'user_id': instance.user_id, 'amount': instance.amount,
+                  'reviewer_id': request.user.pk}
+        if outcome in self.REFUSALS:
+            event(logger, f'{name}.review_refused', logging.WARNING, outcome=outcome, **fields)
+            error, code = self.REFUSALS[outcome]
+            return Response({"error": error}, status=code)
+        event(logger, f'{name}.reviewed', status=outcome, **fields)
+        return Response({"message": f"{model.__name__} {outcome} successfully."}, status=status.HTTP_200_OK)
+
+
+class ApproveDepositView(ReviewOneMixin, ShardedViewMixin, generics.UpdateAPIView):
+    """Admin approves or rejects a deposit."""
+    queryset = Deposit.objects.all()
+    serializer_class = DepositApprovalSerializer
+    permission_classes = [permissions.IsAdminUser]
 
 
 # ==========================
@@ -154,52 +226,174 @@ class WithdrawalCreateView(generics.CreateAPIView):
         amount = serializer.validated_data.get("amount")
 
         if wallet.balance < amount:
+            event(logger, 'withdrawal.insufficient_funds', user_id=self.request.user.pk, amount=amount)
             raise ValidationError({"error": "Insufficient funds."})
 
-        serializer.save(user=self.request.user, status="pending")
+        withdrawal = serializer.save(user=self.request.user, status="pending")
+        event(logger, 'withdrawal.requested', withdrawal_id=withdrawal.pk, user_id=withdrawal.user_id, amount=amount)
 
 
-class WithdrawalListView(generics.ListAPIView):
+class WithdrawalListView(ShardedViewMixin, ReplicaReadMixin, generics.ListAPIView):
     """Admin: View all withdrawal requests."""
     queryset = Withdrawal.objects.all().order_by('-created_at')
     serializer_class = WithdrawalSerializer
     permission_classes = [permissions.IsAdminUser]
 
 
-class ApproveWithdrawalView(generics.UpdateAPIView):
+class ApproveWithdrawalView(ReviewOneMixin, ShardedViewMixin, generics.UpdateAPIView):
     """Admin approves or rejects a withdrawal."""
     queryset = Withdrawal.objects.all()
     serializer_class = WithdrawalApprovalSerializer
     permission_classes = [permissions.IsAdminUser]
 
-    def update(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance, data=request.data, partial=True)
+    def refusal(self, instance):
+        if instance.payout_batch_id is not None:
+            return Response({"error": "Already in a payout batch."}, status=status.HTTP_409_CONFLICT)
+        return None
+
+
+class BulkReviewView(APIView):
+    """Admin: approve or reject many pending rows of ``model`` in one request (see investments/bulk.py)."""
+    permission_classes = [permissions.IsAdminUser]
+    model = None
+
+    def post(self, request):
+        serializer = BulkReviewSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        results = bulk.review(
+            self.model, serializer.validated_data["ids"], serializer.validated_data["action"], reviewer=request.user,
+        )
+        counts = {}
+        for _, outcome in results:
+            counts[outcome] = counts.get(outcome, 0) + 1
+        return Response(
+            {"counts": counts, "results": [{"id": pk, "outcome": outcome} for pk, outcome in results]},
+            status=status.HTTP_200_OK,
+        )
+
+
+class BulkReviewDepositsView(BulkReviewView):
+    model = Deposit
+
 
-        # 💸 Update wallet if approved
-        if instance.status == "approved":
-            wallet, _ = Wallet.objects.get_or_create(user=instance.user)
-            if wallet.balance >= instance.amount:
-                wallet.balance -= instance.amount
-                wallet.save()
-            else:
-                return Response({"error": "Insufficient wallet balance."}, status=status.HTTP_400_BAD_REQUEST)
+class BulkReviewWithdrawalsView(BulkReviewView):
+    model = Withdrawal
 
-        return Response({"message": f"Withdrawal {instance.status} successfully."}, status=status.HTTP_200_OK)
+
+class ReviewQueueMixin:
+    """The review queue named by the URL's ``kind`` (see investments/review_queue.py)."""
+    permission_classes = [permissions.IsAdminUser]
+    QUEUES = {
+        "deposits": (Deposit, DepositSerializer),
+        "withdrawals": (Withdrawal, WithdrawalSerializer),
+    }
+
+    def queue(self, kind):
+        if kind not in self.QUEUES:
+            raise Http404
+        return self.QUEUES[kind]
+
+
+class ReviewQueueView(ReviewQueueMixin, APIView):
+    """Admin: GET the queue's depth and age; POST to claim its next ``count`` pending rows."""
+
+    def get(self, request, kind):
+        model, _ = self.queue(kind)
+        return Response(review_queue.stats(model), status=status.HTTP_200_OK)
+
+    def post(self, request, kind):
+        model, serializer_class = self.queue(kind)
+        options = ReviewQueueClaimSerializer(data=request.data)
+        options.is_valid(raise_exception=True)
+        rows, until = review_queue.claim(model, request.user, options.validated_data["count"])
+        return Response({
+            "claimed_until": until,
+            "results": serializer_class(rows, many=True, context={"request": request}).data,
+        }, status=status.HTTP_200_OK)
+
+
+class ReviewQueueReleaseView(ReviewQueueMixin, APIView):
+    """Admin: hand claimed rows back to the queue before their claim expires."""
+
+    def post(self, request, kind):
+        model, _ = self.queue(kind)
+        options = ReviewQueueReleaseSerializer(data=request.data)
+        options.is_valid(raise_exception=True)
+        released = review_queue.release(model, request.user, options.validated_data["ids"])
+        return Response({"released": released}, status=status.HTTP_200_OK)
+
+
+# ==========================
+# 🧾 PAYOUT BATCH VIEWS
+# ==========================
+
+class PayoutBatchListView(generics.ListAPIView):
+    """Admin: list payout batches, or build one from the unbatched withdrawals (see investments/payouts.py)."""
+    queryset = PayoutBatch.objects.all()
+    serializer_class = PayoutBatchSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        options = PayoutBatchCreateSerializer(data=request.data)
+        options.is_valid(raise_exception=True)
+        batch = payouts.build(
+            options.validated_data.get("max_items"), sorted(options.validated_data["statuses"]), created_by=request.user,
+        )
+        if batch is None:
+            return Response({"message": "No withdrawals are waiting for a payout batch."}, status=status.HTTP_200_OK)
+        return Response(PayoutBatchSerializer(batch).data, status=status.HTTP_201_CREATED)
+
+
+class StreamedFileNegotiation(BaseContentNegotiation):
+    """The file's type comes from the URL; errors still render as JSON, whatever the client accepts."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class PayoutBatchFileView(APIView):
+    """Admin: stream a payout batch's settlement file, as CSV or JSON."""
+    permission_classes = [permissions.IsAdminUser]
+    content_negotiation_class = StreamedFileNegotiation
+    FORMATS = {
+        "csv": (payouts.csv_lines, "text/csv"),
+        "json": (payouts.json_chunks, "application/json"),
+    }
+
+    def get(self, request, pk, kind):
+        if kind not in self.FORMATS:
+            raise Http404
+        batch = get_object_or_404(PayoutBatch, pk=pk)
+        generate, content_type = self.FORMATS[kind]
+        response = StreamingHttpResponse(generate(batch), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="payout-batch-{batch.pk}.{kind}"'
+        return response
 
 
 # ==========================
 # 👛 WALLET VIEWS
 # ==========================
 
-class WalletView(APIView):
+def read_wallet(user):
+    """
+    The user's wallet, read where the view reads (a replica, for the
+    dashboard). Only a user without one goes through get_or_create(), which
+    writes, and so pins them to the primary.
+    """
+    wallet = Wallet.objects.filter(user=user).first()
+    if wallet is None:
+        wallet, _ = Wallet.objects.get_or_create(user=user)
+    return wallet
+
+
+class WalletView(ReplicaReadMixin, APIView):
     """Get current wallet balance."""
     permission_classes = [IsAuthenticated]
 
+    @conditional_per_user("wallet", wallet_state)
+    @cache_per_user("wallet")
     def get(self, request):
-        wallet, _ = Wallet.objects.get_or_create(user=request.user)
+        wallet = read_wallet(request.user)
         serializer = WalletSerializer(wallet)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -208,13 +402,15 @@ class WalletView(APIView):
 # 📊 DASHBOARD OVERVIEW VIEW
 # ==========================
 
-class WalletOverviewView(APIView):
+class WalletOverviewView(ReplicaReadMixin, APIView):
     """Provides full dashboard summary for Overview tab."""
     permission_classes = [IsAuthenticated]
 
+    @conditional_per_user("overview", dashboard_state)
+    @cache_per_user("overview")
     def get(self, request):
         user = request.user
-        wallet, _ = Wallet.objects.get_or_create(user=user)
+        wallet = read_wallet(user)
 
         total_deposits = (
             Deposit.objects.filter(user=user, status="approved")
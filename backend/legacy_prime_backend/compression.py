@@ -0,0 +1,52 @@
+"""
+Negotiated response compression.
+
+``CompressionMiddleware`` gzips a response when the client's
+``Accept-Encoding`` q-values allow it (``gzip;q=0`` refuses it, ``*``
+accepts it). Bodies smaller than ``COMPRESSION_MIN_SIZE`` bytes are sent as
+they are, since compressing them costs more than it saves. Gzip is Django's
+``GZipMiddleware``, including its random padding against BREACH.
+"""
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+
+def accepted_codings(header):
+    """``Accept-Encoding`` as {coding: q}."""
+    codings = {}
+    for part in header.split(','):
+        coding, *params = part.split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def negotiate(header):
+    """The coding to send for an ``Accept-Encoding`` header, or None."""
+    codings = accepted_codings(header)
+    return 'gzip' if codings.get('gzip', codings.get('*', 0.0)) > 0 else None
+
+
+class CompressionMiddleware(GZipMiddleware):
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if negotiate(request.META.get('HTTP_ACCEPT_ENCODING', '')) != 'gzip':
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,131 @@
+"""
+Read-replica routing.
+
+Only views that opt in with ``ReplicaReadMixin`` read from a replica, and
+only for safe methods. Everything else stays on the primary, including:
+
+* any write, and reads made for a write (``select_for_update()``,
+  ``get_or_create()``), which Django routes through ``db_for_write``;
+* any read inside ``transaction.atomic()`` on the primary;
+* any read of a user who wrote, or whose rows were written, in the last
+  ``REPLICA_STICKY_SECONDS`` (read-your-writes while replicas catch up).
+
+Replica aliases are listed in ``settings.DATABASE_REPLICAS``; with none,
+the router is a no-op.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_KEY = 'replica-pin:%s'
+
+_routing = ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_user(user_id):
+    """Keep ``user_id``'s reads on the primary for the sticky window."""
+    if user_id is not None and replicas():
+        cache.set(PIN_KEY % user_id, 1, getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+
+def is_pinned(user_id):
+    return cache.get(PIN_KEY % user_id) is not None
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        state = _routing.get()
+        if state is None or state.replica is None:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary; never migrate them directly.
+        return db not in replicas()
+
+
+class ReplicaReadMixin:
+    """For read-only DRF views: serve safe requests from a replica."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = _routing.get()
+        available = replicas()
+        if state is None or not available or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return
+        if request.user.is_authenticated and is_pinned(request.user.pk):
+            return
+        state.replica = random.choice(available)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Holds the routing state for one request and, if the request wrote
+    anything, pins the requesting user to the primary afterwards.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _routing.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            _routing.reset(token)
+            self.finish(request, state)
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = _routing.set(state)
+        try:
+            return await self.get_response(request)
+        finally:
+            _routing.reset(token)
+            self.finish(request, state)
+
+    def finish(self, request, state):
+        # DRF copies the authenticated (JWT) user onto the Django request.
+        user = getattr(request, 'user', None)
+        if state.wrote and user is not None and user.is_authenticated:
+            pin_user(user.pk)
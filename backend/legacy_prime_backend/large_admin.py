@@ -0,0 +1,222 @@
+"""
+Admin change lists for tables with millions of rows.
+
+``LargeTableAdminMixin`` avoids the two queries that read a whole table on
+every change list page:
+
+* The count. On PostgreSQL, ``EstimatedCountPaginator`` counts at most
+  ``ADMIN_EXACT_COUNT_LIMIT`` rows, exactly, and past that limit uses the
+  planner's row estimate (``EXPLAIN``). Other databases have no estimate
+  and count every row: ``Paginator`` refuses pages past its count, so a
+  made-up total would leave the older rows unreachable. The unfiltered
+  total next to the search box is never counted
+  (``show_full_result_count = False``).
+* The date drill-down. ``date_hierarchy`` finds the years, months or days
+  that have rows with a ``SELECT DISTINCT`` over the truncated column,
+  which reads every row. Here the first and last value are read with two
+  ordered ``LIMIT 1`` queries. Then each period between them is probed
+  with an ``EXISTS`` on a range of the column. The models index
+  ``(created_at, id)``: the admins list newest first, tie-broken on
+  ``id``, and drill down by ``created_at``. So each query is one index
+  seek, and the cost follows the number of periods rather than the
+  number of rows.
+
+Big foreign keys (``user``) go in ``autocomplete_fields``. The change form
+then searches users through accounts/admin.py instead of rendering every
+user in a ``<select>``.
+"""
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.admin.utils import build_q_object_from_lookup_parameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .sharding import each_shard
+
+# More periods than this between the first and last date (a day-level
+# drill-down over years of data) falls back to the DISTINCT query.
+MAX_DATE_PROBES = 400
+
+
+def exact_count_limit():
+    return getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000)
+
+
+def planner_estimate(queryset):
+    """The planner's row estimate for ``queryset`` on PostgreSQL, None elsewhere."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimate_count(queryset):
+    """Exact up to ``ADMIN_EXACT_COUNT_LIMIT`` rows, then the planner's estimate; exact throughout off PostgreSQL."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.order_by().count()
+    limit = exact_count_limit()
+    count = queryset.order_by()[:limit + 1].count()
+    if count <= limit:
+        return count
+    return max(planner_estimate(queryset), count)
+
+
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        return sum(estimate_count(part) for part in each_shard(self.object_list))
+
+
+def _local(value):
+    return timezone.localtime(value).replace(tzinfo=None) if timezone.is_aware(value) else value
+
+
+def _aware(value):
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def periods(first, last, kind):
+    """(start, end) of each ``kind`` period from the one holding ``first`` to the one holding ``last``."""
+    start = first.replace(hour=0, minute=0, second=0, microsecond=0)
+    if kind in ('year', 'month'):
+        start = start.replace(day=1)
+    if kind == 'year':
+        start = start.replace(month=1)
+    while start <= last:
+        if kind == 'year':
+            end = start.replace(year=start.year + 1)
+        elif kind == 'month':
+            end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+        else:
+            end = start + timedelta(days=1)
+        yield start, end
+        start = end
+
+
+class IndexedDatesQuerySetMixin:
+    """``datetimes()`` by probing each period in range instead of a DISTINCT over every row."""
+
+    # Where each period is looked for (see LargeTableChangeList); this queryset when unset.
+    _probe_base = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._probe_base = self._probe_base
+        return clone
+
+    def probing(self, queryset):
+        """A copy of this queryset whose ``datetimes()`` probes ``queryset`` for each period."""
+        clone = self.all()
+        clone._probe_base = queryset
+        return clone
+
+    def aggregate(self, *args, **kwargs):
+        # The date_hierarchy tag asks for aggregate(first=Min(f), last=Max(f)).
+        # SQLite only reads an index for a lone MIN() or MAX(), so answer with
+        # two ordered LIMIT 1 queries, which seek the index everywhere.
+        first, last = kwargs.get('first'), kwargs.get('last')
+        if not args and len(kwargs) == 2 and isinstance(first, Min) and isinstance(last, Max):
+            field_name = getattr(first.get_source_expressions()[0], 'name', None)
+            if field_name and first == Min(field_name) and last == Max(field_name):
+                return self.bounds(field_name)
+        return super().aggregate(*args, **kwargs)
+
+    def bounds(self, field_name):
+        """The first and last value of ``field_name`` over every shard, remembered for datetimes()."""
+        known = self.__dict__.setdefault('_bounds', {})
+        if field_name not in known:
+            firsts, lasts = [], []
+            for part in each_shard(self.filter(**{f'{field_name}__isnull': False}).values_list(field_name, flat=True)):
+                firsts.extend(part.order_by(field_name)[:1])
+                lasts.extend(part.order_by(f'-{field_name}')[:1])
+            known[field_name] = {'first': min(firsts, default=None), 'last': max(lasts, default=None)}
+        return known[field_name]
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day') or tzinfo is not None:
+            return super().datetimes(field_name, kind, order, tzinfo)
+        bounds = self.bounds(field_name)
+        if bounds['first'] is None:
+            return []
+        candidates = list(periods(_local(bounds['first']), _local(bounds['last']), kind))
+        if len(candidates) > MAX_DATE_PROBES:
+            return super().datetimes(field_name, kind, order, tzinfo)
+
+        parts = each_shard((self if self._probe_base is None else self._probe_base).order_by())
+        found = []
+        for start, end in candidates:
+            lookups = {f'{field_name}__gte': _aware(start), f'{field_name}__lt': _aware(end)}
+            if any(part.filter(**lookups).exists() for part in parts):
+                found.append(_aware(start))
+        return found if order == 'ASC' else found[::-1]
+
+
+_indexed_managers = {}
+
+
+def indexed_dates_manager(model):
+    """``model``'s default manager, returning querysets whose ``datetimes()`` probes the index."""
+    manager = model._default_manager
+    cls = _indexed_managers.get(type(manager))
+    if cls is None:
+        base = type(manager.get_queryset())
+        queryset_class = type(f'IndexedDates{base.__name__}', (IndexedDatesQuerySetMixin, base), {})
+        cls = _indexed_managers[type(manager)] = type(manager).from_queryset(queryset_class)
+    indexed = cls()
+    indexed.model = model
+    return indexed
+
+
+class LargeTableChangeList(ChangeList):
+    """
+    Lists the drill-down's period like ChangeList, but probes the periods
+    inside it without its range. SQLite seeks the index from the first range
+    it finds on the column: with created_at__year=... in the query, every
+    probe would walk from the start of that year to its own period.
+    """
+    drill_down = None
+
+    def get_filters(self, request):
+        filter_specs, has_filters, lookup_params, may_have_duplicates, has_active_filters = super().get_filters(request)
+        self.drill_down = None
+        if self.date_hierarchy and f'{self.date_hierarchy}__year' in self.get_filters_params():
+            # The __gte/__lt range ChangeList turned the year/month/day into.
+            self.drill_down = {
+                key: lookup_params.pop(key) for key in (f'{self.date_hierarchy}__gte', f'{self.date_hierarchy}__lt')
+            }
+        return filter_specs, has_filters, lookup_params, may_have_duplicates, has_active_filters
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        if not self.drill_down:
+            return queryset
+        return queryset.filter(build_q_object_from_lookup_parameters(self.drill_down)).probing(queryset)
+
+
+class LargeTableAdminMixin:
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # ModelAdmin.get_queryset(), from a manager whose querysets probe the date index.
+        queryset = indexed_dates_manager(self.model).get_queryset()
+        ordering = self.get_ordering(request)
+        return queryset.order_by(*ordering) if ordering else queryset
+
+    def get_changelist(self, request, **kwargs):
+        return LargeTableChangeList
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page)
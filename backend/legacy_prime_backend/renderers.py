@@ -0,0 +1,52 @@
+"""
+A faster drop-in for DRF's ``JSONRenderer``.
+
+With orjson installed the payload is encoded in C and produces the same JSON
+as the stdlib renderer: UTC datetimes end in ``Z``, Decimals that did not
+pass through a serializer field become numbers, and lazy strings, querysets,
+timedeltas and the like go through DRF's own ``JSONEncoder.default``. Input
+orjson refuses (integers wider than 64 bits, timezone-aware times) and
+requests for indented or ASCII-only output are handed to the stdlib
+renderer. One difference remains: NaN and infinities become ``null``
+instead of raising under ``STRICT_JSON``.
+"""
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib renderer
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    # Decimals are the common case (aggregates, computed balances).
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson.JSONEncodeError: let the stdlib renderer encode it, or raise its own error.
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Keep the output a strict JavaScript subset, as JSONRenderer does.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
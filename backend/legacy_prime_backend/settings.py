@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -16,11 +17,19 @@ DEBUG = True
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1']
 
+# Lean startup for serverless cold starts (LEGACY_PRIME_LEAN_STARTUP=1).
+# The admin discovers its modules and builds its URLs on the first /admin/
+# request rather than at boot, /api-auth/ is mounted the same way, and
+# the API renders JSON only (no browsable API). Measure with
+# `python manage.py startup_profile` and `python -m benchmarks.cold_start`.
+LEAN_STARTUP = os.environ.get('LEGACY_PRIME_LEAN_STARTUP') == '1'
+
 
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # Lean startup skips autodiscovery here; urls.py runs it on first use
+    'django.contrib.admin.apps.SimpleAdminConfig' if LEAN_STARTUP else 'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -39,15 +48,28 @@ INSTALLED_APPS = [
     'investments',
     'transactions',
     'wallets',
+    'monitoring',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    "monitoring.middleware.MetricsMiddleware",
+    # Tags log records with the request's X-Request-ID (see LOGGING below)
+    "monitoring.logs.CorrelationIdMiddleware",
+    # Inert unless NPLUSONE_DETECT is on (see below)
+    "monitoring.nplusone.NPlusOneMiddleware",
+    # Before anything that edits the body, so it compresses the final response
+    "legacy_prime_backend.compression.CompressionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Inert unless PROFILING_ENABLED is on (see below)
+    'monitoring.profiling.ProfilingMiddleware',
+    # Per-request replica routing state (see DATABASE_REPLICAS below)
+    'legacy_prime_backend.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -86,14 +108,86 @@ WSGI_APPLICATION = 'legacy_prime_backend.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# https://docs.djangoproject.com/en/5.2/ref/databases/#sqlite-notes
+#
+# SQLite tuned for several concurrent workers (SQLITE_TUNING):
+# - WAL lets readers run alongside the single writer, and synchronous=NORMAL
+#   is durable across application crashes in WAL mode (only an OS crash can
+#   lose the last commits). WAL is a property of the database file: the
+#   first tuned connection switches db.sqlite3 over, for good.
+# - mmap_size / cache_size (negative = KiB) keep hot pages in memory.
+# - BEGIN IMMEDIATE takes the write lock when a transaction starts, so two
+#   read-then-write transactions (approvals) queue on the busy timeout
+#   instead of deadlocking with "database is locked".
+# - 'timeout' is the busy timeout in seconds.
+# - Connections persist across requests and are health-checked on reuse.
+# It applies to the server and to every management command. Set
+# LEGACY_PRIME_SQLITE_TUNING=0 to run on SQLite's defaults; the test runner
+# (TEST_RUNNER below) always does, so the suite runs with stock locking and
+# no pragmas.
+# Compare the two with `python -m benchmarks.sqlite_contention`.
+SQLITE_TUNING = {
+    'OPTIONS': {
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA mmap_size=134217728;'
+            'PRAGMA cache_size=-32000;'
+            'PRAGMA temp_store=MEMORY;'
+        ),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    },
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+}
+SQLITE_TUNED = os.environ.get('LEGACY_PRIME_SQLITE_TUNING', '1') == '1'
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **(SQLITE_TUNING if SQLITE_TUNED else {}),
     }
 }
 
+TEST_RUNNER = 'legacy_prime_backend.test_runner.TestRunner'
+
+# Read replicas (legacy_prime_backend/db_router.py). Read-only API views
+# read from one of DATABASE_REPLICAS; writes, transactions and users who
+# wrote in the last REPLICA_STICKY_SECONDS stay on the primary. To try it
+# locally with two SQLite files, add
+#
+#     DATABASES['replica'] = {
+#         **DATABASES['default'],
+#         'NAME': BASE_DIR / 'db-replica.sqlite3',
+#         'TEST': {'MIRROR': 'default'},
+#     }
+#     DATABASE_REPLICAS = ['replica']
+#
+# and refresh the copy with `python manage.py sync_replicas`.
+DATABASE_REPLICAS = []
+REPLICA_STICKY_SECONDS = 5
+
+# User shards (legacy_prime_backend/sharding.py). Wallets, investments,
+# deposits, withdrawals and transaction history are spread over
+# DATABASE_SHARDS by user id; users, plans and Django's tables stay on
+# 'default', which must be listed first. To try it with SQLite files, add
+#
+#     DATABASES['shard1'] = {**DATABASES['default'], 'NAME': BASE_DIR / 'db-shard1.sqlite3'}
+#     DATABASE_SHARDS = ['default', 'shard1']
+#
+# and run `python manage.py init_shards`. Shard n's ids start at
+# n * SHARD_ID_SPAN. Changing the shard list moves users between shards,
+# so existing rows would have to be migrated.
+DATABASE_SHARDS = []
+SHARD_ID_SPAN = 10 ** 12
+
+DATABASE_ROUTERS = [
+    'legacy_prime_backend.sharding.ShardRouter',
+    'legacy_prime_backend.db_router.ReplicaRouter',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -131,6 +225,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (deposit proofs). Served by Django only with DEBUG on.
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -159,14 +257,32 @@ else:
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # JWTAuthentication with a cached user snapshot (see accounts/authentication.py)
+        "accounts.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",           # optional, for testing
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",   # requires login by default
     ),
+    # orjson-backed JSONRenderer (legacy_prime_backend/renderers.py); the
+    # browsable API only in development
+    "DEFAULT_RENDERER_CLASSES": (
+        "legacy_prime_backend.renderers.FastJSONRenderer",
+        *(("rest_framework.renderers.BrowsableAPIRenderer",) if DEBUG else ()),
+    ),
+    # Sliding-window limits for the public auth/OTP endpoints (accounts/throttling.py)
+    "DEFAULT_THROTTLE_RATES": {
+        "login_ip": "30/min",
+        "login_email": "10/min",
+        "register_ip": "20/hour",
+        "register_email": "5/hour",
+        "otp_ip": "20/hour",
+        "otp_email": "5/hour",
+    },
 }
+if LEAN_STARTUP:
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] = ("legacy_prime_backend.renderers.FastJSONRenderer",)
 
 
 SIMPLE_JWT = {
@@ -181,4 +297,136 @@ SIMPLE_JWT = {
     "AUTH_COOKIE_SAMESITE": "Lax",
     # Allow unverified users to obtain tokens (we'll check verification in views)
     "USER_AUTHENTICATION_RULE": "rest_framework_simplejwt.authentication.default_user_authentication_rule",
+    # Checks the blacklist through an in-process Bloom filter (accounts/tokens.py)
+    "TOKEN_REFRESH_SERIALIZER": "accounts.serializers.CachedRevocationTokenRefreshSerializer",
+}
+
+# Metrics (served at /metrics in Prometheus text format)
+# Set METRICS_MULTIPROCESS_DIR to a shared writable directory when running
+# several worker processes (gunicorn/uvicorn workers) so /metrics can merge
+# every worker's numbers. Scrapers send `Authorization: Bearer
+# <METRICS_TOKEN>` (LEGACY_PRIME_METRICS_TOKEN); staff sessions need no
+# token. With no token set, /metrics answers 403 to everyone else unless
+# DEBUG is on.
+METRICS_MULTIPROCESS_DIR = None
+METRICS_FLUSH_SECONDS = 5
+METRICS_TOKEN = os.environ.get('LEGACY_PRIME_METRICS_TOKEN') or None
+
+# Structured logging (monitoring/logs.py). The application loggers write
+# JSON lines to LOG_FILE, or stderr when unset, through a queue drained by a
+# background thread, so logging never blocks a request. Each line carries
+# the request's correlation id (X-Request-ID); secret-named fields are
+# redacted and e-mail addresses masked. LOG_SAMPLE_RATES keeps that share
+# of an event's INFO records; warnings and errors are always written.
+# The test runner (legacy_prime_backend/test_runner.py) discards them.
+LOG_LEVEL = os.environ.get('LEGACY_PRIME_LOG_LEVEL', 'INFO')
+LOG_FILE = os.environ.get('LEGACY_PRIME_LOG_FILE') or None
+LOG_QUEUE_SIZE = 10000
+LOG_SAMPLE_RATES = {
+    'auth.login.succeeded': 0.1,
 }
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'structured': {
+            '()': 'monitoring.logs.QueueHandler',
+            'filename': LOG_FILE,
+            'queue_size': LOG_QUEUE_SIZE,
+        },
+    },
+    'loggers': {
+        app: {'handlers': ['structured'], 'level': LOG_LEVEL, 'propagate': False}
+        for app in ('accounts', 'investments', 'wallets', 'transactions', 'monitoring', 'legacy_prime_backend')
+    },
+}
+
+# Slow query log (monitoring/slow_queries.py). Statements taking
+# SLOW_QUERY_THRESHOLD_MS or longer are appended to SLOW_QUERY_LOG with
+# their fingerprint, parameter types, the view or command that ran them
+# and their EXPLAIN plan; `python manage.py slow_queries` ranks them. The
+# log rolls over at SLOW_QUERY_LOG_MAX_BYTES. None turns the log off.
+SLOW_QUERY_THRESHOLD_MS = 200
+SLOW_QUERY_LOG = BASE_DIR / 'slow_queries.jsonl'
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 2 ** 20
+
+# On-demand request profiling (monitoring/profiling.py). When enabled, staff
+# requests sending `X-Profile: 1` and a PROFILING_SAMPLE_RATE share of all
+# requests are profiled with cProfile, with their SQL timeline and signal
+# time. The newest PROFILING_MAX_CAPTURES captures are kept in PROFILING_DIR
+# and listed for staff at /monitoring/profiles/. Off, it costs nothing.
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_CAPTURES = 50
+
+# Admin change lists on the large tables (legacy_prime_backend/large_admin.py)
+# count at most this many rows exactly on PostgreSQL; past it they show the
+# planner's estimate. Other databases always count exactly.
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Bulk deposit/withdrawal review (investments/bulk.py) locks and writes this
+# many rows per transaction.
+BULK_REVIEW_CHUNK_SIZE = 500
+
+# Review queue claims (investments/review_queue.py) expire after this many
+# seconds, handing the rows back to the other reviewers.
+REVIEW_CLAIM_SECONDS = 300
+
+# Payout batches (investments/payouts.py) claim at most this many
+# withdrawals each.
+PAYOUT_BATCH_MAX_ITEMS = 50000
+
+# Deposit proofs (investments/proofs.py) are checked, stripped of their
+# metadata, re-encoded at most PROOF_MAX_SIDE pixels a side and thumbnailed
+# by PROOF_WORKERS processes after the upload returns (0: inline, on commit).
+PROOF_MAX_BYTES = 10 * 1024 * 1024
+PROOF_MAX_PIXELS = 40_000_000
+PROOF_MAX_SIDE = 2048
+PROOF_THUMBNAIL_SIDE = 320
+PROOF_WORKERS = 2
+
+# Response compression (legacy_prime_backend/compression.py): gzip when the
+# client accepts it. Responses under COMPRESSION_MIN_SIZE bytes are not
+# worth compressing.
+COMPRESSION_MIN_SIZE = 1024
+
+# N+1 query detection (monitoring/nplusone.py). Turn NPLUSONE_DETECT on in
+# development to log any SQL fingerprint repeated NPLUSONE_THRESHOLD or more
+# times in one request, with the line of code that issued it. NPLUSONE_RAISE
+# makes the request fail instead.
+NPLUSONE_DETECT = False
+NPLUSONE_THRESHOLD = 5
+NPLUSONE_RAISE = False
+
+# How often (seconds) each worker pulls newly blacklisted tokens into its
+# revocation filter, and how often it rebuilds the filter from scratch.
+# Tokens are pruned with `python manage.py prune_tokens`.
+TOKEN_REVOCATION_REFRESH_SECONDS = 5
+TOKEN_REVOCATION_REBUILD_SECONDS = 3600
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Per-process memory cache by default. Point this at a shared backend
+# (Redis, Memcached, database) when running more than one worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'legacy-prime',
+    }
+}
+
+# Seconds a user snapshot stays cached for JWT authentication. Entries are
+# also dropped as soon as the user row is saved, but only in the cache of
+# the process that saved it: with a process-local cache (LocMemCache) the
+# other workers keep a deactivated or demoted user's snapshot until it
+# expires, so there it is kept at most AUTH_USER_CACHE_LOCAL_TIMEOUT seconds.
+# Use a shared cache (Redis, Memcached) to get the longer timeout.
+AUTH_USER_CACHE_TIMEOUT = 300
+AUTH_USER_CACHE_LOCAL_TIMEOUT = 5
+
+# Seconds the wallet/investment/overview GET responses stay cached per user
+# (wallets/cache.py). Writes invalidate them immediately by moving the user
+# to a new cache generation; set to 0 to disable the cache.
+USER_RESPONSE_CACHE_TIMEOUT = 300
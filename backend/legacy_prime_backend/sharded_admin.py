@@ -0,0 +1,90 @@
+"""
+Admin for sharded models (see legacy_prime_backend/sharding.py).
+
+Change lists scatter-gather: the count is summed over the shards (each
+estimated as in large_admin.py) and each page is merged from the first
+rows of every shard in the list's ordering.
+Change and delete views find the object with ``locate()``. Searches on
+related global fields (``user__username``) are resolved on ``default``
+first, since the shards cannot join to those tables.
+"""
+from collections import defaultdict
+
+from django.db.models import Q
+from django.utils.text import smart_split, unescape_string_literal
+
+from .large_admin import EstimatedCountPaginator, LargeTableAdminMixin, LargeTableChangeList
+from .sharding import gather, is_sharded, locate, shards
+
+_SEARCH_PREFIXES = {'^': 'istartswith', '=': 'iexact', '@': 'search'}
+
+
+class ShardedPaginator(EstimatedCountPaginator):
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        return self._get_page(gather(self.object_list, top)[bottom:top], number, self)
+
+
+class ShardedChangeList(LargeTableChangeList):
+
+    def get_results(self, request):
+        super().get_results(request)
+        # A single page, or "show all", lists the queryset itself rather than a paginator page.
+        if not isinstance(self.result_list, list):
+            self.result_list = gather(self.queryset)
+
+
+class ShardedAdminMixin(LargeTableAdminMixin):
+    # Needed here regardless: the full count would only see the default shard.
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return ShardedChangeList if shards() else super().get_changelist(request, **kwargs)
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if not shards():
+            return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+        return ShardedPaginator(queryset, per_page, orphans, allow_empty_first_page)
+
+    def get_object(self, request, object_id, from_field=None):
+        if not shards():
+            return super().get_object(request, object_id, from_field)
+        return locate(self.get_queryset(request), object_id, from_field or 'pk')
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        if shards():
+            # It would only see the default shard; objects can still be deleted one by one.
+            actions.pop('delete_selected', None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        if not shards() or not search_term:
+            return super().get_search_results(request, queryset, search_term)
+
+        local, remote = [], defaultdict(list)
+        for name in self.get_search_fields(request):
+            lookup = f'{name[1:]}__{_SEARCH_PREFIXES[name[0]]}' if name[0] in _SEARCH_PREFIXES else f'{name}__icontains'
+            relation, _, rest = lookup.partition('__')
+            field = self.model._meta.get_field(relation)
+            if field.is_relation and not is_sharded(field.related_model):
+                remote[field].append(rest)
+            else:
+                local.append(lookup)
+
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            term = Q.create([(lookup, bit) for lookup in local], connector=Q.OR)
+            for field, lookups in remote.items():
+                matches = field.related_model._default_manager.filter(
+                    Q.create([(lookup, bit) for lookup in lookups], connector=Q.OR)
+                ).values_list('pk', flat=True)
+                term |= Q(**{f'{field.name}__in': list(matches)})
+            queryset = queryset.filter(term)
+        return queryset, False
@@ -0,0 +1,371 @@
+"""
+User-sharded storage.
+
+Per-user rows (``SHARDED_MODELS``) live on one of ``settings.DATABASE_SHARDS``,
+picked from the owner's user id. Users, investment plans and Django's own
+tables stay on ``default``, which is also shard 0. With no shards
+configured, everything here is a no-op.
+
+A query finds its shard in one of three ways:
+
+* ``ShardedQuerySet``, the sharded models' default manager, sends any
+  ``filter()``, ``get()``, ``create()`` or ``get_or_create()`` that names a
+  ``user`` to that user's shard, and splits ``bulk_create()`` by owner;
+* ``ShardRouter`` follows the instance Django passes as a hint. A loaded
+  row stays on its shard, and ``user.deposits`` or ``user.wallet`` go to
+  the user's shard;
+* queries that span users say so explicitly. ``each_shard()`` gives one
+  queryset per shard, ``gather()`` merges their rows in the queryset's
+  ordering, and ``locate()`` finds a row by id.
+
+``init_shards`` starts shard *n*'s integer primary keys at
+``n * SHARD_ID_SPAN``, so ids are unique across shards and an id names
+its shard. The shards other than ``default`` have no global tables, so
+``init_shards`` drops the database constraints of the foreign keys from
+their tables to global ones (``drop_global_constraints()``), and
+``select_related()`` across them becomes ``prefetch_related()``.
+``default`` keeps every constraint: its users and plans are all there.
+"""
+import heapq
+from collections import defaultdict
+from itertools import chain, islice
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections, models
+from django.db.migrations.state import ProjectState
+from django.http import Http404
+
+SHARDED_MODELS = (
+    'wallets.wallet',
+    'investments.userinvestment',
+    'investments.investment',
+    'investments.deposit',
+    'investments.withdrawal',
+    'transactions.transactionhistory',
+)
+
+_USER_LOOKUPS = ('user', 'user_id', 'user__pk', 'user__id', 'user__exact', 'user_id__exact')
+
+
+def shards():
+    aliases = getattr(settings, 'DATABASE_SHARDS', [])
+    if aliases and aliases[0] != DEFAULT_DB_ALIAS:
+        raise ImproperlyConfigured("DATABASE_SHARDS must start with 'default', which holds the global tables.")
+    return aliases
+
+
+def id_span():
+    return getattr(settings, 'SHARD_ID_SPAN', 10 ** 12)
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODELS
+
+
+def sharded_models():
+    return [apps.get_model(label) for label in SHARDED_MODELS]
+
+
+def shard_for_user(user):
+    """The alias holding the rows of ``user`` (a user or a user id)."""
+    aliases = shards()
+    user_id = getattr(user, 'pk', user)
+    if not aliases or user_id is None:
+        return DEFAULT_DB_ALIAS
+    return aliases[int(user_id) % len(aliases)]
+
+
+def _shard_from_lookups(kwargs):
+    for lookup in _USER_LOOKUPS:
+        if lookup in kwargs:
+            try:
+                return shard_for_user(kwargs[lookup])
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+class ShardedQuerySet(models.QuerySet):
+    """Routes queries that name their user to that user's shard."""
+
+    def _for_user(self, kwargs):
+        if self._db is None and shards():
+            alias = _shard_from_lookups(kwargs)
+            if alias is not None:
+                return self.using(alias)
+        return None
+
+    def filter(self, *args, **kwargs):
+        routed = self._for_user(kwargs)
+        if routed is not None:
+            return routed.filter(*args, **kwargs)
+        return super().filter(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        routed = self._for_user(kwargs)
+        if routed is not None:
+            return routed.get(*args, **kwargs)
+        return super().get(*args, **kwargs)
+
+    def create(self, **kwargs):
+        routed = self._for_user(kwargs)
+        if routed is not None:
+            return routed.create(**kwargs)
+        return super().create(**kwargs)
+
+    def get_or_create(self, defaults=None, **kwargs):
+        routed = self._for_user(kwargs)
+        if routed is not None:
+            return routed.get_or_create(defaults, **kwargs)
+        return super().get_or_create(defaults, **kwargs)
+
+    def update_or_create(self, defaults=None, create_defaults=None, **kwargs):
+        routed = self._for_user(kwargs)
+        if routed is not None:
+            return routed.update_or_create(defaults, create_defaults, **kwargs)
+        return super().update_or_create(defaults, create_defaults, **kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if self._db is not None or not shards():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        by_shard = defaultdict(list)
+        for obj in objs:
+            by_shard[shard_for_user(obj.user_id)].append(obj)
+        for alias, group in by_shard.items():
+            self.using(alias).bulk_create(group, *args, **kwargs)
+        return objs
+
+    def select_related(self, *fields):
+        if shards() and fields != (None,):
+            return self.prefetch_related(*fields)
+        return super().select_related(*fields)
+
+
+class ShardRouter:
+
+    def _db(self, model, hints):
+        if not shards():
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if is_sharded(model):
+            if is_sharded(type(instance)):
+                return instance._state.db or shard_for_user(instance.user_id)
+            if isinstance(instance, get_user_model()):
+                return shard_for_user(instance)
+            return None
+        if is_sharded(type(instance)):
+            # A global row reached from a sharded one: deposit.user, investment.plan.
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if shards() and (is_sharded(type(obj1)) or is_sharded(type(obj2))):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db not in shards():
+            return None
+        # The other shards only hold the per-user tables.
+        return model_name is not None and f'{app_label}.{model_name}' in SHARDED_MODELS
+
+
+def each_shard(queryset):
+    """One copy of ``queryset`` per shard; just ``queryset`` if unsharded or already routed."""
+    aliases = shards()
+    if not aliases or queryset._db is not None:
+        return [queryset]
+    return [queryset.using(alias) for alias in aliases]
+
+
+class _Term:
+    """One ORDER BY value, compared the way the database orders it."""
+    __slots__ = ('value', 'descending', 'nulls_largest')
+
+    def __init__(self, value, descending, nulls_largest):
+        self.value = value
+        self.descending = descending
+        self.nulls_largest = nulls_largest
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        a, b = (other.value, self.value) if self.descending else (self.value, other.value)
+        if a is None or b is None:
+            if (a is None) == (b is None):
+                return False
+            return (a is None) != self.nulls_largest
+        return a < b
+
+
+def _ordering_value(obj, path):
+    *relations, name = path.split('__')
+    for relation in relations:
+        obj = getattr(obj, relation)
+    if name == 'pk':
+        return obj.pk
+    field = obj._meta.get_field(name)
+    return getattr(obj, field.attname if field.concrete else name)
+
+
+def ordering_key(queryset):
+    """A sort key matching ``queryset``'s ORDER BY, or None if it is unordered."""
+    query = queryset.query
+    ordering = query.order_by or (query.default_ordering and queryset.model._meta.ordering) or ()
+    terms = [(name.lstrip('-'), name.startswith('-')) for name in ordering if isinstance(name, str) and name != '?']
+    if not terms:
+        return None
+    nulls_largest = connections[DEFAULT_DB_ALIAS].features.nulls_order_largest
+    return lambda obj: tuple(_Term(_ordering_value(obj, path), desc, nulls_largest) for path, desc in terms)
+
+
+def _merge(queryset, parts, stop):
+    key = ordering_key(queryset)
+    rows = heapq.merge(*parts, key=key) if key else chain.from_iterable(parts)
+    return list(islice(rows, stop))
+
+
+def gather(queryset, stop=None):
+    """
+    Scatter ``queryset`` over the shards and merge the rows in its
+    ordering, keeping the first ``stop``. Returns the queryset itself
+    (sliced to ``stop``) when there is nothing to scatter.
+    """
+    parts = each_shard(queryset)
+    if len(parts) == 1:
+        return queryset if stop is None else queryset[:stop]
+    return _merge(queryset, [list(part[:stop] if stop is not None else part) for part in parts], stop)
+
+
+async def agather(queryset):
+    """``gather()`` for async views; always returns a list."""
+    parts = [[row async for row in part] for part in each_shard(queryset)]
+    return parts[0] if len(parts) == 1 else _merge(queryset, parts, None)
+
+
+def locate(queryset, value, field_name='pk'):
+    """
+    Find the row of ``queryset`` whose unique ``field_name`` is ``value``,
+    trying the shard an integer id names first. None if there is none.
+    """
+    model = queryset.model
+    field = model._meta.pk if field_name == 'pk' else model._meta.get_field(field_name)
+    try:
+        value = field.to_python(value)
+    except ValidationError:
+        return None
+    parts = each_shard(queryset)
+    if field.primary_key and isinstance(value, int):
+        named = value // id_span()
+        parts.sort(key=lambda part: part._db != (shards()[named] if named < len(shards()) else None))
+    for part in parts:
+        try:
+            return part.get(**{field.name: value})
+        except model.DoesNotExist:
+            continue
+    return None
+
+
+def reserve_id_range(alias):
+    """Move ``alias``'s integer id sequences past the start of its range."""
+    start = shards().index(alias) * id_span()
+    if not start:
+        return
+    connection = connections[alias]
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for model in sharded_models():
+            pk = model._meta.pk
+            if not isinstance(pk, models.AutoField):
+                continue
+            table = model._meta.db_table
+            cursor.execute(f'SELECT COALESCE(MAX({qn(pk.column)}), 0) FROM {qn(table)}')
+            if cursor.fetchone()[0] >= start:
+                continue
+            if connection.vendor == 'sqlite':
+                cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s', [table])
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, start])
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SELECT setval(pg_get_serial_sequence(%s, %s), %s)', [table, pk.column, start])
+            else:
+                raise NotSupportedError(f'Cannot reserve id ranges on {connection.vendor}.')
+
+
+def _foreign_keys(connection, model):
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return {tuple(c['columns']) for c in constraints.values() if c['foreign_key']}
+
+
+def drop_global_constraints(alias):
+    """
+    Drop the constraints of the foreign keys from ``alias``'s sharded tables
+    to global ones, which are not on that shard. Plain ``migrate`` puts them
+    back on SQLite whenever it rebuilds a table, hence ``init_shards``.
+    """
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    connection = connections[alias]
+    # SQLite rebuilds the whole table from the model it is given, so the
+    # alterations start from models with every such constraint already gone.
+    state = ProjectState.from_apps(apps)
+    targets = []
+    for model in sharded_models():
+        fields = state.models[model._meta.app_label, model._meta.model_name].fields
+        for field in model._meta.local_concrete_fields:
+            if field.is_relation and field.db_constraint and not is_sharded(field.related_model):
+                fields[field.name] = field.clone()
+                fields[field.name].db_constraint = False
+                targets.append((model, field))
+    for model, field in targets:
+        if (field.column,) not in _foreign_keys(connection, model):
+            continue
+        unconstrained = state.apps.get_model(model._meta.label)
+        with connection.schema_editor() as editor:
+            editor.alter_field(unconstrained, field, unconstrained._meta.get_field(field.name))
+
+
+def delete_user_rows(sender, instance, using, **kwargs):
+    """
+    pre_delete receiver for users. The deletion collector only looks on the
+    user's own database, so rows on another shard are deleted here.
+    """
+    alias = shard_for_user(instance)
+    if alias != using:
+        for model in sharded_models():
+            model._base_manager.using(alias).filter(user_id=instance.pk).delete()
+
+
+class ShardedViewMixin:
+    """
+    For DRF generic views over sharded rows of many users (staff lists and
+    lookups by id): lists are gathered from every shard and objects are
+    found with ``locate()``.
+    """
+
+    def filter_queryset(self, queryset):
+        return gather(super().filter_queryset(queryset))
+
+    def get_object(self):
+        if not shards():
+            return super().get_object()
+        queryset = super().filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = locate(queryset, self.kwargs[lookup_url_kwarg], self.lookup_field)
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
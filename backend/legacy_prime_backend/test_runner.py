@@ -0,0 +1,48 @@
+"""
+The test runner (TEST_RUNNER in settings.py). The suite runs on SQLite's
+defaults, with stock locking and no pragmas, whatever
+LEGACY_PRIME_SQLITE_TUNING says and however it is started. The structured
+log lines (monitoring/logs.py) are discarded; tests that check events use
+assertLogs, which installs its own handler.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+
+def untuned(settings_dict):
+    """``settings_dict`` without what SQLITE_TUNING added to it."""
+    tuning = settings.SQLITE_TUNING
+    options = {
+        key: value for key, value in settings_dict.get('OPTIONS', {}).items()
+        if tuning['OPTIONS'].get(key) != value
+    }
+    return {**settings_dict, 'OPTIONS': options, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._tuned = {}
+        for connection in connections.all():
+            if connection.vendor == 'sqlite':
+                self._tuned[connection.alias] = connection.settings_dict
+                connection.settings_dict = untuned(connection.settings_dict)
+        self._structured = {}
+        for name in settings.LOGGING.get('loggers', {}):
+            logger = logging.getLogger(name)
+            if any(handler.name == 'structured' for handler in logger.handlers):
+                self._structured[name] = logger.handlers
+                logger.handlers = [
+                    logging.NullHandler() if handler.name == 'structured' else handler for handler in logger.handlers
+                ]
+
+    def teardown_test_environment(self, **kwargs):
+        for alias, settings_dict in self._tuned.items():
+            connections[alias].settings_dict = settings_dict
+        for name, handlers in self._structured.items():
+            logging.getLogger(name).handlers = handlers
+        super().teardown_test_environment(**kwargs)
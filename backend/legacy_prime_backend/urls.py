@@ -1,22 +1,66 @@
+from importlib import import_module
 
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.views import TokenRefreshView
 from django.http import JsonResponse
+from accounts.views import CustomTokenObtainPairView
+from monitoring.views import metrics_view, profile_detail, profile_download, profile_list
+
+
+class LazyURLConf:
+    """
+    An included URLconf whose patterns are loaded by the first request
+    under its prefix (or the first reverse()), for lean startup.
+    """
+
+    def __init__(self, load):
+        self.load = load
+
+    @cached_property
+    def urlpatterns(self):
+        return self.load()
+
+
+def admin_urls():
+    admin.autodiscover()
+    return admin.site.get_urls()
+
+
+if settings.LEAN_STARTUP:
+    admin_urlconf = (LazyURLConf(admin_urls), 'admin', admin.site.name)
+    api_auth_urlconf = (LazyURLConf(lambda: import_module('rest_framework.urls').urlpatterns), 'rest_framework', 'rest_framework')
+else:
+    admin_urlconf = admin.site.urls
+    api_auth_urlconf = include('rest_framework.urls')
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('admin/', admin_urlconf),
 
-    # JWT Authentication
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    # JWT Authentication (the same rate-limited login as api/accounts/token/)
+    path('api/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
     # App routes (we’ll add later)
     path('api/accounts/', include('accounts.urls')),
     path('api/investments/', include('investments.urls')),
     path('api/transactions/', include('transactions.urls')),
-    path('api-auth/', include('rest_framework.urls')),
+    path('api-auth/', api_auth_urlconf),
     path('api/wallet/', include('wallets.urls')),
 
+    # Prometheus metrics
+    path('metrics', metrics_view, name='metrics'),
+
+    # Request profiles (staff only; see PROFILING_ENABLED)
+    path('monitoring/profiles/', profile_list, name='profile-list'),
+    path('monitoring/profiles/<str:capture_id>/', profile_detail, name='profile-detail'),
+    path('monitoring/profiles/<str:capture_id>/download/', profile_download, name='profile-download'),
+
     path("", lambda request: JsonResponse({"status": "ok", "message": "Welcome to the Legacy Prime API"})),
 ]
+
+# Deposit proofs and their thumbnails, in development (empty unless DEBUG).
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,22 @@
+from django.apps import AppConfig
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoring'
+
+    def ready(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+        from django.db.models import signals
+        from . import slow_queries
+        from .metrics import install_execute_wrapper, instrument_signal
+
+        connection_created.connect(install_execute_wrapper, dispatch_uid='monitoring-execute-wrapper')
+        connection_created.connect(slow_queries.install_execute_wrapper, dispatch_uid='monitoring-slow-query-wrapper')
+        for connection in connections.all(initialized_only=True):
+            install_execute_wrapper(None, connection)
+            slow_queries.install_execute_wrapper(None, connection)
+
+        for name in ('pre_save', 'post_save', 'pre_delete', 'post_delete', 'm2m_changed'):
+            instrument_signal(getattr(signals, name), name)
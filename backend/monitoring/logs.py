@@ -0,0 +1,199 @@
+"""
+Structured, non-blocking logging.
+
+The application loggers (see ``LOGGING`` in settings) hand their records to
+``QueueHandler``, which only puts them on a bounded in-memory queue. A
+``QueueListener`` thread formats them as one JSON object per line and
+writes them to ``LOG_FILE`` or stderr, so a request never waits on I/O.
+When the writer falls behind and the queue is full, records are dropped
+and counted in /metrics instead of blocking the request.
+
+Log events with ``event()``::
+
+    event(logger, 'auth.login.failed', logging.WARNING, user_id=user.pk)
+
+The event name is the message and the keyword arguments become fields of
+the JSON line. Every line also carries the request's ``correlation_id``,
+set by ``CorrelationIdMiddleware`` from ``X-Request-ID`` and echoed on the
+response, so one request's lines can be pulled out of a busy log.
+
+Before a record leaves the request thread, fields named like secrets
+(password, otp, token, ...) are replaced with ``[redacted]`` and e-mail
+addresses are masked. ``LOG_SAMPLE_RATES`` keeps only a share of the
+INFO records of high-volume events; warnings and errors are always kept.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+HEADER = 'X-Request-ID'
+CORRELATION_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+REDACTED = '[redacted]'
+SECRET_FIELD = re.compile(
+    r'(^|_)(password|passwd|otp|token|refresh|access|secret|authorization|cookie|signature)s?($|_)', re.IGNORECASE,
+)
+EMAIL = re.compile(r'([^@\s"\'<>(),;:])[^@\s"\'<>(),;:]*(@[A-Za-z0-9.-]+\.[A-Za-z]{2,})')
+
+correlation_id = ContextVar('monitoring_correlation_id', default=None)
+
+
+def event(logger, name, level=logging.INFO, exc_info=None, **fields):
+    """Log the event ``name`` with ``fields`` as the structured part of the record."""
+    if logger.isEnabledFor(level):
+        logger.log(level, name, exc_info=exc_info, extra={'fields': fields})
+
+
+def mask_emails(text):
+    """``jane.doe@example.com`` -> ``j***@example.com``."""
+    return EMAIL.sub(r'\1***\2', text)
+
+
+def redact(value, key=''):
+    """A copy of ``value`` with secret-named fields replaced and e-mail addresses masked."""
+    if key and SECRET_FIELD.search(key):
+        return REDACTED
+    if isinstance(value, dict):
+        return {name: redact(item, str(name)) for name, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return mask_emails(value)
+    return value
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a ``LOG_SAMPLE_RATES[event]`` share of an event's records below WARNING."""
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not isinstance(record.msg, str):
+            return True
+        rate = getattr(settings, 'LOG_SAMPLE_RATES', {}).get(record.msg)
+        if rate is None or rate >= 1:
+            return True
+        if random.random() < rate:
+            record.sample_rate = rate
+            return True
+        metrics.inc('log_records_sampled_out_total', (('event', record.msg),))
+        return False
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, event, correlation id, then the fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+            'correlation_id': getattr(record, 'correlation_id', None) or correlation_id.get(),
+        }
+        if getattr(record, 'sample_rate', None) is not None:
+            entry['sample_rate'] = record.sample_rate
+        for name, value in (getattr(record, 'fields', None) or {}).items():
+            entry.setdefault(name, value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records for a ``QueueListener`` thread that writes them as JSON
+    lines to ``filename`` (appending) or to stderr. Never blocks: a record
+    arriving at a full queue is dropped and counted.
+    """
+
+    def __init__(self, filename=None, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.addFilter(SamplingFilter())
+        target = logging.FileHandler(filename, delay=True) if filename else logging.StreamHandler(sys.stderr)
+        target.setFormatter(JSONFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, target)
+        self.listener.start()
+
+    def prepare(self, record):
+        # Runs on the thread that logged: everything the listener needs is
+        # resolved here, and nothing mutable is shared with it.
+        record = copy.copy(record)
+        record.message = mask_emails(record.getMessage())
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.fields = redact(getattr(record, 'fields', None) or {})
+        record.correlation_id = correlation_id.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc('log_records_dropped_total', (('logger', record.name),))
+
+    def close(self):
+        # logging.shutdown() closes handlers at exit, so queued records are written then.
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        super().close()
+
+
+class CorrelationIdMiddleware:
+    """
+    Gives each request a correlation id: the client's ``X-Request-ID`` when
+    it is a plausible id, a new one otherwise. Log records written while the
+    request is handled carry it, and the response echoes it back.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            correlation_id.reset(token)
+        response[HEADER] = request.correlation_id
+        return response
+
+    async def __acall__(self, request):
+        token = self.begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            correlation_id.reset(token)
+        response[HEADER] = request.correlation_id
+        return response
+
+    def begin(self, request):
+        value = request.headers.get(HEADER, '')
+        if not CORRELATION_ID.match(value):
+            value = uuid.uuid4().hex
+        request.correlation_id = value
+        return correlation_id.set(value)
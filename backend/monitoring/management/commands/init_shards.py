@@ -0,0 +1,23 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from legacy_prime_backend.sharding import drop_global_constraints, reserve_id_range, shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Migrate every alias in DATABASE_SHARDS, drop the foreign key '
+        'constraints to the global tables the other shards lack, and start '
+        'each shard\'s integer ids at its own SHARD_ID_SPAN range. Safe to run again.'
+    )
+
+    def handle(self, *args, **options):
+        aliases = shards()
+        if not aliases:
+            raise CommandError('DATABASE_SHARDS is empty.')
+
+        for alias in aliases:
+            call_command('migrate', database=alias, verbosity=options['verbosity'] - 1, interactive=False)
+            drop_global_constraints(alias)
+            reserve_id_range(alias)
+            self.stdout.write(self.style.SUCCESS(f'Shard {alias} ready.'))
@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks.common import test_database
+from benchmarks.micro import run
+
+
+class Command(BaseCommand):
+    help = (
+        'Run model and serializer microbenchmarks against a throwaway test '
+        'database and report ops/sec with 95% confidence intervals.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=10)
+        parser.add_argument('--min-time', type=float, default=0.1,
+                            help='Minimum seconds per sample (default 0.1)')
+        parser.add_argument('--rows', type=int, default=100,
+                            help='Rows serialized / aggregated per call (default 100)')
+        parser.add_argument('--only', nargs='+', help='Run cases whose name contains any of these words')
+        parser.add_argument('--json', dest='json_path', help='Also write results to this JSON file')
+
+    def handle(self, *args, **options):
+        with test_database():
+            results = run(
+                samples=options['samples'], min_time=options['min_time'],
+                rows=options['rows'], only=options['only'], stdout=self.stdout,
+            )
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(f"Results saved to {options['json_path']}")
@@ -0,0 +1,72 @@
+import json
+import os
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from monitoring.slow_queries import aggregate, log_path, read_log
+
+ORDER = {
+    'total': 'total_ms',
+    'count': 'count',
+    'max': 'max_ms',
+    'mean': 'mean_ms',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Rank the statements in the slow query log (SLOW_QUERY_LOG) by '
+        'fingerprint, with the views or commands that ran them, the slowest '
+        'example and its EXPLAIN plan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10, help='Fingerprints to show (default 10)')
+        parser.add_argument('--sort', choices=sorted(ORDER), default='total', help='Rank by (default total time)')
+        parser.add_argument('--hours', type=float, help='Only entries from the last N hours')
+        parser.add_argument('--no-plans', action='store_true', help='Leave out the EXPLAIN output')
+        parser.add_argument('--log', help='Log file to read (default SLOW_QUERY_LOG)')
+        parser.add_argument('--json', action='store_true', help='Print the aggregates as JSON')
+        parser.add_argument('--clear', action='store_true', help='Delete the log after reporting')
+
+    def handle(self, *args, **options):
+        path = options['log'] or log_path()
+        entries = read_log(path)
+        if options['hours'] is not None:
+            cutoff = datetime.now().timestamp() - options['hours'] * 3600
+            entries = [entry for entry in entries if entry['at'] >= cutoff]
+
+        groups = sorted(aggregate(entries), key=lambda group: -group[ORDER[options['sort']]])[:options['limit']]
+        if options['json']:
+            self.stdout.write(json.dumps(groups, indent=2, default=str))
+        elif not groups:
+            self.stdout.write(f'No slow queries logged in {path}.')
+        else:
+            self.stdout.write(f'{len(entries)} slow statements in {path}, top {len(groups)} by {options["sort"]}:')
+            for rank, group in enumerate(groups, 1):
+                self.report(rank, group, plans=not options['no_plans'])
+
+        if options['clear']:
+            for name in (path, f'{path}.1'):
+                if os.path.exists(name):
+                    os.remove(name)
+            self.stdout.write(self.style.SUCCESS('Slow query log cleared.'))
+
+    def report(self, rank, group, plans):
+        last_seen = datetime.fromtimestamp(group['last_seen']).strftime('%Y-%m-%d %H:%M:%S')
+        self.stdout.write('')
+        self.stdout.write(self.style.WARNING(
+            f"#{rank}  {group['count']}x  total {group['total_ms']:.0f} ms  "
+            f"mean {group['mean_ms']:.0f} ms  max {group['max_ms']:.0f} ms  last {last_seen}"
+        ))
+        self.stdout.write(f"    {group['fingerprint']}")
+        self.stdout.write(f"    params: {group['params']}  databases: {', '.join(group['databases'])}")
+        for origin, count in group['origins'].most_common(3):
+            self.stdout.write(f'    {count}x from {origin}')
+        for source, count in group['sources'].most_common(3):
+            self.stdout.write(f'    {count}x at {source}')
+        if plans and group['plan']:
+            self.stdout.write('    plan:')
+            for line in group['plan'].splitlines():
+                self.stdout.write(f'      {line}')
@@ -0,0 +1,51 @@
+import json
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from benchmarks.cold_start import PHASES, boot, package
+
+
+class Command(BaseCommand):
+    help = (
+        'Start the project in a fresh interpreter under -X importtime, serve '
+        'one request and report where the cold start went: time per phase, '
+        'the slowest modules by self time and the totals per package.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lean', action='store_true', help='Profile with LEGACY_PRIME_LEAN_STARTUP=1')
+        parser.add_argument('--path', default='/', help='First request (default /)')
+        parser.add_argument('--limit', type=int, default=25, help='Modules and packages to list (default 25)')
+        parser.add_argument('--json', dest='json_path', help='Also write the full import list to this JSON file')
+
+    def handle(self, *args, **options):
+        result = boot(lean=options['lean'], paths=[options['path']], importtime=True)
+        imports = result['imports']
+        limit = options['limit']
+
+        self.stdout.write(f"Cold start of {'lean' if options['lean'] else 'stock'} configuration, "
+                          f"GET {options['path']} -> {result['requests'][0]['status']}")
+        for phase in PHASES:
+            self.stdout.write(f"  {phase:<14} {result['phases'][phase]:8.1f} ms")
+        self.stdout.write(f"  {'total':<14} {result['wall_ms']:8.1f} ms")
+
+        self.stdout.write(f'\nSlowest of {len(imports)} imports by self time:')
+        for phase, module, self_us, cumulative_us in sorted(imports, key=lambda row: -row[2])[:limit]:
+            self.stdout.write(f'  {self_us / 1000:7.1f} ms  {cumulative_us / 1000:7.1f} ms cum  {phase:<14} {module}')
+
+        totals = defaultdict(int)
+        for _, module, self_us, _ in imports:
+            totals[package(module)] += self_us
+        self.stdout.write('\nImport time by package:')
+        for name, self_us in sorted(totals.items(), key=lambda item: -item[1])[:limit]:
+            self.stdout.write(f'  {self_us / 1000:7.1f} ms  {name}')
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump({
+                    'lean': options['lean'], 'path': options['path'],
+                    'phases': result['phases'], 'wall_ms': result['wall_ms'],
+                    'imports': [dict(zip(('phase', 'module', 'self_us', 'cumulative_us'), row)) for row in imports],
+                }, fh, indent=2)
+            self.stdout.write(f"Results saved to {options['json_path']}")
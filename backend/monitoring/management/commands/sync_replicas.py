@@ -0,0 +1,43 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database over each alias in DATABASE_REPLICAS, '
+        'for trying replica routing locally. Uses the SQLite backup API, so it '
+        'is safe while the server runs and includes WAL pages not yet checkpointed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*', help='Replicas to refresh (default: all)')
+
+    def handle(self, *args, **options):
+        replicas = options['aliases'] or list(getattr(settings, 'DATABASE_REPLICAS', []))
+        if not replicas:
+            raise CommandError('DATABASE_REPLICAS is empty.')
+
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('sync_replicas only copies SQLite databases; use real replication elsewhere.')
+
+        for alias in replicas:
+            if alias not in connections:
+                raise CommandError(f'Unknown database alias {alias!r}.')
+            target = connections[alias]
+            if target.vendor != 'sqlite' or str(target.settings_dict['NAME']) == str(primary.settings_dict['NAME']):
+                raise CommandError(f'{alias!r} must be a separate SQLite file.')
+
+            target.close()
+            source = sqlite3.connect(primary.settings_dict['NAME'])
+            dest = sqlite3.connect(target.settings_dict['NAME'])
+            try:
+                with dest:
+                    source.backup(dest)
+            finally:
+                dest.close()
+                source.close()
+            self.stdout.write(self.style.SUCCESS(f"Copied {primary.settings_dict['NAME']} to {alias}."))
@@ -0,0 +1,301 @@
+"""
+In-process request metrics with Prometheus text export.
+
+Every thread records into its own registry (plain dicts, no locks on the
+hot path); an export walks all registries of the process and sums them.
+When a thread ends, its registry is folded into the process's ``_retired``
+totals and dropped, so thread-per-request servers neither grow the list
+nor lose counts. Under multi-process servers each worker periodically
+writes its snapshot to ``METRICS_MULTIPROCESS_DIR`` and ``/metrics``
+merges every file there; the files of workers that have exited are
+deleted (their counters restart, which Prometheus' rate() allows for).
+"""
+import glob
+import json
+import os
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Latency histogram bucket upper bounds, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'http_requests_total': ('counter', 'Requests handled, by route, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by route and method.'),
+    'db_queries_total': ('counter', 'Database queries executed while handling requests.'),
+    'db_query_duration_seconds_total': ('counter', 'Time spent in database queries while handling requests.'),
+    'signal_handler_calls_total': ('counter', 'Model signals sent while handling requests.'),
+    'signal_handler_duration_seconds_total': ('counter', 'Time spent in model signal handlers while handling requests.'),
+    'response_cache_requests_total': ('counter', 'Per-user response cache lookups, by view and result (hit/miss).'),
+    'log_records_dropped_total': ('counter', 'Log records dropped because the log queue was full, by logger.'),
+    'log_records_sampled_out_total': ('counter', 'INFO log records left out by LOG_SAMPLE_RATES, by event.'),
+}
+
+_local = threading.local()
+_registries = []
+_retired = {'counters': {}, 'histograms': {}}
+_registries_lock = threading.Lock()
+
+# Per-request accumulator, so DB and signal hooks know where to record.
+current_request = ContextVar('monitoring_current_request', default=None)
+
+
+class _Owner:
+    """Kept in the thread's locals: freed, and so finalized, when the thread ends."""
+
+
+def _retire(registry):
+    global _retired
+    with _registries_lock:
+        _retired = merge([_retired, registry])
+        _registries.remove(registry)
+
+
+def _registry():
+    registry = getattr(_local, 'registry', None)
+    if registry is None:
+        registry = _local.registry = {'counters': {}, 'histograms': {}}
+        _local.owner = _Owner()
+        with _registries_lock:
+            _registries.append(registry)
+        weakref.finalize(_local.owner, _retire, registry)
+    return registry
+
+
+def inc(name, labels, value=1):
+    counters = _registry()['counters']
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, labels, value):
+    histograms = _registry()['histograms']
+    key = (name, labels)
+    hist = histograms.get(key)
+    if hist is None:
+        hist = histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+    counts = hist[0]
+    for i, bound in enumerate(BUCKETS):
+        if value <= bound:
+            counts[i] += 1
+            break
+    else:
+        counts[-1] += 1
+    hist[1] += value
+    hist[2] += 1
+
+
+class RequestMetrics:
+    """
+    Counts queries, DB time and signal time for one request, and keeps the
+    request so other DB hooks can tell which view ran a query.
+    """
+
+    __slots__ = ('queries', 'db_time', 'signals', 'request')
+
+    def __init__(self, request=None):
+        self.queries = 0
+        self.db_time = 0.0
+        self.signals = {}
+        self.request = request
+
+    def __call__(self, execute, sql, params, many, context):
+        # Used as a connection.execute_wrapper().
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    def add_signal(self, key, seconds):
+        calls, total = self.signals.get(key, (0, 0.0))
+        self.signals[key] = (calls + 1, total + seconds)
+
+    def record(self, route, method, status, seconds):
+        labels = (('route', route), ('method', method))
+        inc('http_requests_total', labels + (('status', str(status)),))
+        observe('http_request_duration_seconds', labels, seconds)
+        inc('db_queries_total', labels, self.queries)
+        inc('db_query_duration_seconds_total', labels, self.db_time)
+        for (signal, sender), (calls, total) in self.signals.items():
+            signal_labels = (('route', route), ('signal', signal), ('sender', sender))
+            inc('signal_handler_calls_total', signal_labels, calls)
+            inc('signal_handler_duration_seconds_total', signal_labels, total)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """
+    Installed once on every connection. Routes each query to the metrics
+    of the request being handled, found through a ContextVar rather than
+    the connection, because async views run their queries on whichever
+    thread sync_to_async picks (the context is copied across).
+    """
+    request_metrics = current_request.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    return request_metrics(execute, sql, params, many, context)
+
+
+def install_execute_wrapper(sender, connection, **kwargs):
+    """``connection_created`` receiver."""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def instrument_signal(signal, name):
+    """Time every ``signal.send()`` made while a request is being measured."""
+    original = signal.send
+
+    def send(sender, **named):
+        request_metrics = current_request.get()
+        if request_metrics is None:
+            return original(sender, **named)
+        start = time.perf_counter()
+        try:
+            return original(sender, **named)
+        finally:
+            label = getattr(getattr(sender, '_meta', None), 'label', None) or repr(sender)
+            request_metrics.add_signal((name, label), time.perf_counter() - start)
+
+    signal.send = send
+
+
+# ---------------------------------------------------------------------------
+# Snapshots and export
+# ---------------------------------------------------------------------------
+
+def snapshot():
+    """Sum every thread registry of this process, and those of its ended threads."""
+    with _registries_lock:
+        registries = [_retired, *_registries]
+    return merge(registries)
+
+
+def merge(snapshots):
+    counters, histograms = {}, {}
+    for snap in snapshots:
+        # list() because other threads may be adding keys to a live registry.
+        for key, value in list(snap['counters'].items()):
+            counters[key] = counters.get(key, 0) + value
+        for key, (counts, total, count) in list(snap['histograms'].items()):
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += count
+    return {'counters': counters, 'histograms': histograms}
+
+
+def _dump(snap):
+    return {
+        kind: [[name, list(map(list, labels)), value] for (name, labels), value in snap[kind].items()]
+        for kind in ('counters', 'histograms')
+    }
+
+
+def _load(data):
+    return {
+        kind: {(name, tuple(map(tuple, labels))): value for name, labels, value in data.get(kind, [])}
+        for kind in ('counters', 'histograms')
+    }
+
+
+_last_flush = 0.0
+
+
+def multiprocess_dir():
+    return getattr(settings, 'METRICS_MULTIPROCESS_DIR', None)
+
+
+def flush(force=False):
+    """Write this worker's snapshot for other workers' /metrics to merge."""
+    global _last_flush
+    directory = multiprocess_dir()
+    if not directory:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < getattr(settings, 'METRICS_FLUSH_SECONDS', 5):
+        return
+    _last_flush = now
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(_dump(snapshot()), fh)
+    os.replace(tmp, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # someone else's process
+    return True
+
+
+def collect():
+    """Metrics for this process, or for all workers in multi-process mode."""
+    directory = multiprocess_dir()
+    if not directory:
+        return snapshot()
+    flush(force=True)
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+        if pid.isdigit() and not _alive(int(pid)):
+            # A worker that has exited, or restarted under a new pid.
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as fh:
+                snapshots.append(_load(json.load(fh)))
+        except (OSError, ValueError):
+            continue
+    return merge(snapshots)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def render(snap):
+    """Render a snapshot in the Prometheus text exposition format."""
+    lines = []
+    by_name = {}
+    for (name, labels), value in snap['counters'].items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), value in snap['histograms'].items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    for name in sorted(by_name):
+        kind, text = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name]):
+            if kind == 'histogram':
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS + ('+Inf',), counts):
+                    cumulative += bucket
+                    lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {total}')
+                lines.append(f'{name}_count{_labels(labels)} {count}')
+            else:
+                lines.append(f'{name}{_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
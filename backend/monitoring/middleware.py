@@ -0,0 +1,55 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """
+    Records latency, DB query count/time and model signal time for every
+    request, labelled by URL route (e.g. ``api/investments/my/<int:pk>/``).
+    Works under WSGI and ASGI; queries are attributed through
+    ``metrics.current_request`` (see ``metrics.execute_wrapper``).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_metrics = metrics.RequestMetrics(request)
+        token = metrics.current_request.set(request_metrics)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            self.finish(request, request_metrics, token, status, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        request_metrics = metrics.RequestMetrics(request)
+        token = metrics.current_request.set(request_metrics)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            self.finish(request, request_metrics, token, status, time.perf_counter() - start)
+
+    def finish(self, request, request_metrics, token, status, elapsed):
+        metrics.current_request.reset(token)
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match else 'unmatched'
+        request_metrics.record(route, request.method, status, elapsed)
+        metrics.flush()
@@ -0,0 +1,156 @@
+"""
+N+1 query detection.
+
+Every query run inside a block is reduced to a fingerprint (the SQL with
+literals, placeholders and IN lists normalised) and attributed to the
+innermost frame outside the ORM that issued it. A fingerprint that runs
+``threshold`` times or more is reported along with its call sites.
+
+Use ``detect()`` / ``assert_no_n_plus_one()`` in tests, or enable
+``NPlusOneMiddleware`` in development with ``NPLUSONE_DETECT = True``.
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 5
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE = re.compile(r'\s+')
+
+_DJANGO_DB = os.path.join('django', 'db', '')
+# Our own execute wrappers sit between the ORM and the caller.
+_WRAPPERS = {
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('nplusone.py', 'metrics.py', 'profiling.py', 'slow_queries.py')
+}
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """Normalise ``sql`` so queries differing only in values compare equal."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql.replace('%s', '?'))
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def _project_root():
+    return str(getattr(settings, 'BASE_DIR', os.getcwd()))
+
+
+def call_site(root):
+    """
+    ``path:line in func`` of the innermost frame outside the ORM and the
+    execute wrappers: the line of a view, model method or serializer field
+    that triggered the query.
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if _DJANGO_DB not in filename and filename not in _WRAPPERS:
+            if filename.startswith(root) and 'site-packages' not in filename:
+                filename = os.path.relpath(filename, root)
+            else:
+                filename = filename.rpartition('site-packages' + os.sep)[2]
+            return f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return '<unknown>'
+
+
+class QueryCollector:
+    """execute_wrapper that groups queries by fingerprint and call site."""
+
+    def __init__(self):
+        self.root = _project_root()
+        self.total = 0
+        self.queries = {}  # fingerprint -> [count, example sql, Counter of call sites]
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        key = fingerprint(sql)
+        entry = self.queries.get(key)
+        if entry is None:
+            entry = self.queries[key] = [0, sql, Counter()]
+        entry[0] += 1
+        entry[2][call_site(self.root)] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold=None):
+        """``(fingerprint, count, call_sites)`` for fingerprints run ``threshold``+ times."""
+        if threshold is None:
+            threshold = getattr(settings, 'NPLUSONE_THRESHOLD', DEFAULT_THRESHOLD)
+        found = [
+            (key, count, sites.most_common())
+            for key, (count, _, sites) in self.queries.items()
+            if count >= threshold
+        ]
+        return sorted(found, key=lambda item: -item[1])
+
+    def report(self, threshold=None):
+        lines = []
+        for key, count, sites in self.repeated(threshold):
+            lines.append(f'{count}x {key}')
+            lines.extend(f'    {n}x from {site}' for site, n in sites)
+        return '\n'.join(lines)
+
+
+@contextmanager
+def detect(using=None):
+    """Collect every query run in the block on ``using`` (default: all databases)."""
+    collector = QueryCollector()
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(collector))
+        yield collector
+
+
+@contextmanager
+def assert_no_n_plus_one(threshold=None, using=None):
+    """Fail if any query in the block repeats ``threshold`` times or more."""
+    with detect(using) as collector:
+        yield collector
+    if collector.repeated(threshold):
+        raise NPlusOneError('Repeated queries detected:\n' + collector.report(threshold))
+
+
+class NPlusOneMiddleware:
+    """
+    Development aid: logs repeated queries per request with their call
+    sites. Off unless ``NPLUSONE_DETECT`` is set; with ``NPLUSONE_RAISE``
+    the request fails instead, which is how the test suite uses it.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'NPLUSONE_DETECT', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with detect() as collector:
+            response = self.get_response(request)
+        report = collector.report()
+        if report:
+            message = f'N+1 queries in {request.method} {request.path}:\n{report}'
+            if getattr(settings, 'NPLUSONE_RAISE', False):
+                raise NPlusOneError(message)
+            logger.warning(message)
+            response['X-NPlusOne-Queries'] = str(sum(count for _, count, _ in collector.repeated()))
+        return response
@@ -0,0 +1,230 @@
+"""
+On-demand request profiling.
+
+With ``PROFILING_ENABLED`` on, ``ProfilingMiddleware`` profiles a request
+when a staff user sends ``X-Profile: 1`` (session or JWT) or when it falls in
+the ``PROFILING_SAMPLE_RATE`` sample. A capture holds:
+
+* the cProfile stats, summarised by cumulative time and also kept as a
+  ``.prof`` file for snakeviz or ``python -m pstats``;
+* the SQL timeline: each query's start offset, duration, database and the
+  line that issued it. The SQL keeps its placeholders, so parameter values
+  never reach disk;
+* the time spent in model signal handlers, by signal and sender, taken
+  from the request's metrics (monitoring/metrics.py).
+
+Captures go to ``PROFILING_DIR``. Only the newest ``PROFILING_MAX_CAPTURES``
+are kept there, so the directory works as a ring buffer. Staff can list
+them at ``/monitoring/profiles/``. A profiled response carries its capture
+id in ``X-Profile-Id``.
+
+With ``PROFILING_ENABLED`` off the middleware removes itself at startup,
+so it adds nothing to requests.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.exceptions import APIException
+
+from . import metrics
+from .nplusone import _project_root, call_site
+
+HEADER = 'X-Profile'
+CAPTURE_ID = re.compile(r'^\d+-\d+$')
+MAX_SQL_LENGTH = 2000
+TOP_FUNCTIONS = 60
+
+
+def profile_dir():
+    return str(getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+class SQLTimeline:
+    """execute_wrapper recording when each query ran, for how long and from where."""
+
+    def __init__(self, start):
+        self.start = start
+        self.root = _project_root()
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'at_ms': round((began - self.start) * 1000, 3),
+                'duration_ms': round((time.perf_counter() - began) * 1000, 3),
+                'database': context['connection'].alias,
+                'sql': sql[:MAX_SQL_LENGTH],
+                'many': many,
+                'source': call_site(self.root),
+            })
+
+
+def summarise(profile, limit=TOP_FUNCTIONS):
+    """The ``limit`` functions with the most cumulative time, as dicts."""
+    rows = []
+    for (filename, line, name), (_, calls, total, cumulative, _) in pstats.Stats(profile).stats.items():
+        rows.append({
+            'function': f'{filename}:{line}({name})',
+            'calls': calls,
+            'total_ms': round(total * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: -row['cumulative_ms'])
+    return rows[:limit]
+
+
+def save_capture(capture, profile):
+    """Write a capture and its ``.prof`` file, then drop the oldest beyond the limit."""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    capture_id = f'{time.time_ns()}-{os.getpid()}'
+    capture['id'] = capture_id
+    base = os.path.join(directory, capture_id)
+    profile.dump_stats(f'{base}.prof')
+    with open(f'{base}.json.tmp', 'w') as fh:
+        json.dump(capture, fh)
+    os.replace(f'{base}.json.tmp', f'{base}.json')
+    prune(directory, getattr(settings, 'PROFILING_MAX_CAPTURES', 50))
+    return capture_id
+
+
+def _capture_ids(directory):
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    ids = [name[:-5] for name in names if name.endswith('.json') and CAPTURE_ID.match(name[:-5])]
+    return sorted(ids, key=lambda capture_id: int(capture_id.split('-')[0]))
+
+
+def prune(directory, keep):
+    for capture_id in _capture_ids(directory)[:-keep or None]:
+        for suffix in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(directory, capture_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_captures():
+    """Summaries of the stored captures, newest first."""
+    summaries = []
+    for capture_id in reversed(_capture_ids(profile_dir())):
+        capture = load_capture(capture_id)
+        if capture is not None:
+            summaries.append({key: capture.get(key) for key in (
+                'id', 'method', 'path', 'status', 'user', 'reason', 'started_at', 'duration_ms', 'sql_count', 'sql_ms',
+            )})
+    return summaries
+
+
+def capture_path(capture_id, suffix):
+    if not CAPTURE_ID.match(capture_id):
+        return None
+    path = os.path.join(profile_dir(), capture_id + suffix)
+    return path if os.path.exists(path) else None
+
+
+def load_capture(capture_id):
+    path = capture_path(capture_id, '.json')
+    if path is None:
+        return None
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user if user.is_staff else None
+    # JWT requests are only authenticated inside the view, so check the token here.
+    from accounts.authentication import CachedJWTAuthentication
+
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except APIException:
+        return None
+    if result is not None and result[0].is_staff:
+        return result[0]
+    return None
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason, user = None, None
+        if request.headers.get(HEADER):
+            user = _staff(request)
+            reason = 'header' if user is not None else None
+        if reason is None and random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0):
+            reason = 'sampled'
+        if reason is None:
+            return self.get_response(request)
+        return self.profile(request, reason, user)
+
+    def profile(self, request, reason, user):
+        started_at = time.time()
+        start = time.perf_counter()
+        timeline = SQLTimeline(start)
+        request_metrics = metrics.current_request.get()
+        signals_before = dict(request_metrics.signals) if request_metrics else {}
+        profile = cProfile.Profile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timeline))
+            profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+        duration = time.perf_counter() - start
+
+        signals = []
+        for (signal, sender), (calls, seconds) in (request_metrics.signals if request_metrics else {}).items():
+            before_calls, before_seconds = signals_before.get((signal, sender), (0, 0.0))
+            if calls > before_calls:
+                signals.append({
+                    'signal': signal, 'sender': sender, 'calls': calls - before_calls,
+                    'total_ms': round((seconds - before_seconds) * 1000, 3),
+                })
+        signals.sort(key=lambda row: -row['total_ms'])
+
+        if user is None and getattr(request, 'user', None) is not None and request.user.is_authenticated:
+            user = request.user
+        capture_id = save_capture({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user': user.get_username() if user is not None else None,
+            'reason': reason,
+            'correlation_id': getattr(request, 'correlation_id', None),
+            'started_at': started_at,
+            'duration_ms': round(duration * 1000, 3),
+            'sql_count': len(timeline.queries),
+            'sql_ms': round(sum(query['duration_ms'] for query in timeline.queries), 3),
+            'sql': timeline.queries,
+            'signals': signals,
+            'functions': summarise(profile),
+        }, profile)
+        response['X-Profile-Id'] = capture_id
+        return response
@@ -0,0 +1,224 @@
+"""
+Slow query log.
+
+``execute_wrapper`` is installed on every connection, next to the metrics
+wrapper. Any statement slower than ``SLOW_QUERY_THRESHOLD_MS`` is
+appended to ``SLOW_QUERY_LOG`` (JSON lines). Each line holds:
+
+* the statement and its fingerprint (``nplusone.fingerprint``);
+* a summary of its parameters: how many and of which types, never their
+  values;
+* the view (``GET wallet-overview``) or management command
+  that ran it, and the line of code that issued it;
+* the ``EXPLAIN`` plan, taken once per fingerprint per process.
+
+``python manage.py slow_queries`` aggregates the log per fingerprint and
+ranks the offenders. The log rolls over to ``<name>.1`` once it passes
+``SLOW_QUERY_LOG_MAX_BYTES``. With the threshold set to None the wrapper
+only makes a settings lookup per query.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from . import metrics
+from .logs import correlation_id, event
+from .nplusone import _project_root, call_site, fingerprint
+
+logger = logging.getLogger(__name__)
+
+MAX_SQL_LENGTH = 4000
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+EXPLAIN_SAVEPOINT = 'slow_query_explain'
+
+_explained = set()
+_explained_lock = threading.Lock()
+_write_lock = threading.Lock()
+
+
+def threshold_ms():
+    return getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None)
+
+
+def log_path():
+    return str(getattr(settings, 'SLOW_QUERY_LOG', os.path.join(settings.BASE_DIR, 'slow_queries.jsonl')))
+
+
+def summarise_params(params, many):
+    """``3 (int, str x2)``: how many parameters and of which types."""
+    if many:
+        return 'executemany'
+    if not params:
+        return '0'
+    values = params.values() if isinstance(params, dict) else params
+    types = Counter(type(value).__name__ for value in values)
+    described = ', '.join(name if count == 1 else f'{name} x{count}' for name, count in sorted(types.items()))
+    return f'{sum(types.values())} ({described})'
+
+
+def origin():
+    """The view handling the current request, or the command being run."""
+    request_metrics = metrics.current_request.get()
+    request = request_metrics.request if request_metrics is not None else None
+    if request is not None:
+        match = getattr(request, 'resolver_match', None)
+        name = (match.view_name or match.route) if match else request.path
+        return f'{request.method} {name}'
+    argv = sys.argv
+    if len(argv) > 1 and os.path.basename(argv[0]) in ('manage.py', 'django-admin', '__main__.py'):
+        return f'command {argv[1]}'
+    return f'process {os.path.basename(argv[0]) if argv else "?"}'
+
+
+def explain(connection, sql, params):
+    """
+    The statement's plan, one line per plan row. The EXPLAIN bypasses the
+    execute wrappers, so it is neither timed, counted nor logged itself.
+    Inside a transaction it runs in a savepoint: on PostgreSQL a failed
+    statement aborts the whole transaction, and this one is not the
+    caller's to fail.
+    """
+    try:
+        prefix = connection.ops.explain_query_prefix()
+    except Exception:
+        return None
+    ops = connection.ops
+    savepoint = connection.in_atomic_block and connection.features.uses_savepoints
+    # The backend's own cursor: Django's CursorWrapper is what runs the execute wrappers.
+    cursor = connection.create_cursor()
+    try:
+        with connection.wrap_database_errors:
+            if savepoint:
+                cursor.execute(ops.savepoint_create_sql(EXPLAIN_SAVEPOINT))
+            try:
+                cursor.execute(f'{prefix} {sql}', params)
+                return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+            except Exception:
+                if savepoint:
+                    cursor.execute(ops.savepoint_rollback_sql(EXPLAIN_SAVEPOINT))
+                raise
+            finally:
+                if savepoint:
+                    cursor.execute(ops.savepoint_commit_sql(EXPLAIN_SAVEPOINT))
+    except DatabaseError as exc:
+        return f'EXPLAIN failed: {exc}'
+    finally:
+        cursor.close()
+
+
+def _first_time(key):
+    with _explained_lock:
+        if key in _explained:
+            return False
+        _explained.add(key)
+        return True
+
+
+def write(entry):
+    path = log_path()
+    line = json.dumps(entry, default=str) + '\n'
+    try:
+        with _write_lock:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) > getattr(settings, 'SLOW_QUERY_LOG_MAX_BYTES', 10 * 2 ** 20):
+                os.replace(path, f'{path}.1')
+            with open(path, 'a') as fh:
+                fh.write(line)
+    except OSError as exc:
+        logger.error('Could not write the slow query log %s: %s', path, exc)
+
+
+def record(connection, sql, params, many, elapsed):
+    key = fingerprint(sql)
+    plan = None
+    if not many and sql.lstrip()[:6].upper().startswith(EXPLAINABLE) and _first_time((connection.vendor, key)):
+        plan = explain(connection, sql, params)
+    entry = {
+        'at': time.time(),
+        'ms': round(elapsed * 1000, 3),
+        'fingerprint': key,
+        'sql': sql[:MAX_SQL_LENGTH],
+        'params': summarise_params(params, many),
+        'database': connection.alias,
+        'origin': origin(),
+        'correlation_id': correlation_id.get(),
+        'source': call_site(_project_root()),
+        'plan': plan,
+    }
+    event(
+        logger, 'db.slow_query', logging.WARNING,
+        ms=entry['ms'], origin=entry['origin'], source=entry['source'], fingerprint=key,
+    )
+    write(entry)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    limit = threshold_ms()
+    if limit is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        if elapsed * 1000 >= limit:
+            record(context['connection'], sql, params, many, elapsed)
+
+
+def install_execute_wrapper(sender, connection, **kwargs):
+    """``connection_created`` receiver."""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def read_log(path=None):
+    """Entries of the log and of its rolled-over predecessor, oldest first."""
+    path = path or log_path()
+    entries = []
+    for name in (f'{path}.1', path):
+        try:
+            with open(name) as fh:
+                for line in fh:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+    return entries
+
+
+def aggregate(entries):
+    """Per fingerprint: count, total/max/mean ms, top origins and sources, the slowest example and a plan."""
+    groups = {}
+    for entry in entries:
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'origins': Counter(), 'sources': Counter(), 'databases': Counter(),
+                'first_seen': entry['at'], 'last_seen': entry['at'], 'example': None, 'params': None, 'plan': None,
+            }
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['origins'][entry['origin']] += 1
+        group['sources'][entry['source']] += 1
+        group['databases'][entry['database']] += 1
+        group['first_seen'] = min(group['first_seen'], entry['at'])
+        group['last_seen'] = max(group['last_seen'], entry['at'])
+        if entry['ms'] >= group['max_ms']:
+            group['max_ms'], group['example'], group['params'] = entry['ms'], entry['sql'], entry['params']
+        if entry.get('plan'):
+            group['plan'] = entry['plan']
+    for group in groups.values():
+        group['mean_ms'] = group['total_ms'] / group['count']
+    return list(groups.values())
@@ -0,0 +1,28 @@
+from .nplusone import assert_no_n_plus_one
+
+# Row counts every list endpoint is measured at. The query count must be
+# the same at both, and no query may repeat per row.
+BUDGET_SIZES = (1, 1000)
+
+
+class QueryBudgetMixin:
+    """TestCase mixin for asserting a fixed number of queries per request."""
+
+    def assertQueryBudget(self, budget, client, url, status=200):
+        with self.assertNumQueries(budget), assert_no_n_plus_one():
+            response = client.get(url)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def assertBudgetAtSizes(self, budget, client, url, grow, offset=None):
+        """
+        Call ``grow(n)`` to bring the table up to ``n`` rows for each of
+        BUDGET_SIZES and check ``url`` stays within ``budget`` queries.
+        With ``offset``, also check the response lists ``offset + n`` rows.
+        """
+        for size in BUDGET_SIZES:
+            grow(size)
+            with self.subTest(rows=size):
+                response = self.assertQueryBudget(budget, client, url)
+                if offset is not None:
+                    self.assertEqual(len(response.data), offset + size)
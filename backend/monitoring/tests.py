@@ -0,0 +1,445 @@
+import gc
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from benchmarks.cold_start import boot, prepare_database
+from legacy_prime_backend.test_runner import untuned
+from transactions.models import TransactionHistory
+from transactions.views import TransactionHistoryListView
+
+from .nplusone import NPlusOneError, assert_no_n_plus_one, detect, fingerprint
+from . import logs, metrics, slow_queries
+from .profiling import ProfilingMiddleware, list_captures
+
+User = get_user_model()
+
+
+class FingerprintTests(TestCase):
+
+    def test_values_are_normalised(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'bob' LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id = 7 AND name = 'o''hara' LIMIT 21"),
+        )
+
+    def test_in_lists_collapse(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            'SELECT * FROM t WHERE id IN (...)',
+        )
+
+    def test_identifiers_keep_digits(self):
+        self.assertIn('table2', fingerprint('SELECT a1 FROM table2 WHERE b = 3'))
+
+
+class DetectorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'n1-{i}', f'n1-{i}@example.com') for i in range(6)]
+
+    def test_reports_repeats_with_call_site(self):
+        ids = [user.pk for user in self.users]
+        with self.assertRaises(NPlusOneError) as ctx, assert_no_n_plus_one(threshold=5):
+            for pk in ids:
+                User.objects.get(pk=pk)
+        message = str(ctx.exception)
+        self.assertIn('6x SELECT', message)
+        self.assertIn('monitoring/tests.py', message)
+
+    def test_below_threshold_passes(self):
+        with detect() as collector:
+            list(User.objects.all())
+            User.objects.count()
+        self.assertEqual(collector.total, 2)
+        self.assertEqual(collector.repeated(threshold=2), [])
+
+    @override_settings(NPLUSONE_DETECT=True, NPLUSONE_THRESHOLD=2)
+    def test_middleware_flags_response(self):
+        # History without select_related reads user.username once per row.
+        for user in self.users:
+            TransactionHistory.objects.create(user=user, transaction_type='deposit', amount=1)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('n1-staff', 'n1-staff@example.com', is_staff=True))
+        unjoined = mock.patch.object(
+            TransactionHistoryListView, 'get_queryset', lambda view: TransactionHistory.objects.all()
+        )
+        with unjoined, self.assertLogs('monitoring.nplusone', 'WARNING') as logs:
+            response = client.get('/api/transactions/')
+        self.assertEqual(response['X-NPlusOne-Queries'], '6')
+        self.assertIn('rest_framework/fields.py', logs.output[0])
+
+    def test_middleware_off_by_default(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        response = client.get('/api/transactions/')
+        self.assertNotIn('X-NPlusOne-Queries', response)
+
+
+class MetricsTests(SimpleTestCase):
+    """Per-thread registries, summed on export, folded away when their thread ends."""
+
+    def counter(self, snap, name, labels):
+        return snap['counters'].get((name, labels), 0)
+
+    def test_ended_threads_are_folded_into_the_process_totals(self):
+        labels = (('route', 'threads'),)
+        before = len(metrics._registries)
+        threads = [threading.Thread(target=metrics.inc, args=('test_threads_total', labels)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        del threads, thread
+        gc.collect()
+        self.assertEqual(len(metrics._registries), before)
+        self.assertEqual(self.counter(metrics.snapshot(), 'test_threads_total', labels), 20)
+
+    def test_render(self):
+        snap = metrics.merge([
+            {'counters': {('http_requests_total', (('route', 'a "b"'), ('status', '200'))): 3}, 'histograms': {}},
+            {'counters': {('http_requests_total', (('route', 'a "b"'), ('status', '200'))): 2}, 'histograms': {
+                ('http_request_duration_seconds', (('route', 'r'),)): [[1, 2] + [0] * 9 + [1], 0.5, 4],
+            }},
+        ])
+        text = metrics.render(snap)
+        self.assertIn('# TYPE http_requests_total counter\n', text)
+        self.assertIn('http_requests_total{route="a \\"b\\"",status="200"} 5\n', text)
+        self.assertIn('# TYPE http_request_duration_seconds histogram\n', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="r",le="0.005"} 1\n', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="r",le="0.01"} 3\n', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="r",le="+Inf"} 4\n', text)
+        self.assertIn('http_request_duration_seconds_sum{route="r"} 0.5\n', text)
+        self.assertIn('http_request_duration_seconds_count{route="r"} 4\n', text)
+
+    def test_exited_workers_files_are_dropped(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        exited = subprocess.Popen([sys.executable, '-c', '']).pid
+        os.waitpid(exited, 0)
+        labels = (('route', 'workers'),)
+        stale = os.path.join(directory, f'metrics-{exited}.json')
+        with open(stale, 'w') as fh:
+            json.dump(metrics._dump({'counters': {('test_workers_total', labels): 7}, 'histograms': {}}), fh)
+
+        with override_settings(METRICS_MULTIPROCESS_DIR=directory):
+            metrics.inc('test_workers_total', labels)
+            snap = metrics.collect()
+        self.assertEqual(self.counter(snap, 'test_workers_total', labels), 1)
+        self.assertEqual(os.listdir(directory), [f'metrics-{os.getpid()}.json'])
+
+
+class MetricsEndpointTests(TestCase):
+
+    def test_closed_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+        staff = User.objects.create_user('scraper', 'scraper@example.com', 'pass-12345', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='s3cret', DEBUG=True)
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+
+class StartupTests(SimpleTestCase):
+    """The booted processes get a copy of the database: opening the tracked one would rewrite its header."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.database = prepare_database(directory.name)
+
+    def test_lean_startup_defers_admin_and_pillow(self):
+        result = boot(
+            lean=True, paths=['/', '/admin/login/'], watch=['PIL.Image', 'investments.admin'], database=self.database,
+        )
+        root, admin_login = result['requests']
+        self.assertEqual(root['status'], 200)
+        self.assertEqual(root['loaded'], {'PIL.Image': False, 'investments.admin': False})
+        # The lazily mounted admin still works, and discovers its modules on first use.
+        self.assertEqual(admin_login['status'], 200)
+        self.assertTrue(admin_login['loaded']['investments.admin'])
+
+    def test_stock_startup_discovers_admin(self):
+        result = boot(paths=['/'], watch=['investments.admin'], database=self.database)
+        self.assertTrue(result['requests'][0]['loaded']['investments.admin'])
+
+
+class TestRunnerTests(SimpleTestCase):
+    """legacy_prime_backend/test_runner.py, which this suite runs under."""
+
+    def test_sqlite_tuning_is_off(self):
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], 0)
+        self.assertNotIn('init_command', connection.settings_dict['OPTIONS'])
+        tuned = {'NAME': 'db.sqlite3', **settings.SQLITE_TUNING}
+        tuned['OPTIONS'] = {**tuned['OPTIONS'], 'check_same_thread': False}
+        self.assertEqual(untuned(tuned), {
+            'NAME': 'db.sqlite3', 'OPTIONS': {'check_same_thread': False}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+        })
+
+    def test_structured_log_lines_are_discarded(self):
+        handlers = logging.getLogger('accounts').handlers
+        self.assertEqual([type(handler) for handler in handlers], [logging.NullHandler])
+
+
+class ProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('profiler', 'profiler@example.com', 'pass-12345', is_staff=True)
+        cls.user = User.objects.create_user('profiled', 'profiled@example.com', 'pass-12345')
+        TransactionHistory.objects.create(user=cls.user, transaction_type='deposit', amount=1)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        enabled = override_settings(PROFILING_ENABLED=True, PROFILING_DIR=directory.name, PROFILING_MAX_CAPTURES=2)
+        enabled.enable()
+        self.addCleanup(enabled.disable)
+
+    def test_off_by_default(self):
+        with override_settings(PROFILING_ENABLED=False), self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    def test_staff_header_captures_sql_and_signals(self):
+        def writing_queryset(view):
+            TransactionHistory.objects.create(user=self.user, transaction_type='deposit', amount=2)
+            return TransactionHistory.objects.select_related('user')
+
+        self.client.force_login(self.staff)
+        with mock.patch.object(TransactionHistoryListView, 'get_queryset', writing_queryset):
+            response = self.client.get('/api/transactions/', HTTP_X_PROFILE='1')
+        capture = self.client.get(f"/monitoring/profiles/{response['X-Profile-Id']}/").json()
+        self.assertEqual((capture['reason'], capture['user'], capture['status']), ('header', 'profiler', 200))
+        self.assertEqual(capture['sql_count'], len(capture['sql']))
+        self.assertTrue(any(query['sql'].startswith('INSERT') for query in capture['sql']))
+        self.assertTrue(all(query['source'] != '<unknown>' for query in capture['sql']))
+        self.assertIn('post_save', {row['signal'] for row in capture['signals']})
+        self.assertTrue(capture['functions'])
+
+        download = self.client.get(f"/monitoring/profiles/{response['X-Profile-Id']}/download/")
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('attachment', download['Content-Disposition'])
+
+    def test_jwt_staff_header(self):
+        response = self.client.get(
+            '/api/transactions/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}',
+        )
+        self.assertIn('X-Profile-Id', response)
+
+    def test_header_ignored_for_other_users(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertNotIn('X-Profile-Id', client.get('/api/transactions/', HTTP_X_PROFILE='1'))
+        self.assertNotIn('X-Profile-Id', self.client.get('/', HTTP_X_PROFILE='1'))
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampling_and_ring_buffer(self):
+        ids = [self.client.get('/')['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual([capture['id'] for capture in list_captures()], ids[:0:-1])
+        self.assertEqual(list_captures()[0]['reason'], 'sampled')
+
+    def test_views_are_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/monitoring/profiles/').status_code, 302)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/monitoring/profiles/').json(), {'captures': []})
+        self.assertEqual(self.client.get('/monitoring/profiles/../../etc/').status_code, 404)
+        self.assertEqual(self.client.get('/monitoring/profiles/1-1/').status_code, 404)
+
+
+class SlowQueryLogTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('slow', 'slow@example.com', 'pass-12345')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = os.path.join(directory.name, 'slow.jsonl')
+        # Log every statement.
+        logging_all = override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=self.log)
+        logging_all.enable()
+        self.addCleanup(logging_all.disable)
+        slow_queries._explained.clear()
+        cache.clear()
+
+    def test_entries_name_the_view_and_keep_values_out(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertLogs('monitoring.slow_queries', 'WARNING'):
+            client.get('/api/investments/overview/')
+        entries = [entry for entry in slow_queries.read_log() if entry['origin'] == 'GET wallet-overview']
+        self.assertTrue(entries)
+        entry = entries[0]
+        self.assertEqual(entry['params'], '1 (int)')
+        self.assertIn('wallets_wallet', entry['plan'])
+        self.assertTrue(entry['fingerprint'].endswith('= ? ORDER BY "wallets_wallet"."id" ASC LIMIT ?'))
+        self.assertTrue(any(entry['source'].startswith('investments/views.py') for entry in entries))
+
+    def test_plan_taken_once_per_fingerprint(self):
+        with self.assertLogs('monitoring.slow_queries', 'WARNING'):
+            for _ in range(3):
+                User.objects.filter(pk=self.user.pk).exists()
+        entries = [entry for entry in slow_queries.read_log() if 'accounts_user' in entry['sql']]
+        self.assertEqual(len(entries), 3)
+        self.assertEqual([entry['plan'] is not None for entry in entries], [True, False, False])
+        self.assertTrue(entries[0]['origin'].startswith('command '))
+
+    def test_command_ranks_per_fingerprint(self):
+        with self.assertLogs('monitoring.slow_queries', 'WARNING'):
+            for _ in range(3):
+                User.objects.filter(pk=self.user.pk).exists()
+            TransactionHistory.objects.count()
+        out = StringIO()
+        call_command('slow_queries', '--sort', 'count', '--json', stdout=out)
+        groups = json.loads(out.getvalue())
+        top = next(group for group in groups if 'accounts_user' in group['fingerprint'])
+        self.assertEqual(top['count'], 3)
+        self.assertTrue(top['plan'])
+
+        out = StringIO()
+        call_command('slow_queries', '--clear', stdout=out)
+        self.assertIn('plan:', out.getvalue())
+        self.assertEqual(slow_queries.read_log(), [])
+
+    def test_failed_explain_leaves_the_transaction_alone(self):
+        statements = []
+        with mock.patch.object(connection.ops, 'explain_query_prefix', return_value='EXPLAIN NONSENSE'), \
+                self.assertLogs('monitoring.slow_queries', 'WARNING'), transaction.atomic():
+            # SQLite's own statement trace: it also sees what bypasses Django's cursor.
+            connection.connection.set_trace_callback(statements.append)
+            self.addCleanup(connection.connection.set_trace_callback, None)
+            User.objects.filter(pk=self.user.pk).exists()
+            self.assertFalse(connection.needs_rollback)
+            self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+        self.assertIn('ROLLBACK TO SAVEPOINT "slow_query_explain"', statements)
+        entry = next(entry for entry in slow_queries.read_log() if 'accounts_user' in entry['sql'])
+        self.assertTrue(entry['plan'].startswith('EXPLAIN failed:'))
+
+    @override_settings(SLOW_QUERY_LOG_MAX_BYTES=1)
+    def test_log_rolls_over(self):
+        with self.assertLogs('monitoring.slow_queries', 'WARNING'):
+            for _ in range(3):
+                User.objects.filter(pk=self.user.pk).exists()
+        self.assertTrue(os.path.exists(f'{self.log}.1'))
+        self.assertEqual(len(slow_queries.read_log()), 2)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=None)
+    def test_off(self):
+        User.objects.filter(pk=self.user.pk).exists()
+        self.assertFalse(os.path.exists(self.log))
+
+
+class StructuredLoggingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('logged', 'jane.doe@example.com', 'pass-12345')
+
+    def setUp(self):
+        cache.clear()
+
+    def handler(self, **kwargs):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'app.jsonl')
+        handler = logs.QueueHandler(filename=path, **kwargs)
+        self.addCleanup(handler.close)
+        logger = logging.getLogger(f'monitoring.tests.{self._testMethodName}')
+        logger.addHandler(handler)
+        logger.propagate = False
+        self.addCleanup(logger.removeHandler, handler)
+
+        def lines():
+            handler.close()
+            with open(path) as fh:
+                return [json.loads(line) for line in fh]
+        return logger, handler, lines
+
+    def test_redaction(self):
+        self.assertEqual(logs.redact({
+            'password': 'hunter2', 'new_password': 'x', 'otp': '123456', 'user_id': 3,
+            'nested': {'refresh': 'eyJ', 'note': 'sent to jane.doe@example.com'},
+        }), {
+            'password': '[redacted]', 'new_password': '[redacted]', 'otp': '[redacted]', 'user_id': 3,
+            'nested': {'refresh': '[redacted]', 'note': 'sent to j***@example.com'},
+        })
+
+    def test_records_are_written_as_json_off_thread(self):
+        logger, handler, lines = self.handler()
+        token = logs.correlation_id.set('req-1')
+        try:
+            logs.event(logger, 'auth.login.failed', logging.WARNING, email='jane.doe@example.com', otp='123456')
+            try:
+                raise ValueError('boom')
+            except ValueError:
+                logs.event(logger, 'payout.failed', logging.ERROR, exc_info=True, amount=Decimal('10.50'))
+        finally:
+            logs.correlation_id.reset(token)
+        first, second = lines()
+        self.assertEqual(
+            {key: first[key] for key in ('level', 'event', 'correlation_id', 'email', 'otp')},
+            {'level': 'WARNING', 'event': 'auth.login.failed', 'correlation_id': 'req-1',
+             'email': 'j***@example.com', 'otp': '[redacted]'},
+        )
+        self.assertEqual(second['amount'], '10.50')
+        self.assertIn('ValueError: boom', second['exception'])
+
+    @override_settings(LOG_SAMPLE_RATES={'auth.login.succeeded': 0.0})
+    def test_sampling_keeps_warnings(self):
+        logger, handler, lines = self.handler()
+        logs.event(logger, 'auth.login.succeeded', user_id=1)
+        logs.event(logger, 'auth.login.succeeded', logging.WARNING, user_id=2)
+        logs.event(logger, 'deposit.reviewed', deposit_id=3)
+        self.assertEqual([line.get('user_id', line.get('deposit_id')) for line in lines()], [2, 3])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        logger, handler, lines = self.handler(queue_size=1)
+        listener, handler.listener = handler.listener, None
+        listener.stop()
+        for i in range(3):
+            logs.event(logger, 'withdrawal.requested', withdrawal_id=i)
+        self.assertEqual(handler.queue.qsize(), 1)
+
+    def test_correlation_id_header(self):
+        self.assertEqual(self.client.get('/', HTTP_X_REQUEST_ID='abc-123')['X-Request-ID'], 'abc-123')
+        generated = self.client.get('/', HTTP_X_REQUEST_ID='not a valid id')['X-Request-ID']
+        self.assertRegex(generated, r'^[0-9a-f]{32}$')
+
+    def test_login_logs_events_without_credentials(self):
+        stdout = StringIO()
+        with self.assertLogs('accounts.views', 'INFO') as captured, redirect_stdout(stdout):
+            self.client.post('/api/accounts/token/', {'email': 'jane.doe@example.com', 'password': 'wrong'})
+            self.client.post('/api/accounts/token/', {'email': 'jane.doe@example.com', 'password': 'pass-12345'})
+        self.assertEqual([record.msg for record in captured.records], ['auth.login.bad_password', 'auth.login.succeeded'])
+        self.assertEqual(captured.records[1].fields, {'user_id': self.user.pk})
+        self.assertEqual(stdout.getvalue(), '')
@@ -0,0 +1,53 @@
+import hmac
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+
+from . import metrics, profiling
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint.
+
+    Requires ``Authorization: Bearer <METRICS_TOKEN>`` or a staff session.
+    Only a DEBUG server with no ``METRICS_TOKEN`` serves it to anyone.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        authorized = hmac.compare_digest(
+            request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode(),
+        )
+    else:
+        authorized = settings.DEBUG
+    if not authorized and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@staff_member_required
+def profile_list(request):
+    """Stored request profiles (monitoring/profiling.py), newest first."""
+    return JsonResponse({'captures': profiling.list_captures()})
+
+
+@staff_member_required
+def profile_detail(request, capture_id):
+    """One capture: the SQL timeline, signal time and the slowest functions."""
+    capture = profiling.load_capture(capture_id)
+    if capture is None:
+        raise Http404
+    return JsonResponse(capture)
+
+
+@staff_member_required
+def profile_download(request, capture_id):
+    """The raw cProfile stats, for snakeviz or ``python -m pstats``."""
+    path = profiling.capture_path(capture_id, '.prof')
+    if path is None:
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
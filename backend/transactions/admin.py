@@ -1,9 +1,10 @@
 from django.contrib import admin
+from legacy_prime_backend.sharded_admin import ShardedAdminMixin
 from .models import TransactionHistory
 
 
 @admin.register(TransactionHistory)
-class TransactionHistoryAdmin(admin.ModelAdmin):
+class TransactionHistoryAdmin(ShardedAdminMixin, admin.ModelAdmin):
     list_display = (
         'user',
         'transaction_type',
@@ -15,6 +16,8 @@ class TransactionHistoryAdmin(admin.ModelAdmin):
         'created_at',
     )
     list_filter = ('transaction_type', 'status', 'created_at')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
     search_fields = ('user__username', 'reference', 'description')
     ordering = ('-created_at',)
     readonly_fields = (
@@ -0,0 +1,29 @@
+"""Async version of the transaction history endpoint (see accounts/async_api.py)."""
+from accounts.async_api import async_api_view
+from legacy_prime_backend.sharding import agather
+from .models import TransactionHistory
+from .serializers import TransactionHistorySerializer
+
+
+@async_api_view()
+async def transaction_history(request):
+    """Async TransactionHistoryListView, with the same ?type, ?status and ?search filters."""
+    user = request.user
+    queryset = TransactionHistory.objects.select_related('user').order_by('-created_at')
+    if not (user.is_staff or user.is_superuser):
+        queryset = queryset.filter(user=user)
+
+    transaction_type = request.GET.get('type')
+    if transaction_type:
+        queryset = queryset.filter(transaction_type=transaction_type)
+
+    status_filter = request.GET.get('status')
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+
+    # Same semantics as SearchFilter on `reference`: every term must match.
+    for term in request.GET.get('search', '').replace(',', ' ').split():
+        queryset = queryset.filter(reference__icontains=term)
+
+    rows = await agather(queryset)
+    return TransactionHistorySerializer(rows, many=True).data
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0002_transactionhistory_balance_before_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactionhistory',
+            index=models.Index(fields=['created_at', 'id'], name='transaction_created_idx'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.conf import settings
 from django.utils import timezone
 import uuid
 
+from legacy_prime_backend.sharding import ShardedQuerySet, shard_for_user
+
 User = settings.AUTH_USER_MODEL
 
 
@@ -39,8 +41,11 @@ class TransactionHistory(models.Model):
     reference = models.CharField(max_length=50, unique=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['created_at', 'id'], name='transaction_created_idx')]
         verbose_name = "Transaction History"
         verbose_name_plural = "Transaction Histories"
 
@@ -70,7 +75,7 @@ def log_deposit_transaction(sender, instance, created, **kwargs):
     """
     if instance.status == 'approved':
         try:
-            with transaction.atomic():
+            with transaction.atomic(using=shard_for_user(instance.user_id)):
                 wallet = Wallet.objects.select_for_update().get(user=instance.user)
                 before_balance = wallet.balance
                 
@@ -110,7 +115,7 @@ def log_withdrawal_transaction(sender, instance, created, **kwargs):
     """
     if instance.status == 'approved':
         try:
-            with transaction.atomic():
+            with transaction.atomic(using=shard_for_user(instance.user_id)):
                 wallet = Wallet.objects.select_for_update().get(user=instance.user)
                 before_balance = wallet.balance
                 
@@ -1,3 +1,197 @@
-from django.test import TestCase
+import gzip
+import json
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils.functional import lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from legacy_prime_backend.compression import negotiate
+from legacy_prime_backend.db_router import ReplicaRoutingMiddleware, RoutingState, _routing, is_pinned
+from legacy_prime_backend.renderers import FastJSONRenderer
+from monitoring.testing import QueryBudgetMixin
+from wallets.models import Wallet
+from .models import TransactionHistory
+from .views import TransactionHistoryListView
+
+User = get_user_model()
+
+
+@override_settings(NPLUSONE_DETECT=True, NPLUSONE_RAISE=True)
+class HistoryQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Transaction history runs a fixed number of queries, at 1 row or 1,000."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('history', 'history@example.com', 'pass-12345')
+        cls.staff = User.objects.create_user('history-staff', 'staff@example.com', 'pass-12345', is_staff=True)
+
+    def grow(self, size):
+        existing = TransactionHistory.objects.count()
+        TransactionHistory.objects.bulk_create([
+            TransactionHistory(user=self.user, transaction_type='deposit', amount=5, reference=f'TXN-BUDGET-{i}')
+            for i in range(existing, size)
+        ])
+
+    def test_own_history(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        # The conditional-GET state query, then the page
+        self.assertBudgetAtSizes(2, client, reverse('transaction-history'), self.grow, offset=0)
+
+    def test_staff_history(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        self.assertBudgetAtSizes(2, client, reverse('transaction-history'), self.grow, offset=0)
+
+    def test_admin_changelist(self):
+        admin = User.objects.create_superuser('history-admin', 'admin@example.com', 'pass-12345')
+        self.client.force_login(admin)
+        # Two index seeks for the date drill-down's first and last date (large_admin.py)
+        self.assertBudgetAtSizes(7, self.client, reverse('admin:transactions_transactionhistory_changelist'), self.grow)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Routing decisions only; nothing here runs a query on the replica alias.
+    TransactionTestCase, because reads inside TestCase's atomic block never
+    leave the primary.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('routed', 'routed@example.com', 'pass-12345')
+        cache.clear()  # creating the user's wallet pinned them
+        self.state = RoutingState()
+        token = _routing.set(self.state)
+        self.addCleanup(_routing.reset, token)
+
+    def view_initial(self, method='get'):
+        request = getattr(APIRequestFactory(), method)('/api/transactions/')
+        force_authenticate(request, self.user)
+        view = TransactionHistoryListView()
+        view.setup(request)
+        request = view.initialize_request(request)
+        view.initial(request)
+
+    def test_read_only_view_uses_replica(self):
+        self.view_initial()
+        self.assertEqual(TransactionHistory.objects.all().db, 'replica')
+
+    def test_unsafe_method_stays_on_primary(self):
+        self.view_initial('post')
+        self.assertEqual(TransactionHistory.objects.all().db, 'default')
+
+    def test_writes_and_locking_reads_use_primary(self):
+        self.state.replica = 'replica'
+        self.assertEqual(TransactionHistory.objects.select_for_update().db, 'default')
+        self.assertEqual(router.db_for_write(TransactionHistory), 'default')
+        with transaction.atomic():
+            self.assertEqual(TransactionHistory.objects.all().db, 'default')
+
+    def test_recent_writer_is_pinned(self):
+        TransactionHistory.objects.create(user=self.user, transaction_type='deposit', amount=5)
+        self.view_initial()
+        self.assertEqual(TransactionHistory.objects.all().db, 'default')
+
+    def test_middleware_pins_requester_after_write(self):
+        def get_response(request):
+            request.user = self.user
+            router.db_for_write(TransactionHistory)
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(get_response)(RequestFactory().post('/'))
+        self.assertTrue(is_pinned(self.user.pk))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        self.view_initial()
+        self.assertEqual(TransactionHistory.objects.all().db, 'default')
+
+
+# The primary stands in for the replica: the views read from it through the replica path.
+@override_settings(DATABASE_REPLICAS=['default'])
+class DashboardReplicaTests(TestCase):
+    """Dashboard reads leave the user unpinned, so their next reads can use a replica too."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('dashboard', 'dashboard@example.com', 'pass-12345')
+        cache.clear()  # creating the user's wallet pinned them
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_wallet_and_overview_reads_do_not_pin(self):
+        for name in ('user-wallet', 'wallet-overview'):
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+                self.assertFalse(is_pinned(self.user.pk))
+
+    def test_missing_wallet_is_created_and_pins(self):
+        Wallet.objects.filter(user=self.user).delete()
+        self.assertEqual(self.client.get(reverse('wallet-overview')).status_code, 200)
+        self.assertTrue(Wallet.objects.filter(user=self.user).exists())
+        self.assertTrue(is_pinned(self.user.pk))
+
+
+class RenderingTests(TestCase):
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {
+            'amount': Decimal('1234.56'),
+            'created_at': datetime(2024, 5, 1, 12, 30, 5, 123000, tzinfo=dt_timezone.utc),
+            'naive': datetime(2024, 5, 1, 12, 30),
+            'label': lazy(lambda: 'Deposit', str)(),
+            'ids': (1, 2, 3),
+            'nested': [{'balance': Decimal('0.10'), 1: None}],
+            'text': 'line\u2028separator é',
+        }
+        fast = FastJSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+        self.assertIn(b'"2024-05-01T12:30:05.123000Z"', fast)
+        self.assertIn(b'\\u2028', fast)
+
+    def test_falls_back_for_what_orjson_refuses(self):
+        renderer = FastJSONRenderer()
+        self.assertEqual(renderer.render({'big': 2 ** 70}), b'{"big":1180591620717411303424}')
+        indented = 'application/json; indent=2'
+        self.assertEqual(renderer.render({'a': 1}, indented), JSONRenderer().render({'a': 1}, indented))
+        self.assertEqual(renderer.render(None), b'')
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate('gzip;q=0, deflate'), None)
+        self.assertEqual(negotiate('identity'), None)
+        self.assertEqual(negotiate('*'), 'gzip')
+        self.assertEqual(negotiate('br;q=1.0, gzip;q=0.5'), 'gzip')
+
+    def test_large_history_pages_are_compressed(self):
+        user = User.objects.create_user('rendering', 'rendering@example.com', 'pass-12345')
+        TransactionHistory.objects.bulk_create([
+            TransactionHistory(user=user, transaction_type='deposit', amount=Decimal('12.50'), reference=f'TXN-RENDER-{i}')
+            for i in range(50)
+        ])
+        client = APIClient()
+        client.force_authenticate(user)
+
+        plain = client.get(reverse('transaction-history'))
+        self.assertNotIn('Content-Encoding', plain)
+        compressed = client.get(reverse('transaction-history'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertLess(len(compressed.content), len(plain.content))
+
+    @override_settings(COMPRESSION_MIN_SIZE=10 ** 6)
+    def test_small_responses_are_not_compressed(self):
+        user = User.objects.create_user('rendering', 'rendering@example.com', 'pass-12345')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(reverse('transaction-history'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
@@ -1,6 +1,8 @@
 from django.urls import path
 from .views import TransactionHistoryListView
+from .async_views import transaction_history
 
 urlpatterns = [
     path('', TransactionHistoryListView.as_view(), name='transaction-history'),
+    path('async/', transaction_history, name='transaction-history-async'),
 ]
@@ -1,10 +1,13 @@
 from rest_framework import generics, permissions, filters
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from legacy_prime_backend.db_router import ReplicaReadMixin
+from legacy_prime_backend.sharding import ShardedViewMixin
+from wallets.conditional import conditional_per_user, queryset_state
 from .models import TransactionHistory
 from .serializers import TransactionHistorySerializer
 
 
-class TransactionHistoryListView(generics.ListAPIView):
+class TransactionHistoryListView(ShardedViewMixin, ReplicaReadMixin, generics.ListAPIView):
     """
     🔹 Returns all transactions for the logged-in user.
     🔹 Supports filtering by:
@@ -20,12 +23,14 @@ class TransactionHistoryListView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
+        # `username` is read from the related user for every row
+        transactions = TransactionHistory.objects.select_related('user')
 
         # Admins can view all users' transactions
         if user.is_staff or user.is_superuser:
-            queryset = TransactionHistory.objects.all().order_by('-created_at')
+            queryset = transactions.order_by('-created_at')
         else:
-            queryset = TransactionHistory.objects.filter(user=user).order_by('-created_at')
+            queryset = transactions.filter(user=user).order_by('-created_at')
 
         # Optional filter by transaction type (deposit, withdrawal, profit, etc.)
         transaction_type = self.request.query_params.get('type')
@@ -38,3 +43,9 @@ class TransactionHistoryListView(generics.ListAPIView):
             queryset = queryset.filter(status=status_filter)
 
         return queryset
+
+    # History is append-only, so the newest row and the count tell if it changed.
+    # It has no response cache, so the state is read fresh every time.
+    @conditional_per_user('history', queryset_state('created_at'), cached=False)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
@@ -1,7 +1,10 @@
 from django.contrib import admin
+from legacy_prime_backend.sharded_admin import ShardedAdminMixin
 from .models import Wallet
 
 @admin.register(Wallet)
-class WalletAdmin(admin.ModelAdmin):
+class WalletAdmin(ShardedAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'balance', 'total_invested', 'total_withdrawn', 'created_at')
     search_fields = ('user__username',)
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
@@ -0,0 +1,18 @@
+"""Async version of the wallet endpoint (see accounts/async_api.py)."""
+from rest_framework.exceptions import NotFound
+
+from accounts.async_api import async_api_view
+from .cache import acache_per_user
+from .models import Wallet
+from .serializers import WalletSerializer
+
+
+@async_api_view()
+@acache_per_user('wallet-detail')
+async def wallet_detail(request):
+    """Async WalletDetailView."""
+    try:
+        wallet = await Wallet.objects.aget(user=request.user)
+    except Wallet.DoesNotExist:
+        raise NotFound()
+    return WalletSerializer(wallet).data
@@ -0,0 +1,146 @@
+"""
+Per-user response cache.
+
+Every cached response is keyed by the user's *generation*, a counter that
+any write to their wallet, investments, deposits, withdrawals or history
+bumps (see wallets/signals.py). Old entries are never deleted; they just
+stop being addressed and age out. A user therefore always reads their own
+writes, and the scheme needs nothing beyond get/set/add/incr, so it works
+the same on locmem, file, Memcached and Redis backends.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from monitoring import metrics
+
+GENERATION_KEY = 'user-gen:%s'
+RESPONSE_KEY = 'user-resp:%s:%s:%s:%s'
+
+
+def _fresh_generation():
+    # Seeded from the clock, so a generation key lost to eviction or a cache
+    # restart can never fall back to a number an old entry was stored under.
+    return time.time_ns()
+
+
+def generation(user_id):
+    key = GENERATION_KEY % user_id
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _fresh_generation(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+async def ageneration(user_id):
+    key = GENERATION_KEY % user_id
+    value = await cache.aget(key)
+    if value is None:
+        await cache.aadd(key, _fresh_generation(), timeout=None)
+        value = await cache.aget(key)
+    return value
+
+
+def bump_generation(user_id):
+    """Invalidate every cached response of ``user_id``."""
+    key = GENERATION_KEY % user_id
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_generation(), timeout=None)
+
+
+def bump_generation_on_commit(user_id):
+    # Bumping before commit would let a concurrent read cache the old rows
+    # under the new generation.
+    transaction.on_commit(lambda: bump_generation(user_id))
+
+
+def _path_hash(request):
+    return hashlib.md5(request.get_full_path().encode(), usedforsecurity=False).hexdigest()
+
+
+def response_cache_key(request, scope):
+    user_id = request.user.pk
+    return RESPONSE_KEY % (user_id, generation(user_id), scope, _path_hash(request))
+
+
+def _record(scope, hit):
+    metrics.inc('response_cache_requests_total', (('view', scope), ('result', 'hit' if hit else 'miss')))
+
+
+def cache_per_user(scope):
+    """
+    Decorate a view's ``get`` to serve it from the per-user cache.
+    ``scope`` names the view; hits and misses are counted per scope in
+    /metrics. Only 200 responses are stored, and only their data, so
+    content negotiation still happens per request.
+    """
+    def decorator(get):
+        @wraps(get)
+        def cached_get(view, request, *args, **kwargs):
+            timeout = getattr(settings, 'USER_RESPONSE_CACHE_TIMEOUT', 300)
+            if not timeout:
+                return get(view, request, *args, **kwargs)
+
+            key = response_cache_key(request, scope)
+            data = cache.get(key)
+            _record(scope, data is not None)
+            if data is not None:
+                return Response(data)
+
+            response = get(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout)
+            return response
+        return cached_get
+    return decorator
+
+
+def acache_per_user(scope):
+    """
+    cache_per_user() for the async views of accounts/async_api.py, which
+    return plain data rather than a Response.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def cached_view(request, *args, **kwargs):
+            timeout = getattr(settings, 'USER_RESPONSE_CACHE_TIMEOUT', 300)
+            if not timeout:
+                return await view(request, *args, **kwargs)
+
+            user_id = request.user.pk
+            key = RESPONSE_KEY % (user_id, await ageneration(user_id), scope, _path_hash(request))
+            data = await cache.aget(key)
+            _record(scope, data is not None)
+            if data is None:
+                data = await view(request, *args, **kwargs)
+                await cache.aset(key, data, timeout)
+            return data
+        return cached_view
+    return decorator
+
+
+def hit_ratios(snap=None):
+    """``{view: (hits, misses, ratio)}`` from a metrics snapshot."""
+    counts = {}
+    for (name, labels), value in (snap or metrics.collect())['counters'].items():
+        if name != 'response_cache_requests_total':
+            continue
+        labels = dict(labels)
+        hits, misses = counts.get(labels['view'], (0, 0))
+        if labels['result'] == 'hit':
+            hits += value
+        else:
+            misses += value
+        counts[labels['view']] = (hits, misses)
+    return {
+        view: (hits, misses, hits / (hits + misses) if hits + misses else 0.0)
+        for view, (hits, misses) in counts.items()
+    }
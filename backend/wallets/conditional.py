@@ -0,0 +1,127 @@
+"""
+Conditional GET for the per-user read endpoints.
+
+A view's *state* is a small tuple of freshness values: the wallet's
+``updated_at``, the newest ``updated_at``/``created_at`` and the row count
+of each table the payload comes from. One query reads them. For views
+whose responses are cached per user (wallets/cache.py), the state is
+cached under the same generation as the response. A poll whose
+``If-None-Match`` or ``If-Modified-Since`` still matches gets a 304
+before the view's own queries or its serializer run.
+
+The ETag hashes the state with the user, the URL and the negotiated
+media type. Two users sharing a browser therefore never match each
+other's responses, and a list's filters are part of its tag.
+``Cache-Control: private, no-cache`` makes clients revalidate every time
+instead of trusting a heuristic lifetime.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from investments.models import Deposit, UserInvestment, Withdrawal
+from legacy_prime_backend.sharding import each_shard
+from monitoring import metrics
+from transactions.models import TransactionHistory
+from .cache import response_cache_key
+from .models import Wallet
+
+
+def wallet_state(view, request):
+    row = Wallet.objects.filter(user=request.user).values_list('updated_at').first()
+    return tuple(row) if row else None
+
+
+def queryset_state(field):
+    """State of a list view: the newest ``field`` and the row count of its queryset, on every shard."""
+    def state(view, request):
+        latest, rows = None, 0
+        for part in each_shard(view.get_queryset().order_by()):
+            totals = part.aggregate(latest=Max(field), rows=Count('pk'))
+            if totals['latest'] and (latest is None or totals['latest'] > latest):
+                latest = totals['latest']
+            rows += totals['rows']
+        return (latest, rows)
+    return state
+
+
+def _per_user(model, aggregate):
+    return Subquery(
+        model.objects.filter(user_id=OuterRef('user_id')).order_by()
+        .values('user_id').annotate(value=aggregate).values('value')
+    )
+
+
+def dashboard_state(view, request):
+    """Everything the overview reads, in one query on the user's wallet row."""
+    row = Wallet.objects.filter(user=request.user).values_list(
+        'updated_at',
+        _per_user(Deposit, Max('updated_at')), _per_user(Deposit, Count('pk')),
+        _per_user(Withdrawal, Max('updated_at')), _per_user(Withdrawal, Count('pk')),
+        _per_user(UserInvestment, Max('updated_at')), _per_user(UserInvestment, Count('pk')),
+        _per_user(TransactionHistory, Max('created_at')), _per_user(TransactionHistory, Count('pk')),
+    ).first()
+    return tuple(row) if row else None
+
+
+def _state(view, request, scope, compute, cached):
+    timeout = getattr(settings, 'USER_RESPONSE_CACHE_TIMEOUT', 300)
+    if not (cached and timeout):
+        return compute(view, request)
+    key = response_cache_key(request, f'{scope}:state')
+    state = cache.get(key)
+    if state is None:
+        state = compute(view, request)
+        if state is not None:
+            cache.set(key, state, timeout)
+    return state
+
+
+def _validators(request, scope, state):
+    accepted = getattr(request, 'accepted_media_type', '')
+    digest = hashlib.md5(
+        repr((request.user.pk, scope, request.get_full_path(), accepted, state)).encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+    times = [value for value in state if hasattr(value, 'timestamp')]
+    return f'"{digest}"', int(max(times).timestamp()) if times else None
+
+
+def conditional_per_user(scope, compute, cached=True):
+    """
+    Decorate a view's ``get`` to answer conditional requests from
+    ``compute(view, request)``, which returns the view's state or None
+    to skip validation (no wallet yet, for instance). ``cached`` keeps the
+    state in the per-user cache; leave it on for views behind
+    ``cache_per_user()``, so the tag always describes the cached body it
+    is sent with. 304s and full responses are counted per scope in /metrics.
+    """
+    def decorator(get):
+        @wraps(get)
+        def conditional_get(view, request, *args, **kwargs):
+            state = _state(view, request, scope, compute, cached)
+            if state is None:
+                return get(view, request, *args, **kwargs)
+
+            etag, last_modified = _validators(request, scope, state)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            metrics.inc('conditional_requests_total', (
+                ('view', scope), ('result', 'not_modified' if response is not None else 'full'),
+            ))
+            if response is None:
+                response = get(view, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return conditional_get
+    return decorator
@@ -1,6 +1,7 @@
 from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from decimal import Decimal
+from legacy_prime_backend.sharding import ShardedQuerySet
 
 User = get_user_model()
 
@@ -13,6 +14,8 @@ class Wallet(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Wallet'
         verbose_name_plural = 'Wallets'
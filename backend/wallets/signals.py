@@ -1,6 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
+from investments.models import Deposit, Investment, UserInvestment, Withdrawal
+from transactions.models import TransactionHistory
+from legacy_prime_backend.db_router import pin_user
+from legacy_prime_backend.sharding import delete_user_rows
+from .cache import bump_generation_on_commit
 from .models import Wallet
 
 User = get_user_model()
@@ -11,3 +16,17 @@ def create_wallet(sender, instance, created, **kwargs):
         Wallet.objects.create(user=instance)
 
 
+pre_delete.connect(delete_user_rows, sender=User, dispatch_uid='delete-sharded-user-rows')
+
+
+# Any write that can change what a user's dashboard shows moves them to a new
+# response cache generation (wallets/cache.py) and keeps their reads on the
+# primary database while replicas catch up (legacy_prime_backend/db_router.py).
+def bump_user_generation(sender, instance, **kwargs):
+    bump_generation_on_commit(instance.user_id)
+    pin_user(instance.user_id)
+
+
+for model in (Wallet, Deposit, Withdrawal, UserInvestment, Investment, TransactionHistory):
+    post_save.connect(bump_user_generation, sender=model, dispatch_uid=f'user-generation-save-{model.__name__}')
+    post_delete.connect(bump_user_generation, sender=model, dispatch_uid=f'user-generation-delete-{model.__name__}')
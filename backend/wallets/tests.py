@@ -1,3 +1,174 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from investments.models import InvestmentPlan, UserInvestment
+from monitoring import metrics
+from transactions.models import TransactionHistory
+from .cache import bump_generation, generation, hit_ratios
+
+User = get_user_model()
+
+CACHED_VIEWS = ('user-wallet', 'wallet-detail', 'my-investments', 'active-investments', 'wallet-overview')
+CONDITIONAL_VIEWS = ('user-wallet', 'wallet-detail', 'my-investments', 'wallet-overview', 'transaction-history')
+
+
+class ResponseCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cached', 'cached@example.com', 'pass-12345')
+        cls.other = User.objects.create_user('cached-other', 'other@example.com', 'pass-12345')
+        cls.plan = InvestmentPlan.objects.order_by('id').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeat_reads_hit_the_cache(self):
+        for name in CACHED_VIEWS:
+            with self.subTest(view=name):
+                first = self.client.get(reverse(name))
+                self.assertEqual(first.status_code, 200)
+                with self.assertNumQueries(0):
+                    second = self.client.get(reverse(name))
+                self.assertEqual(second.data, first.data)
+
+    def test_wallet_write_invalidates(self):
+        self.assertEqual(self.client.get(reverse('wallet-detail')).data['balance'], '0.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            wallet = self.user.wallet
+            wallet.balance = Decimal('125.50')
+            wallet.save()
+        self.assertEqual(self.client.get(reverse('wallet-detail')).data['balance'], '125.50')
+
+    def test_investment_and_history_writes_invalidate(self):
+        self.assertEqual(self.client.get(reverse('my-investments')).data, [])
+        self.assertIsNone(self.client.get(reverse('wallet-overview')).data['last_transaction'])
+        with self.captureOnCommitCallbacks(execute=True):
+            UserInvestment.objects.create(user=self.user, plan=self.plan, amount=100)
+            TransactionHistory.objects.create(user=self.user, transaction_type='deposit', amount=40)
+        self.assertEqual(len(self.client.get(reverse('my-investments')).data), 1)
+        self.assertEqual(self.client.get(reverse('wallet-overview')).data['last_transaction']['amount'], Decimal('40'))
+
+    def test_other_users_are_unaffected(self):
+        self.client.get(reverse('wallet-detail'))
+        before = generation(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.wallet.save()
+        self.assertEqual(generation(self.user.pk), before)
+        other = APIClient()
+        other.force_authenticate(self.other)
+        self.assertEqual(other.get(reverse('wallet-detail')).data['balance'], '0.00')
+
+    def test_generation_survives_eviction(self):
+        first = generation(self.user.pk)
+        cache.delete(f'user-gen:{self.user.pk}')
+        self.assertGreater(generation(self.user.pk), first)
+
+    def test_hit_ratio_reported(self):
+        start = hit_ratios(metrics.snapshot()).get('overview', (0, 0, 0))
+        for _ in range(4):
+            self.client.get(reverse('wallet-overview'))
+        hits, misses, _ = hit_ratios(metrics.snapshot())['overview']
+        self.assertEqual((hits - start[0], misses - start[1]), (3, 1))
+
+    @override_settings(USER_RESPONSE_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self.client.get(reverse('my-investments'))
+        # The conditional-GET state query, then the list
+        with self.assertNumQueries(2):
+            self.client.get(reverse('my-investments'))
+
+
+class FileBackendResponseCacheTests(ResponseCacheTests):
+    """Same behaviour on the file backend, which has no atomic incr."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        backend = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory.name,
+        }})
+        backend.enable()
+        self.addCleanup(backend.disable)
+        super().setUp()
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('conditional', 'conditional@example.com', 'pass-12345')
+        cls.other = User.objects.create_user('conditional-other', 'conditional-other@example.com', 'pass-12345')
+        cls.plan = InvestmentPlan.objects.order_by('id').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unchanged_state_is_not_modified(self):
+        for name in CONDITIONAL_VIEWS:
+            with self.subTest(view=name):
+                first = self.client.get(reverse(name))
+                self.assertEqual(first.status_code, 200)
+                self.assertIn('no-cache', first['Cache-Control'])
+                # At most the state query; neither the view's queries nor its serializer run.
+                with self.assertNumQueries(1 if name == 'transaction-history' else 0):
+                    again = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again['ETag'], first['ETag'])
+                self.assertEqual(again.content, b'')
+
+    @override_settings(USER_RESPONSE_CACHE_TIMEOUT=0)
+    def test_one_state_query_without_the_cache(self):
+        for name in CONDITIONAL_VIEWS:
+            with self.subTest(view=name):
+                first = self.client.get(reverse(name))
+                with self.assertNumQueries(1):
+                    again = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(again.status_code, 304)
+
+    def test_if_modified_since(self):
+        first = self.client.get(reverse('wallet-detail'))
+        again = self.client.get(reverse('wallet-detail'), HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_writes_change_the_tag(self):
+        tags = {name: self.client.get(reverse(name))['ETag'] for name in CONDITIONAL_VIEWS}
+        with self.captureOnCommitCallbacks(execute=True):
+            UserInvestment.objects.create(user=self.user, plan=self.plan, amount=100)
+            TransactionHistory.objects.create(user=self.user, transaction_type='deposit', amount=40)
+            wallet = self.user.wallet
+            wallet.balance = Decimal('40.00')
+            wallet.save()
+        for name, tag in tags.items():
+            with self.subTest(view=name):
+                response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=tag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], tag)
+
+    def test_bulk_completion_changes_the_investment_tag(self):
+        investment = UserInvestment.objects.create(user=self.user, plan=self.plan, amount=100)
+        tag = self.client.get(reverse('my-investments'))['ETag']
+        # As CompleteExpiredInvestmentsView does it: no signals, so the generation is bumped by hand.
+        later = investment.updated_at + timedelta(seconds=1)
+        UserInvestment.objects.filter(pk=investment.pk).update(status='completed', updated_at=later)
+        bump_generation(self.user.pk)
+        self.assertEqual(self.client.get(reverse('my-investments'), HTTP_IF_NONE_MATCH=tag).status_code, 200)
+
+    def test_tags_are_per_user(self):
+        tag = self.client.get(reverse('wallet-overview'))['ETag']
+        other = APIClient()
+        other.force_authenticate(self.other)
+        response = other.get(reverse('wallet-overview'), HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
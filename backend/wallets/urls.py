@@ -1,6 +1,8 @@
 from django.urls import path
 from .views import WalletDetailView
+from .async_views import wallet_detail
 
 urlpatterns = [
     path('', WalletDetailView.as_view(), name='wallet-detail'),
+    path('async/', wallet_detail, name='wallet-detail-async'),
 ]
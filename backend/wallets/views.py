@@ -1,4 +1,6 @@
 from rest_framework import generics, permissions
+from .cache import cache_per_user
+from .conditional import conditional_per_user, wallet_state
 from .models import Wallet
 from .serializers import WalletSerializer
 
@@ -8,3 +10,8 @@ class WalletDetailView(generics.RetrieveAPIView):
 
     def get_object(self):
         return self.request.user.wallet
+
+    @conditional_per_user('wallet-detail', wallet_state)
+    @cache_per_user('wallet-detail')
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)